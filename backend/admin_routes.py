@@ -8,6 +8,10 @@ import re
 
 from database import get_db
 from models import Admin, Blog, Settings, SEOConfig
+from sitemaps import sitemaps
+from public_cache import bump_version
+from blog_listing import published_count, VERSION_NAME as BLOGS_VERSION
+from blog_posts import blog_pages, render_content
 from admin_auth import hash_password, verify_password, create_access_token, decode_access_token
 import os
 import glob
@@ -179,12 +183,38 @@ def clear_cache(
     """Clear server cache (temporary files)"""
     try:
         from tasks import cleanup_cache
-        count = cleanup_cache()
+        count = cleanup_cache(clear_downloads=True)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to clear cache: {str(e)}")
         
     return {"message": f"Cache cleared successfully. Removed {count} items."}
 
+@router.get("/cache/files")
+def get_file_cache_stats(
+    admin: Admin = Depends(get_current_admin)
+):
+    """Get finished-file cache statistics"""
+    from file_cache import file_cache
+    return file_cache.stats()
+
+@router.get("/cache/info")
+def get_info_cache_stats(
+    admin: Admin = Depends(get_current_admin)
+):
+    """Get /info metadata cache statistics"""
+    from info_cache import info_cache
+    return info_cache.stats()
+
+@router.delete("/cache/info")
+def purge_info_cache(
+    url: Optional[str] = None,
+    admin: Admin = Depends(get_current_admin)
+):
+    """Purge cached metadata for one URL, or everything when no URL is given"""
+    from info_cache import info_cache, cache_key
+    count = info_cache.purge(cache_key(url) if url else None)
+    return {"message": f"Removed {count} cached entries."}
+
 # --- Blog Routes ---
 
 @router.get("/blogs", response_model=List[BlogResponse])
@@ -232,6 +262,7 @@ def create_blog(
         title=blog.title,
         slug=slug,
         content=blog.content,
+        content_html=render_content(blog.content),
         excerpt=blog.excerpt,
         author=blog.author or admin.username,
         featured_image=blog.featured_image,
@@ -244,8 +275,12 @@ def create_blog(
         db_blog.published_at = datetime.utcnow()
     
     db.add(db_blog)
+    # Other workers' listing count, post and sitemap caches follow this counter
+    bump_version(db, BLOGS_VERSION, commit=False)
     db.commit()
     db.refresh(db_blog)
+    sitemaps.blog_changed(db, db_blog.id)
+    published_count.invalidate()
     return db_blog
 
 @router.put("/blogs/{blog_id}", response_model=BlogResponse)
@@ -259,6 +294,7 @@ def update_blog(
     db_blog = db.query(Blog).filter(Blog.id == blog_id).first()
     if not db_blog:
         raise HTTPException(status_code=404, detail="Blog not found")
+    old_slug = db_blog.slug
     
     update_data = blog.dict(exclude_unset=True)
     
@@ -276,9 +312,15 @@ def update_blog(
     
     for key, value in update_data.items():
         setattr(db_blog, key, value)
+    if "content" in update_data:
+        db_blog.content_html = render_content(db_blog.content)
     
+    bump_version(db, BLOGS_VERSION, commit=False)
     db.commit()
     db.refresh(db_blog)
+    sitemaps.blog_changed(db, db_blog.id)
+    published_count.invalidate()
+    blog_pages.invalidate(old_slug, db_blog.slug)
     return db_blog
 
 @router.delete("/blogs/{blog_id}")
@@ -292,8 +334,13 @@ def delete_blog(
     if not blog:
         raise HTTPException(status_code=404, detail="Blog not found")
     
+    slug = blog.slug
     db.delete(blog)
+    bump_version(db, BLOGS_VERSION, commit=False)
     db.commit()
+    sitemaps.blog_changed(db, blog_id)
+    published_count.invalidate()
+    blog_pages.invalidate(slug)
     return {"message": "Blog deleted successfully"}
 
 # --- Settings Routes ---
@@ -331,6 +378,14 @@ def update_settings(
             db.add(db_setting)
     
     db.commit()
+    # Download tuning and rate limits are read from Settings, pick up the new values now
+    from download_tuning import download_tuning
+    from rate_limits import rate_limits
+    download_tuning.invalidate()
+    rate_limits.invalidate()
+    # Public settings and robots.txt are served from a cache, on every worker
+    from public_cache import public_cache
+    public_cache.invalidate(db)
     return {"message": "Settings updated successfully"}
 
 # --- SEO Routes ---
@@ -371,6 +426,8 @@ def update_seo(
     
     db.commit()
     db.refresh(db_seo)
+    from public_cache import public_cache
+    public_cache.invalidate(db)
     return {"message": "SEO configuration updated"}
 
 # --- Dashboard Stats ---
@@ -0,0 +1,245 @@
+"""
+Batch downloads
+POST /batch takes a list of URLs or one playlist URL. The playlist is read with
+flat extraction (entry URLs and titles only, paged lazily up to BATCH_MAX_ITEMS),
+then the items run as ordinary download jobs, at most BATCH_PARALLEL of a batch
+queued or running at a time, behind single downloads in the scheduler.
+
+The batch itself is a record in the job store, so any worker can report its
+aggregate progress; the worker that accepted it drives it. The finished files
+are sent as one ZIP written on the fly (stored, not compressed: media files
+don't shrink), never assembled on disk or in memory.
+"""
+import os
+import re
+import time
+import asyncio
+import logging
+import zipfile
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from job_store import TERMINAL_STATUSES
+from playlists import entry_url, is_playlist
+from scheduler import QueueFull
+
+logger = logging.getLogger(__name__)
+
+# Most items a batch (or the part of a playlist it takes) may have
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+# Items of one batch queued or running at the same time
+BATCH_PARALLEL = int(os.getenv("BATCH_PARALLEL", "3"))
+# Bytes read per chunk while writing the ZIP
+BATCH_ZIP_CHUNK_SIZE = int(os.getenv("BATCH_ZIP_CHUNK_SIZE", str(1024 * 1024)))
+# Seconds between checks of the item jobs
+POLL_INTERVAL = 0.5
+# Scheduler priority of batch items, single downloads (0) go first
+BATCH_PRIORITY = 1
+
+# Playlist reading: entries as bare URLs, pages fetched only as far as needed
+PLAYLIST_OPTIONS = {'extract_flat': 'in_playlist', 'lazy_playlist': True, 'playlistend': BATCH_MAX_ITEMS}
+
+
+def playlist_items(info: dict, url: str) -> List[dict]:
+    """[{url, title}] for a flat-extracted playlist, or the single video itself"""
+    if not is_playlist(info):
+        return [{'url': info.get('webpage_url') or url, 'title': info.get('title')}]
+    items, pages = [], (url, info.get('webpage_url'))
+    for entry in info.get('entries') or []:
+        link = entry_url(entry or {}, pages)
+        if link:
+            items.append({'url': link, 'title': entry.get('title')})
+        if len(items) >= BATCH_MAX_ITEMS:
+            break
+    return items
+
+
+def summarize(batch: dict, jobs: Dict[str, dict]) -> dict:
+    """Batch state with each item's job status and the aggregate progress"""
+    items, counts, total = [], {}, 0.0
+    for item in batch.get('items') or []:
+        job = jobs.get(item.get('job_id')) if item.get('job_id') else None
+        if job:
+            status, progress, error = job['status'], job.get('progress') or 0, job.get('error')
+        else:
+            status = 'error' if item.get('error') or item.get('job_id') else 'pending'
+            progress, error = 0, item.get('error') or ('Job expired' if item.get('job_id') else None)
+        if status in TERMINAL_STATUSES:
+            progress = 100
+        counts[status] = counts.get(status, 0) + 1
+        total += progress
+        items.append({**item, 'status': status, 'progress': progress, 'error': error})
+    result = {k: v for k, v in batch.items() if not k.startswith('_') and k != 'items'}
+    result.update(items=items, counts=counts, progress=round(total / len(items), 1) if items else 0)
+    return result
+
+
+def zip_name(index: int, title: Optional[str], path: str, used: set) -> str:
+    """Archive member name "001 - Title.mp4", unique within the archive"""
+    safe = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', '_', (title or '').strip())[:120].strip(' .') or 'video'
+    ext = os.path.splitext(path)[1]
+    name = f"{index:03d} - {safe}{ext}"
+    n = 2
+    while name in used:
+        name = f"{index:03d} - {safe} ({n}){ext}"
+        n += 1
+    used.add(name)
+    return name
+
+
+class _ZipSink:
+    """Write-only, non-seekable target for ZipFile; collects what it is given until drained"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def zip_stream(files: List[Tuple[str, str]], chunk_size: int = BATCH_ZIP_CHUNK_SIZE,
+               on_done: Callable[[int, bool], None] = None) -> Iterator[bytes]:
+    """ZIP of (archive name, path) pairs, produced chunk by chunk.
+
+    ZipFile sees a non-seekable stream, so sizes and CRCs go into data descriptors
+    after each member instead of being patched into its header. on_done(bytes, complete)
+    runs when the stream ends, including when the client goes away.
+    """
+    sink, sent, complete = _ZipSink(), 0, False
+    try:
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for name, path in files:
+                st = os.stat(path)
+                member = zipfile.ZipInfo(name, date_time=time.localtime(st.st_mtime)[:6])
+                with open(path, 'rb') as src, \
+                        archive.open(member, 'w', force_zip64=st.st_size >= zipfile.ZIP64_LIMIT) as dst:
+                    while True:
+                        chunk = src.read(chunk_size)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                        data = sink.drain()
+                        sent += len(data)
+                        yield data
+        # Central directory, written when the archive is closed
+        data = sink.drain()
+        sent += len(data)
+        complete = True
+        yield data
+    finally:
+        if on_done:
+            on_done(sent, complete)
+
+
+class BatchRunner:
+    """Drives the batches accepted by this worker on the event loop"""
+
+    def __init__(self, store, extract: Callable[[str, dict], Future], start: Callable[[dict, dict], str],
+                 cancel: Callable[[str], bool], parallel: int = BATCH_PARALLEL, extract_opts: dict = PLAYLIST_OPTIONS):
+        self.store = store
+        self._extract = extract
+        self._start = start
+        self._cancel = cancel
+        self.parallel = max(1, parallel)
+        self.extract_opts = extract_opts
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.counters = {"batches": 0, "batches_failed": 0, "items_started": 0, "items_failed": 0}
+
+    async def submit(self, batch_id: str, items: List[dict] = None, playlist_url: str = None,
+                     options: dict = None) -> dict:
+        """Create the batch record, start driving it and return the record"""
+        batch = {
+            "status": "extracting" if playlist_url else "running",
+            "source": playlist_url,
+            "total": len(items or []),
+            "items": items or [],
+            "error": None,
+            "_created": time.time(),
+        }
+        await self._call(self.store.create, batch_id, batch)
+        self.counters["batches"] += 1
+        task = asyncio.ensure_future(self._run(batch_id, items, playlist_url, options or {}))
+        self._tasks[batch_id] = task
+        task.add_done_callback(lambda t: self._tasks.pop(batch_id, None))
+        return batch
+
+    @staticmethod
+    async def _call(fn, *args, **kwargs):
+        # Job store calls block on SQL/Redis, keep them off the event loop
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    def cancel(self, batch_id: str) -> bool:
+        """Delete a batch and every job it started. False when the batch does not exist."""
+        batch = self.store.get(batch_id)
+        if batch is None:
+            return False
+        self.store.delete(batch_id)
+        task = self._tasks.pop(batch_id, None)
+        if task:
+            task.cancel()
+        for item in batch.get('items') or []:
+            if item.get('job_id'):
+                self._cancel(item['job_id'])
+        return True
+
+    async def _run(self, batch_id: str, items: Optional[List[dict]], playlist_url: Optional[str], options: dict):
+        try:
+            if playlist_url:
+                info = await asyncio.wrap_future(self._extract(playlist_url, self.extract_opts))
+                items = playlist_items(info, playlist_url)
+                if not items:
+                    raise ValueError("No videos found at this URL")
+                if await self._call(self.store.update, batch_id, status="running", total=len(items), items=items,
+                                    title=info.get('title')) is None:
+                    return
+            await self._drive(batch_id, items, options)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Batch {batch_id} failed: {e}")
+            self.counters["batches_failed"] += 1
+            await self._call(self.store.update, batch_id, status="error", error=str(e))
+
+    async def _drive(self, batch_id: str, items: List[dict], options: dict):
+        pending, active = list(range(len(items))), set()
+        while pending or active:
+            if await self._call(self.store.get, batch_id) is None:
+                # Cancelled from another worker, which may not know the latest items yet
+                for i in active:
+                    await self._call(self._cancel, items[i]['job_id'])
+                return
+            for i in list(active):
+                job = await self._call(self.store.get, items[i]['job_id'])
+                if job is None or job['status'] in TERMINAL_STATUSES:
+                    active.discard(i)
+            changed = False
+            while pending and len(active) < self.parallel:
+                i = pending[0]
+                try:
+                    items[i]['job_id'] = await self._start(items[i], options)
+                    active.add(i)
+                    self.counters["items_started"] += 1
+                except QueueFull:
+                    break  # the scheduler is full, try again on the next round
+                except Exception as e:
+                    items[i]['error'] = str(e)
+                    self.counters["items_failed"] += 1
+                pending.pop(0)
+                changed = True
+            if changed and await self._call(self.store.update, batch_id, items=items) is None:
+                return
+            await asyncio.sleep(POLL_INTERVAL)
+        await self._call(self.store.update, batch_id, status="completed")
+
+    def stats(self) -> dict:
+        return {"active": len(self._tasks), "parallel": self.parallel, "max_items": BATCH_MAX_ITEMS,
+                **self.counters}
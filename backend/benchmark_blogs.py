@@ -0,0 +1,101 @@
+"""
+Blog listing benchmark
+Fills a scratch SQLite database with --posts published posts (bodies of --content
+bytes) and times GET /api/blogs at increasing page numbers, once with the old
+OFFSET query returning whole rows and once with the keyset cursor. The keyset
+pages should cost the same at page 1 and page 1000; OFFSET grows with the page.
+
+Usage: python benchmark_blogs.py [--posts 100000] [--limit 10] [--content 2000] [--repeat 20]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--posts", type=int, default=100000, help="published posts in the table")
+    parser.add_argument("--limit", type=int, default=10, help="posts per page")
+    parser.add_argument("--content", type=int, default=2000, help="bytes per post body")
+    parser.add_argument("--repeat", type=int, default=20, help="requests per measured page")
+    parser.add_argument("--pages", default="1,10,100,1000,5000", help="page numbers to measure")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="blog_bench_")
+    # database.py reads DATABASE_URL when it is imported
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'blogs.db')}"
+    try:
+        run(args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(args):
+    from fastapi import Depends, FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy.orm import Session
+
+    from database import SessionLocal, engine, get_db, init_db
+    from models import Blog
+    from public_routes import router
+    from blog_listing import encode_cursor
+
+    init_db()
+    started = time.perf_counter()
+    body, now = "x" * args.content, datetime(2026, 1, 1)
+    rows = [{
+        "title": f"Post {i}", "slug": f"post-{i}", "content": body, "excerpt": f"Excerpt of post {i}",
+        "author": "admin", "status": "published" if i % 20 else "draft",
+        "created_at": now - timedelta(minutes=i), "updated_at": now - timedelta(minutes=i),
+        "published_at": now - timedelta(minutes=i),
+    } for i in range(args.posts)]
+    with engine.begin() as conn:
+        conn.execute(Blog.__table__.insert(), rows)
+    print(f"{args.posts} posts inserted in {time.perf_counter() - started:.1f} s")
+
+    app = FastAPI()
+    app.include_router(router)
+
+    @app.get("/offset")
+    def offset_listing(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+        # The listing before keyset pagination
+        return db.query(Blog).filter(Blog.status == "published") \
+            .order_by(Blog.published_at.desc()).offset(skip).limit(limit).all()
+
+    db = SessionLocal()
+    published = db.query(Blog.id, Blog.published_at).filter(Blog.status == "published") \
+        .order_by(Blog.published_at.desc(), Blog.id.desc())
+    client = TestClient(app)
+    client.get("/api/blogs")  # first request also counts the posts
+    print(f"{'page':>6} {'offset p50':>12} {'keyset p50':>12}")
+    for page in (int(p) for p in args.pages.split(",")):
+        skip = (page - 1) * args.limit
+        cursor = None
+        if skip:
+            last = published.offset(skip - 1).limit(1).first()
+            if last is None:
+                break
+            cursor = encode_cursor(last.published_at, last.id)
+        offset_ms = measure(client, "/offset", {"skip": skip, "limit": args.limit}, args.repeat)
+        keyset_ms = measure(client, "/api/blogs", {"limit": args.limit, **({"cursor": cursor} if cursor else {})},
+                            args.repeat)
+        print(f"{page:6d} {offset_ms:9.2f} ms {keyset_ms:9.2f} ms")
+    db.close()
+
+
+def measure(client, path: str, params: dict, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(path, params=params)
+        timings.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return sorted(timings)[len(timings) // 2]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Fragment concurrency benchmark
+Serves a local HLS fixture (N segments behind simulated per-request latency)
+and downloads it through ytdl_runner with different fragment concurrency.
+
+Usage: python benchmark_fragments.py [--segments 60] [--latency 0.08] [--size 262144]
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from download_tuning import DEFAULT_TUNING, ydl_options
+from ytdl_runner import download
+
+
+def make_fixture(directory: str, segments: int, size: int):
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for i in range(segments):
+        with open(os.path.join(directory, f"seg{i}.ts"), "wb") as f:
+            f.write(os.urandom(size))
+        lines += ["#EXTINF:2.0,", f"seg{i}.ts"]
+    lines.append("#EXT-X-ENDLIST")
+    with open(os.path.join(directory, "index.m3u8"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def serve(directory: str, latency: float) -> ThreadingHTTPServer:
+    class Handler(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=directory, **kwargs)
+
+        def do_GET(self):
+            time.sleep(latency)  # round trip to a far-away CDN
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--segments", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.08, help="seconds added to every request")
+    parser.add_argument("--size", type=int, default=256 * 1024, help="bytes per segment")
+    parser.add_argument("--fragments", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    fixture = tempfile.mkdtemp(prefix="hls_fixture_")
+    output = tempfile.mkdtemp(prefix="hls_out_")
+    make_fixture(fixture, args.segments, args.size)
+    server = serve(fixture, args.latency)
+    url = f"http://127.0.0.1:{server.server_port}/index.m3u8"
+    total = args.segments * args.size
+    print(f"{args.segments} segments x {args.size} bytes, {args.latency * 1000:.0f} ms latency")
+
+    baseline = None
+    try:
+        for fragments in args.fragments:
+            opts = {'outtmpl': os.path.join(output, f"f{fragments}.%(ext)s"),
+                    'quiet': True, 'noprogress': True, 'no_warnings': True}
+            opts.update(ydl_options(DEFAULT_TUNING, fragments))
+            started = time.monotonic()
+            path = download(url, opts)
+            elapsed = time.monotonic() - started
+            baseline = baseline or elapsed
+            assert os.path.getsize(path) == total, "incomplete download"
+            print(f"concurrent_fragments={fragments:<3} {elapsed:6.2f}s  "
+                  f"{total / elapsed / 1024 ** 2:7.2f} MiB/s  x{baseline / elapsed:.1f}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(fixture, ignore_errors=True)
+        shutil.rmtree(output, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
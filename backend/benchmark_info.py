@@ -0,0 +1,164 @@
+"""
+/info load test
+Runs the API in a uvicorn process, saturates /info with lookups against a deliberately
+slow local site, and measures /status latency of a running job before and
+during the load, along with lookups for a second, fast site. /status should
+stay flat (extractions run off the event loop) and the fast site should not
+queue behind the slow one (which only gets its per-domain share of the pool).
+
+Usage: python benchmark_info.py [--info-requests 200] [--delay 3] [--status-requests 400] [--workers 4]
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import httpx
+
+MEDIA = b"\x00\x00\x00\x18ftypmp42" + b"\x00" * 1024
+
+
+def serve_slow_site(delay: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, body: bool):
+            time.sleep(delay)  # a site that takes its time to answer
+            self.send_response(200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(len(MEDIA)))
+            self.end_headers()
+            if body:
+                self.wfile.write(MEDIA)
+
+        def do_HEAD(self):
+            self._reply(False)
+
+        def do_GET(self):
+            self._reply(True)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+
+async def poll_status(client: httpx.AsyncClient, job_id: str, count: int, concurrency: int = 4):
+    latencies = []
+
+    async def worker(n):
+        for _ in range(n):
+            started = time.perf_counter()
+            response = await client.get(f"/status/{job_id}")
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.text
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(worker(count // concurrency) for _ in range(concurrency)))
+    return latencies
+
+
+async def time_lookups(client: httpx.AsyncClient, site: str, count: int):
+    latencies = []
+    for i in range(count):
+        started = time.perf_counter()
+        response = await client.post("/info", json={"url": f"{site}/fast{i}.mp4"})
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+    return latencies
+
+
+async def run(base_url: str, site: str, fast_site: str, args):
+    limits = httpx.Limits(max_connections=args.info_requests + 16)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        for _ in range(200):
+            try:
+                await client.get("/metrics")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        # A job that stays in progress while the slow site answers
+        started = await client.post("/start_download", json={"url": f"{site}/job.mp4", "format_id": "best"})
+        job_id = started.json()["job_id"]
+        await poll_status(client, job_id, 20)  # open connections, warm up
+        idle = await poll_status(client, job_id, args.status_requests)
+
+        started = time.monotonic()
+        lookups = [asyncio.ensure_future(client.post("/info", json={"url": f"{site}/v{i}.mp4"}))
+                   for i in range(args.info_requests)]
+        await asyncio.sleep(0.5)  # let the lookups pile up
+        loaded = await poll_status(client, job_id, args.status_requests)
+        fast = await time_lookups(client, fast_site, args.fast_lookups)
+        responses = await asyncio.gather(*lookups)
+        elapsed = time.monotonic() - started
+
+    codes = {}
+    for response in responses:
+        codes[response.status_code] = codes.get(response.status_code, 0) + 1
+    print(f"/status idle     p50 {percentile(idle, 50):6.1f} ms  p99 {percentile(idle, 99):6.1f} ms")
+    print(f"/status loaded   p50 {percentile(loaded, 50):6.1f} ms  p99 {percentile(loaded, 99):6.1f} ms")
+    print(f"/info fast site  p50 {percentile(fast, 50):6.1f} ms  max {max(fast) * 1000:6.1f} ms")
+    print(f"/info {args.info_requests} lookups in {elapsed:.1f}s, responses {dict(sorted(codes.items()))}")
+    stats = {k: v for k, v in (await client_stats(base_url)).items() if k.startswith(("anda_info_aborted", "anda_info_extractions{"))}
+    print(f"info metrics {stats}")
+
+
+async def client_stats(base_url: str) -> dict:
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        text = (await client.get("/metrics")).text
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if line and not line.startswith("#"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--info-requests", type=int, default=200, help="concurrent /info lookups")
+    parser.add_argument("--delay", type=float, default=3.0, help="seconds the slow site takes per request")
+    parser.add_argument("--status-requests", type=int, default=400)
+    parser.add_argument("--fast-lookups", type=int, default=5, help="lookups against a fast site during the load")
+    parser.add_argument("--workers", type=int, default=4, help="EXECUTION_WORKERS for the API process")
+    args = parser.parse_args()
+
+    # Throwaway database and download directories for the API process
+    workdir = tempfile.mkdtemp(prefix="info_bench_")
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    env.setdefault("EXECUTION_WORKERS", str(args.workers))
+    env["PYTHONPATH"] = os.path.dirname(os.path.abspath(__file__))
+    port = free_port()
+    api = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                           cwd=workdir, env=env, stdout=subprocess.DEVNULL)
+    site = serve_slow_site(args.delay)
+    fast_site = serve_slow_site(0)
+    print(f"{args.info_requests} /info lookups against a site answering in {args.delay}s, "
+          f"{env['EXECUTION_WORKERS']} execution workers")
+    try:
+        # Different host names, so the two sites get separate per-domain limits
+        asyncio.run(run(f"http://127.0.0.1:{port}", f"http://127.0.0.1:{site.server_port}",
+                        f"http://localhost:{fast_site.server_port}", args))
+    finally:
+        api.terminate()
+        api.wait()
+        site.shutdown()
+        fast_site.shutdown()
+
+
+if __name__ == "__main__":
+    main()
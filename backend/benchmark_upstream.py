@@ -0,0 +1,162 @@
+"""
+Upstream connection benchmark
+Downloads videos embedded in pages of a local HTTPS site (one page request and
+one media request per job, like most sites) through ytdl_runner.download, once
+with a fresh YoutubeDL per job and once through the session pool, and reports
+the TCP/TLS handshakes the site saw, time to first byte and time per job.
+Each new connection is delayed by --handshake-delay to stand in for the round
+trips a real TCP + TLS handshake costs (a local handshake is nearly free).
+
+Needs the openssl command line tool for the self-signed certificate and the
+"requests" package (yt-dlp[default]) for keep-alive.
+
+Usage: python benchmark_upstream.py [--jobs 20] [--handshake-delay 0.05] [--size 262144]
+"""
+import os
+import ssl
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import ytdl_runner
+import ydl_pool
+from ytdl_runner import BROWSER_HEADERS
+
+
+PAGE = """<html><head><title>{name}</title></head>
+<body><video controls><source src="/{name}.mp4" type="video/mp4"></video></body></html>"""
+
+
+def self_signed_cert(directory: str):
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+                   check=True, capture_output=True)
+    return cert, key
+
+
+class Site:
+    """HTTPS server with keep-alive that counts the connections it accepts"""
+
+    def __init__(self, cert: str, key: str, size: int, handshake_delay: float):
+        media = b"\x00\x00\x00\x18ftypmp42" + b"\x00" * (size - 12)
+        site = self
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                with site.lock:
+                    site.connections += 1
+                time.sleep(handshake_delay)
+                super().setup()
+
+            def _reply(self, body: bool):
+                with site.lock:
+                    site.requests += 1
+                if self.path.endswith(".html"):
+                    name = self.path[1:-5]
+                    content, content_type = PAGE.format(name=name).encode(), "text/html"
+                else:
+                    content, content_type = media, "video/mp4"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(content)
+
+            def do_HEAD(self):
+                self._reply(False)
+
+            def do_GET(self):
+                self._reply(True)
+
+            def log_message(self, *args):
+                pass
+
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset(self):
+        with self.lock:
+            self.connections = self.requests = 0
+
+
+def run_jobs(site: Site, jobs: int, workdir: str) -> dict:
+    site.reset()
+    ttfb, durations = [], []
+    for i in range(jobs):
+        job_dir = tempfile.mkdtemp(dir=workdir)
+        opts = {
+            'format': 'best',
+            'outtmpl': os.path.join(job_dir, "media.%(ext)s"),
+            'quiet': True,
+            'noprogress': True,
+            'no_warnings': True,
+            'nocheckcertificate': True,
+            'http_headers': dict(BROWSER_HEADERS),
+        }
+        first = []
+        started = time.perf_counter()
+
+        def progress(event):
+            if not first and event.get('downloaded_bytes'):
+                first.append(time.perf_counter() - started)
+
+        ytdl_runner.download(f"https://localhost:{site.server.server_port}/v{i}.html", opts, progress=progress)
+        durations.append(time.perf_counter() - started)
+        ttfb.append(first[0] if first else durations[-1])
+        shutil.rmtree(job_dir)
+    return {"connections": site.connections, "requests": site.requests, "ttfb": ttfb, "durations": durations}
+
+
+def report(name: str, result: dict, jobs: int):
+    ms = lambda values: sorted(values)[len(values) // 2] * 1000
+    print(f"{name:7s} {result['connections']:4d} handshakes for {result['requests']:3d} requests   "
+          f"TTFB p50 {ms(result['ttfb']):7.1f} ms   job p50 {ms(result['durations']):7.1f} ms   "
+          f"total {sum(result['durations']):6.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=20, help="downloads per mode")
+    parser.add_argument("--handshake-delay", type=float, default=0.05, help="seconds added to each new connection")
+    parser.add_argument("--size", type=int, default=256 * 1024, help="bytes per file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="upstream_bench_")
+    try:
+        site = Site(*self_signed_cert(workdir), args.size, args.handshake_delay)
+        print(f"{args.jobs} downloads of {args.size} bytes, {args.handshake_delay * 1000:.0f} ms per handshake")
+        # Warm up imports and extractor classes so neither mode pays for them
+        ydl_pool.ydl_pool.size = 0
+        run_jobs(site, 1, workdir)
+
+        fresh = run_jobs(site, args.jobs, workdir)
+        report("fresh", fresh, args.jobs)
+
+        ydl_pool.install_dns_cache()
+        ydl_pool.ydl_pool.size = 1
+        pooled = run_jobs(site, args.jobs, workdir)
+        report("pooled", pooled, args.jobs)
+        print(f"pool {ydl_pool.ydl_pool.stats()}")
+        ydl_pool.ydl_pool.close()
+        site.server.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Public blog listing
+/api/blogs pages through published posts newest first with a keyset cursor on
+(published_at, id): a page is an index range scan of ix_blogs_status_published
+starting where the previous one ended, so page 1000 costs what page 1 does
+(OFFSET reads and discards every row before the page). Only the columns a
+listing shows are selected, never the post bodies.
+
+The total is counted once per change to the posts (the "blogs" counter in
+cache_versions, bumped by the admin blog routes), not on every page.
+"""
+import json
+import time
+import base64
+import threading
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import func, or_
+
+from public_cache import PUBLIC_CACHE_CHECK_INTERVAL, read_version
+
+# Page size bounds for /api/blogs
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+VERSION_NAME = "blogs"
+
+LISTING_COLUMNS = ("id", "title", "slug", "excerpt", "author", "featured_image", "published_at", "updated_at")
+
+
+def encode_cursor(published_at: datetime, blog_id: int) -> str:
+    raw = json.dumps({"p": published_at.isoformat(), "i": blog_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(published_at, id) of the last post of the previous page. Raises ValueError for a malformed cursor."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(data["p"]), int(data["i"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def list_published(db, cursor: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> dict:
+    """{"items", "next_cursor"} for one page of published posts, newest first"""
+    from models import Blog
+    limit = max(1, min(limit, MAX_LIMIT))
+    query = db.query(*(getattr(Blog, c) for c in LISTING_COLUMNS)) \
+        .filter(Blog.status == "published", Blog.published_at.isnot(None))
+    if cursor:
+        published_at, blog_id = decode_cursor(cursor)
+        # The redundant <= gives the index scan its upper bound, the OR alone is only a filter
+        query = query.filter(Blog.published_at <= published_at,
+                             or_(Blog.published_at < published_at, Blog.id < blog_id))
+    # One extra row tells whether another page follows
+    rows = query.order_by(Blog.published_at.desc(), Blog.id.desc()).limit(limit + 1).all()
+    items = [dict(zip(LISTING_COLUMNS, row)) for row in rows[:limit]]
+    last = items[-1] if len(rows) > limit else None
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(last["published_at"], last["id"]) if last else None,
+    }
+
+
+class PublishedCount:
+    """Number of published posts, counted again only after the posts changed"""
+
+    def __init__(self, session_factory=None, check_interval: float = PUBLIC_CACHE_CHECK_INTERVAL):
+        self._session_factory = session_factory
+        self.check_interval = check_interval
+        self._count = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db) -> int:
+        if self._count is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._count
+        with self._lock:
+            now = time.monotonic()
+            if self._count is None or now - self._checked_at >= self.check_interval:
+                from models import Blog
+                version = read_version(db, VERSION_NAME)
+                if self._count is None or version != self._version:
+                    self._count = db.query(func.count(Blog.id)) \
+                        .filter(Blog.status == "published", Blog.published_at.isnot(None)).scalar()
+                    self._version = version
+                self._checked_at = now
+            return self._count
+
+    def invalidate(self):
+        """Count again on the next request"""
+        self._count = None
+
+
+published_count = PublishedCount()
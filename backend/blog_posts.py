@@ -0,0 +1,184 @@
+"""
+Blog post pages
+Post content is rendered and sanitized once when it is written, in
+create_blog/update_blog, and stored next to the source in Blog.content_html:
+HTML, as the admin editor writes it, is only sanitized (keeping its class and
+style attributes), anything else is rendered as Markdown first.
+/api/blogs/{slug} sends the rendered HTML only.
+
+Views are served from an LRU of the BLOG_CACHE_SIZE most recently read posts,
+each kept as its serialized body with an ETag and Last-Modified taken from
+updated_at, so a popular post costs no query and a reader holding it gets a
+304. The admin routes drop a post when it is updated or deleted; other workers
+clear theirs when the "blogs" counter in cache_versions moves.
+"""
+import os
+import re
+import json
+import time
+import calendar
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import NamedTuple, Optional
+
+import markdown
+import nh3
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+from public_cache import PUBLIC_CACHE_CHECK_INTERVAL, PUBLIC_CACHE_MAX_AGE, client_has, read_version
+
+# Posts kept rendered in memory per worker (0 = none)
+BLOG_CACHE_SIZE = int(os.getenv("BLOG_CACHE_SIZE", "256"))
+VERSION_NAME = "blogs"
+
+MARKDOWN_EXTENSIONS = ["extra", "sane_lists"]
+# Attributes a post may use on top of nh3's defaults (code class: fenced code language)
+EXTRA_ATTRIBUTES = {"a": {"title"}, "img": {"title", "loading"}, "code": {"class"}}
+# On every tag: what the admin editor's HTML carries for layout and styling
+GENERIC_ATTRIBUTES = {"class", "style", "title"}
+# Inline style properties kept; anything that can move content out of the post (position, ...) is dropped
+STYLE_PROPERTIES = {
+    "color", "background-color", "text-align", "text-decoration", "font-weight", "font-style",
+    "font-size", "font-family", "line-height", "vertical-align", "list-style-type",
+    "margin", "margin-top", "margin-right", "margin-bottom", "margin-left",
+    "padding", "padding-top", "padding-right", "padding-bottom", "padding-left",
+    "border", "border-radius", "width", "height", "max-width", "float",
+}
+
+ALLOWED_ATTRIBUTES = {tag: set(attrs) for tag, attrs in nh3.ALLOWED_ATTRIBUTES.items()}
+for _tag, _attrs in EXTRA_ATTRIBUTES.items():
+    ALLOWED_ATTRIBUTES.setdefault(_tag, set()).update(_attrs)
+ALLOWED_ATTRIBUTES["*"] = GENERIC_ATTRIBUTES
+
+# Block-level markup: the source was written as HTML (the admin editor), not Markdown
+HTML_SOURCE = re.compile(r"<(p|div|h[1-6]|ul|ol|li|br|table|blockquote|pre|figure|section|article|img)\b[^>]*>",
+                         re.IGNORECASE)
+
+PAGE_COLUMNS = ("id", "title", "slug", "content_html", "excerpt", "author", "featured_image",
+                "published_at", "updated_at", "meta_title", "meta_description")
+
+
+def is_html(source: str) -> bool:
+    return bool(HTML_SOURCE.search(source))
+
+
+def render_content(source: Optional[str]) -> str:
+    """Sanitized HTML of a post's source: HTML is only sanitized, anything else is rendered as Markdown"""
+    source = source or ""
+    # Markdown would turn indented HTML into code blocks, so HTML never goes through it
+    html = source if is_html(source) else markdown.markdown(source, extensions=MARKDOWN_EXTENSIONS,
+                                                             output_format="html")
+    return nh3.clean(html, attributes=ALLOWED_ATTRIBUTES, filter_style_properties=STYLE_PROPERTIES)
+
+
+class Page(NamedTuple):
+    content: bytes
+    etag: str
+    last_modified: float
+
+
+def _page(row) -> Page:
+    data = dict(zip(PAGE_COLUMNS, row))
+    # Posts written before rendering on save get theirs from init_db
+    data["content_html"] = data["content_html"] or ""
+    updated = data["updated_at"] or data["published_at"]
+    # The models store naive UTC datetimes
+    last_modified = calendar.timegm(updated.utctimetuple()) + updated.microsecond / 1e6 if updated else time.time()
+    content = json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")).encode()
+    return Page(content, '"%d-%d"' % (data["id"], int(last_modified * 1000000)), last_modified)
+
+
+class BlogPages:
+    """LRU of published posts by slug, as ready response bodies"""
+
+    def __init__(self, size: int = BLOG_CACHE_SIZE, session_factory=None,
+                 check_interval: float = PUBLIC_CACHE_CHECK_INTERVAL):
+        self.size = size
+        self._session_factory = session_factory
+        self.check_interval = check_interval
+        self._pages: "OrderedDict[str, Page]" = OrderedDict()
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "not_found": 0}
+
+    def _session(self):
+        if self._session_factory is None:
+            from database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def get(self, slug: str) -> Optional[Page]:
+        """The post's page, or None when no published post has this slug"""
+        if time.monotonic() - self._checked_at < self.check_interval:
+            with self._lock:
+                page = self._pages.get(slug)
+                if page is not None:
+                    self._pages.move_to_end(slug)
+                    self.counters["hits"] += 1
+                    return page
+        return self._load(slug)
+
+    def _load(self, slug: str) -> Optional[Page]:
+        from models import Blog
+        db = self._session()
+        try:
+            now = time.monotonic()
+            if now - self._checked_at >= self.check_interval:
+                version = read_version(db, VERSION_NAME)
+                with self._lock:
+                    if version != self._version:
+                        # Posts changed through some worker, the cached ones may be stale
+                        self._pages.clear()
+                        self._version = version
+                    self._checked_at = now
+                    page = self._pages.get(slug)
+                    if page is not None:
+                        self._pages.move_to_end(slug)
+                        self.counters["hits"] += 1
+                        return page
+            row = db.query(*(getattr(Blog, c) for c in PAGE_COLUMNS)) \
+                .filter(Blog.slug == slug, Blog.status == "published").first()
+        finally:
+            db.close()
+        if row is None:
+            self.counters["not_found"] += 1
+            return None
+        page = _page(row)
+        self.counters["misses"] += 1
+        if self.size > 0:
+            with self._lock:
+                self._pages[slug] = page
+                self._pages.move_to_end(slug)
+                while len(self._pages) > self.size:
+                    self._pages.popitem(last=False)
+        return page
+
+    def invalidate(self, *slugs: str):
+        """Drop posts from this worker's cache (call after committing the write)"""
+        with self._lock:
+            for slug in slugs:
+                self._pages.pop(slug, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            cached = len(self._pages)
+        return {"cached": cached, "size": self.size, **self.counters}
+
+
+def page_response(request: Request, page: Page, max_age: int = PUBLIC_CACHE_MAX_AGE) -> Response:
+    """The post's body, or a 304 when the reader already has this version"""
+    headers = {
+        "ETag": page.etag,
+        "Last-Modified": formatdate(page.last_modified, usegmt=True),
+        "Cache-Control": f"public, max-age={max_age}",
+    }
+    if client_has(request, page.etag, page.last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(content=page.content, media_type="application/json", headers=headers)
+
+
+blog_pages = BlogPages()
@@ -0,0 +1,176 @@
+"""
+Clip engine
+Clips are fetched by yt-dlp as a stream-copied section (ffmpeg seeks the source,
+so only the needed byte ranges / HLS fragments are requested). Then, per request:
+
+  fast      keep the stream copy; the cut snaps to the keyframe before the start
+            (hidden by an edit list) and nothing is re-encoded
+  accurate  re-encode only the partial GOPs at both boundaries and stream-copy the
+            keyframe-aligned middle (H.264/HEVC); other codecs re-encode the clip.
+            Opt-in: the re-encoded GOPs do not carry the source's profile, level or
+            parameter sets, and some players stall at the splice points.
+"""
+import os
+import re
+import shutil
+import subprocess
+from typing import Callable, List, Optional, Tuple
+
+CLIP_MODES = ('fast', 'accurate')
+# Mode used when a request does not choose one
+CLIP_MODE = os.getenv("CLIP_MODE", "fast").lower()
+# Encoder settings for re-encoded boundary GOPs
+CLIP_ENCODER_PRESET = os.getenv("CLIP_ENCODER_PRESET", "veryfast")
+CLIP_ENCODER_CRF = os.getenv("CLIP_ENCODER_CRF", "18")
+
+# Source codecs whose boundary GOPs can be re-encoded and spliced with the copied middle
+SMART_CUT_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265'}
+# Keyframes closer than this to a cut point count as being on it (seconds)
+KEYFRAME_TOLERANCE = 0.05
+
+_TIME_RE = re.compile(r'^\d+(\.\d+)?$')
+
+
+def parse_time(value) -> float:
+    """Seconds from "SS", "MM:SS" or "HH:MM:SS" (fractions allowed in the last part).
+
+    Raises ValueError for anything else, including minutes/seconds of 60 or more.
+    """
+    if isinstance(value, (int, float)):
+        if value < 0:
+            raise ValueError(f"Negative time: {value}")
+        return float(value)
+    parts = str(value).strip().split(':')
+    if not 1 <= len(parts) <= 3 or not all(_TIME_RE.match(p) for p in parts):
+        raise ValueError(f"Invalid time: {value!r}, expected HH:MM:SS")
+    if any('.' in p for p in parts[:-1]):
+        raise ValueError(f"Invalid time: {value!r}, only seconds may have a fraction")
+    numbers = [float(p) for p in parts]
+    if len(numbers) > 1 and any(n >= 60 for n in numbers[1:]):
+        raise ValueError(f"Invalid time: {value!r}, minutes and seconds must be below 60")
+    seconds = 0.0
+    for n in numbers:
+        seconds = seconds * 60 + n
+    return round(seconds, 3)
+
+
+def parse_clip(start_time=None, end_time=None, mode: str = None, duration: float = None) -> Optional[tuple]:
+    """(start_seconds, end_seconds, mode) for a clip request, or None for the whole video.
+
+    The end is clamped to duration when it is known. Raises ValueError for invalid ranges.
+    """
+    if not start_time and not end_time:
+        return None
+    start = parse_time(start_time) if start_time else 0.0
+    end = parse_time(end_time) if end_time else duration
+    if end is None:
+        raise ValueError("An end time is required when the video duration is unknown")
+    if duration:
+        end = min(end, float(duration))
+    if end <= start:
+        raise ValueError("The end time must be after the start time")
+    mode = (mode or CLIP_MODE).lower()
+    if mode not in CLIP_MODES:
+        raise ValueError(f"Unknown clip mode: {mode}, expected one of {', '.join(CLIP_MODES)}")
+    return (start, end, mode)
+
+
+def clip_mode(clip: tuple) -> str:
+    return clip[2] if len(clip) > 2 else CLIP_MODE
+
+
+def ffmpeg_binary(location: str = None) -> str:
+    """ffmpeg executable from a yt-dlp ffmpeg_location (directory or file) or PATH"""
+    if location:
+        path = location if os.path.isfile(location) else os.path.join(location, 'ffmpeg')
+        if os.path.exists(path):
+            return path
+    return shutil.which('ffmpeg') or 'ffmpeg'
+
+
+def _run(args: List[str], should_cancel: Callable = None) -> str:
+    """Run ffmpeg, polling should_cancel; returns stderr"""
+    proc = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    while True:
+        try:
+            _, stderr = proc.communicate(timeout=0.5)
+            break
+        except subprocess.TimeoutExpired:
+            if should_cancel and should_cancel():
+                proc.kill()
+                proc.communicate()
+                raise RuntimeError('Job cancelled')
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.strip().splitlines()[-1] if stderr.strip() else proc.returncode}")
+    return stderr
+
+
+def video_codec(path: str, ffmpeg: str) -> Optional[str]:
+    proc = subprocess.run([ffmpeg, '-hide_banner', '-i', path], capture_output=True, text=True)
+    match = re.search(r'Stream #\S+.*?: Video: (\w+)', proc.stderr)
+    return match.group(1) if match else None
+
+
+def keyframes(path: str, ffmpeg: str, should_cancel: Callable = None) -> List[float]:
+    """Presentation times of the video keyframes (only keyframes are decoded)"""
+    stderr = _run([ffmpeg, '-hide_banner', '-nostats', '-skip_frame', 'nokey', '-i', path,
+                   '-map', '0:v:0', '-vf', 'showinfo', '-f', 'null', '-'], should_cancel)
+    return sorted(float(t) for t in re.findall(r'pts_time:(-?[\d.]+)', stderr))
+
+
+def boundary_keyframes(frames: List[float], length: float) -> Tuple[Optional[float], Optional[float]]:
+    """First keyframe at/after the start (0) and last one before the end, or (None, None)"""
+    inside = [k for k in frames if -KEYFRAME_TOLERANCE <= k < length - KEYFRAME_TOLERANCE]
+    if len(inside) < 2:
+        return None, None
+    return max(inside[0], 0.0), inside[-1]
+
+
+def accurate_cut(path: str, length: float, ffmpeg: str = 'ffmpeg', should_cancel: Callable = None) -> str:
+    """Make a stream-copied section frame-accurate, re-encoding as little as possible.
+
+    path is a section whose timeline starts at the clip start; length is the clip
+    length. Returns the path of the new file (same container), path is removed.
+    """
+    workdir = os.path.dirname(path)
+    base, ext = os.path.splitext(path)
+    output = f"{base}.cut{ext}"
+    mux = ['-movflags', '+faststart'] if ext.lower() in ('.mp4', '.m4v', '.mov') else []
+    codec = video_codec(path, ffmpeg)
+    encoder = SMART_CUT_ENCODERS.get(codec)
+    k1 = k2 = None
+    if encoder:
+        k1, k2 = boundary_keyframes(keyframes(path, ffmpeg, should_cancel), length)
+
+    if k1 is None:
+        # No codec we can splice, or no whole GOP inside the clip: re-encode it all
+        _run([ffmpeg, '-hide_banner', '-y', '-i', path, '-t', f"{length:.3f}", '-map', '0', *mux, output],
+             should_cancel)
+    else:
+        encode = ['-c:v', encoder, '-preset', CLIP_ENCODER_PRESET, '-crf', CLIP_ENCODER_CRF, '-pix_fmt', 'yuv420p']
+        parts = []
+        if k1 > KEYFRAME_TOLERANCE:
+            # Partial GOP before the first keyframe
+            parts.append(('head', ['-i', path, '-t', f"{k1:.3f}"], encode))
+        parts.append(('middle', ['-ss', f"{k1:.3f}", '-i', path, '-t', f"{k2 - k1:.3f}"], ['-c', 'copy']))
+        # Partial GOP after the last keyframe
+        parts.append(('tail', ['-ss', f"{k2:.3f}", '-i', path, '-t', f"{length - k2:.3f}"], encode))
+
+        listing = os.path.join(workdir, 'parts.txt')
+        with open(listing, 'w') as f:
+            for name, inputs, codec_args in parts:
+                part = os.path.join(workdir, f"{name}.mp4")
+                _run([ffmpeg, '-hide_banner', '-y', *inputs, '-map', '0:v:0', '-an', *codec_args, part],
+                     should_cancel)
+                f.write(f"file '{part}'\n")
+
+        # Spliced video with the original audio, copied and trimmed to the clip
+        _run([ffmpeg, '-hide_banner', '-y', '-f', 'concat', '-safe', '0', '-i', listing, '-i', path,
+              '-map', '0:v:0', '-map', '1:a?', '-c', 'copy', '-t', f"{length:.3f}", *mux, output],
+             should_cancel)
+        for name, _, _ in parts:
+            os.remove(os.path.join(workdir, f"{name}.mp4"))
+        os.remove(listing)
+
+    os.remove(path)
+    return output
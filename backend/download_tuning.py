@@ -0,0 +1,156 @@
+"""
+Download tuning
+Per-extractor yt-dlp transfer options (parallel HLS/DASH fragments, HTTP chunk
+size, buffer size, retries with backoff) read from the Settings table, and a
+global connection budget so the fragments of all running jobs stay bounded.
+
+Settings:
+  download_tuning          json  {"default": {...}, "Youtube": {...}, "Twitch": {...}}
+  download_max_connections int   ceiling for concurrent fragment connections; jobs
+                                 wait for a free one when all are in use
+"""
+import json
+import time
+import threading
+
+# Used when the Settings table has no download_tuning entry for an extractor
+DEFAULT_TUNING = {
+    "concurrent_fragments": 4,
+    "http_chunk_size": 10 * 1024 * 1024,  # split plain HTTP downloads (avoids YouTube throttling)
+    "buffer_size": 64 * 1024,
+    "retries": 10,
+    "fragment_retries": 10,
+    "retry_backoff": [1, 30],  # exponential: base seconds, max seconds
+}
+DEFAULT_MAX_CONNECTIONS = 16
+# Seconds the Settings values are reused before they are read again
+SETTINGS_TTL = 30
+
+
+def default_settings():
+    """(key, value, type, description) rows created by init_db"""
+    return [
+        ("download_tuning", json.dumps({
+            "default": DEFAULT_TUNING,
+            "Youtube": {"concurrent_fragments": 8},
+            "Twitch": {"concurrent_fragments": 8},
+        }), "json", "Per-extractor download tuning (fragments, chunk/buffer size, retries)"),
+        ("download_max_connections", str(DEFAULT_MAX_CONNECTIONS), "int",
+         "Maximum concurrent fragment connections across all downloads"),
+    ]
+
+
+def extractor_for(source_key: str, info: dict = None) -> str:
+    """Extractor name of a job, from cached info or the info_cache key (IEKey:id)"""
+    if info and info.get("extractor_key"):
+        return info["extractor_key"]
+    if "://" not in source_key and ":" in source_key:
+        return source_key.split(":", 1)[0]
+    return "Generic"
+
+
+class DownloadTuning:
+    """Reads tuning from the Settings table (cached) and hands out fragment connections"""
+
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory
+        self._settings = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._freed = threading.Condition(self._lock)
+        self._in_use = 0
+        self._waiting = 0
+
+    def _load(self) -> dict:
+        now = time.monotonic()
+        if self._settings is not None and now - self._loaded_at < SETTINGS_TTL:
+            return self._settings
+        settings = {"tuning": {}, "max_connections": DEFAULT_MAX_CONNECTIONS}
+        try:
+            from models import Settings
+            if self._session_factory is None:
+                from database import SessionLocal
+                self._session_factory = SessionLocal
+            db = self._session_factory()
+            try:
+                rows = db.query(Settings).filter(
+                    Settings.key.in_(["download_tuning", "download_max_connections"])).all()
+            finally:
+                db.close()
+            for row in rows:
+                if row.key == "download_tuning" and row.value:
+                    settings["tuning"] = json.loads(row.value)
+                elif row.key == "download_max_connections" and row.value:
+                    settings["max_connections"] = max(1, int(row.value))
+        except Exception as e:
+            print(f"Download tuning settings error: {e}")
+            if self._settings is not None:
+                return self._settings
+        self._settings, self._loaded_at = settings, now
+        return settings
+
+    def invalidate(self):
+        """Re-read the Settings table on the next job"""
+        self._settings = None
+
+    def for_extractor(self, extractor: str) -> dict:
+        tuning = self._load()["tuning"]
+        result = dict(DEFAULT_TUNING)
+        result.update(tuning.get("default") or {})
+        result.update(tuning.get(extractor) or {})
+        return result
+
+    # --- Global connection budget ---
+
+    def acquire(self, wanted: int, cancelled=None) -> int:
+        """Reserve between 1 and wanted fragment connections, waiting while none is free.
+        Returns 0 when cancelled() becomes true while waiting."""
+        with self._lock:
+            self._waiting += 1
+        try:
+            while True:
+                # Settings may change while a job waits; read them (and cancelled()) unlocked
+                limit = self._load()["max_connections"]
+                with self._lock:
+                    free = limit - self._in_use
+                    if free > 0:
+                        granted = min(max(1, wanted), free)
+                        self._in_use += granted
+                        return granted
+                    self._freed.wait(timeout=1)
+                if cancelled is not None and cancelled():
+                    return 0
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def release(self, granted: int):
+        with self._lock:
+            self._in_use = max(0, self._in_use - granted)
+            self._freed.notify_all()
+
+    def stats(self) -> dict:
+        limit = self._load()["max_connections"]
+        with self._lock:
+            return {"connections_in_use": self._in_use, "jobs_waiting": self._waiting,
+                    "max_connections": limit}
+
+
+def ydl_options(tuning: dict, fragments: int) -> dict:
+    """yt-dlp options for tuning (plain values so they can be sent to worker processes)"""
+    opts = {
+        "concurrent_fragment_downloads": fragments,
+        "retries": tuning.get("retries"),
+        "fragment_retries": tuning.get("fragment_retries"),
+    }
+    if tuning.get("http_chunk_size"):
+        opts["http_chunk_size"] = int(tuning["http_chunk_size"])
+    if tuning.get("buffer_size"):
+        opts["buffersize"] = int(tuning["buffer_size"])
+    if tuning.get("retry_backoff"):
+        # Turned into retry_sleep_functions by ytdl_runner.download
+        opts["retry_backoff"] = list(tuning["retry_backoff"])
+    return {k: v for k, v in opts.items() if v is not None}
+
+
+download_tuning = DownloadTuning()
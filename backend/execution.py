@@ -0,0 +1,153 @@
+"""
+yt-dlp execution backends
+"thread" runs extraction on a bounded thread pool and downloads in the calling
+scheduler thread (the original in-process behaviour).
+"process" runs both in a pool of warm worker processes that are recycled after
+a number of jobs, so extractor CPU work scales across cores.
+"""
+import os
+import queue
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Dict
+
+import ytdl_runner
+from ydl_pool import install_dns_cache, ydl_pool
+
+logger = logging.getLogger(__name__)
+
+# "thread" or "process"
+EXECUTION_BACKEND = os.getenv("EXECUTION_BACKEND", "thread").lower()
+# Threads (thread backend) or processes (process backend) available for yt-dlp work
+EXECUTION_WORKERS = int(os.getenv("EXECUTION_WORKERS", str(os.cpu_count() or 2)))
+# Worker processes are replaced after this many jobs to contain leaks
+EXECUTION_MAX_TASKS_PER_CHILD = int(os.getenv("EXECUTION_MAX_TASKS_PER_CHILD", "50"))
+
+
+class ThreadExecutor:
+    """Runs yt-dlp inside the API process"""
+    name = "thread"
+
+    def __init__(self, workers: int = EXECUTION_WORKERS):
+        self.workers = max(1, workers)
+        self._pool = None
+        self._cancelled = set()
+
+    def start(self):
+        if not self._pool:
+            install_dns_cache()
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ytdl-info")
+
+    def stop(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        ydl_pool.close()
+
+    def extract_info(self, url: str, opts: dict = None) -> Future:
+        self.start()
+        return self._pool.submit(ytdl_runner.extract_info, url, opts)
+
+    def download(self, job_id: str, url: str, opts: dict, clip: tuple = None, on_progress: Callable = None, info: dict = None):
+        """Blocking download, runs in the caller's (scheduler worker) thread. Returns the output path."""
+        try:
+            return ytdl_runner.download(url, opts, clip, on_progress, info, lambda: job_id in self._cancelled)
+        finally:
+            self._cancelled.discard(job_id)
+
+    def cancel(self, job_id: str):
+        """Ask a running download to abort at its next progress/post-processor hook"""
+        self._cancelled.add(job_id)
+
+
+class ProcessExecutor:
+    """Runs yt-dlp in a pool of recycled worker processes"""
+    name = "process"
+
+    def __init__(self, workers: int = EXECUTION_WORKERS, max_tasks_per_child: int = EXECUTION_MAX_TASKS_PER_CHILD):
+        self.workers = max(1, workers)
+        self.max_tasks_per_child = max(1, max_tasks_per_child)
+        self._pool = None
+        self._progress_queue = None
+        self._manager = None
+        self._cancelled = None
+        self._listeners: Dict[str, Callable] = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._pool:
+                return
+            # max_tasks_per_child is incompatible with fork
+            ctx = multiprocessing.get_context("spawn")
+            self._progress_queue = ctx.Queue()
+            self._manager = ctx.Manager()
+            self._cancelled = self._manager.dict()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=ctx,
+                initializer=ytdl_runner.init_worker,
+                initargs=(self._progress_queue, self._cancelled),
+                max_tasks_per_child=self.max_tasks_per_child,
+            )
+            threading.Thread(target=self._pump_progress, args=(self._progress_queue,),
+                             name="ytdl-progress", daemon=True).start()
+        logger.info(f"Process executor started with {self.workers} workers")
+
+    def stop(self):
+        with self._lock:
+            if self._pool:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._progress_queue.put(None)
+                self._manager.shutdown()
+                self._pool = None
+
+    def extract_info(self, url: str, opts: dict = None) -> Future:
+        self.start()
+        return self._pool.submit(ytdl_runner.extract_info_in_worker, url, opts)
+
+    def download(self, job_id: str, url: str, opts: dict, clip: tuple = None, on_progress: Callable = None, info: dict = None):
+        """Blocking download, runs in a worker process while the caller waits. Returns the output path."""
+        self.start()
+        if on_progress:
+            self._listeners[job_id] = on_progress
+        try:
+            return self._pool.submit(ytdl_runner.download_in_worker, job_id, url, opts, clip, info).result()
+        finally:
+            self._listeners.pop(job_id, None)
+            self._cancelled.pop(job_id, None)
+
+    def cancel(self, job_id: str):
+        """Flag a download so its worker process aborts at the next hook"""
+        if self._cancelled is not None:
+            self._cancelled[job_id] = True
+
+    def _pump_progress(self, progress_queue):
+        # Forward progress events from worker processes to the registered callbacks
+        while True:
+            try:
+                item = progress_queue.get()
+            except (EOFError, OSError, queue.Empty):
+                return
+            if item is None:
+                return
+            job_id, event = item
+            callback = self._listeners.get(job_id)
+            if callback:
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.error(f"Progress callback for {job_id} failed: {e}")
+
+
+def create_executor(backend: str = EXECUTION_BACKEND):
+    if backend == "process":
+        return ProcessExecutor()
+    if backend != "thread":
+        logger.warning(f"Unknown EXECUTION_BACKEND '{backend}', falling back to 'thread'")
+    return ThreadExecutor()
+
+
+executor = create_executor()
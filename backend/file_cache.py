@@ -0,0 +1,292 @@
+"""
+Finished-file cache
+Completed downloads are kept on disk under a content-addressed name derived from
+(extractor + video id, format selector, clip range) so repeat requests are served
+without downloading again. Disk usage is bounded by a byte budget with LRU or LFU
+eviction; files that are pinned by a job or being streamed are never evicted.
+
+Pins and reference counts are kept per process. Workers sharing the directory
+tell each other about the files they hold through the files' mtime: holding a
+file stamps it (again on every sweep), and a worker does not remove a file
+stamped within FILE_CACHE_LEASE seconds unless the stamp is its own. Temporary
+and partial files are only cleaned up once they are older than the lease, as
+another worker may still be writing them.
+"""
+import os
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FILE_CACHE_DIR = os.getenv("FILE_CACHE_DIR", "downloads")
+# Total size of cached files before eviction kicks in (default 5 GB)
+FILE_CACHE_MAX_BYTES = int(os.getenv("FILE_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+# Files not requested for this long are removed by the periodic sweep (seconds)
+FILE_CACHE_MAX_AGE = int(os.getenv("FILE_CACHE_MAX_AGE", str(24 * 60 * 60)))
+# "lru" (least recently used) or "lfu" (least frequently used)
+FILE_CACHE_POLICY = os.getenv("FILE_CACHE_POLICY", "lru").lower()
+# Seconds a file held by another worker (or a temp file it is writing) is left alone;
+# keep it above JOB_SWEEP_INTERVAL, which renews the holds
+FILE_CACHE_LEASE = int(os.getenv("FILE_CACHE_LEASE", "300"))
+
+
+def make_key(source_key: str, format_id: str, clip: tuple = None) -> str:
+    """Content address for a finished file.
+
+    source_key identifies the video (see info_cache.cache_key), clip is an
+    optional (start_seconds, end_seconds, mode) range.
+    """
+    fmt = "".join((format_id or "").split())
+    clip_part = "-".join(map(str, clip)) if clip else "full"
+    raw = f"{source_key}|{fmt}|{clip_part}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("path", "size", "last_access", "hits", "refs", "stamp")
+
+    def __init__(self, path: str, size: int, last_access: float, stamp: int = None):
+        self.path = path
+        self.size = size
+        self.last_access = last_access
+        self.hits = 0
+        self.refs = 0
+        self.stamp = stamp  # st_mtime_ns this process last saw or set on the file
+
+
+class FileCache:
+    """Byte-budgeted, reference-counted cache of finished downloads"""
+
+    def __init__(self, directory: str = FILE_CACHE_DIR, max_bytes: int = FILE_CACHE_MAX_BYTES,
+                 max_age: int = FILE_CACHE_MAX_AGE, policy: str = FILE_CACHE_POLICY, lease: int = FILE_CACHE_LEASE):
+        # Absolute so paths recorded in a shared job store work from any worker
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.policy = policy
+        self.lease = lease
+        self._entries: Dict[str, _Entry] = {}  # key -> entry
+        self._by_path: Dict[str, str] = {}  # path -> key
+        self._pins: Dict[str, str] = {}  # job_id -> path
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted_bytes = 0
+
+    def load(self):
+        """Rebuild the index from the files already in the cache directory"""
+        os.makedirs(self.directory, exist_ok=True)
+        cutoff = time.time() - self.lease
+        with self._lock:
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if not os.path.isfile(path):
+                    continue
+                key, ext = os.path.splitext(name)
+                if len(key) != 64 or ext in (".part", ".ytdl", ".tmp"):
+                    # Leftovers from an interrupted store, unless another worker is writing it now
+                    if st.st_mtime < cutoff:
+                        self._remove_file(path)
+                    continue
+                self._entries[key] = _Entry(path, st.st_size, st.st_mtime, st.st_mtime_ns)
+                self._by_path[path] = key
+        logger.info(f"File cache loaded {len(self._entries)} files ({self.total_bytes()} bytes)")
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Path of the cached file for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and os.path.exists(entry.path):
+                entry.last_access = time.time()
+                entry.hits += 1
+                self.hits += 1
+                return entry.path
+            if entry:
+                self._forget(key)
+            self.misses += 1
+            return None
+
+    def store(self, key: str, src_path: str, job_id: str = None) -> str:
+        """Move a finished file into the cache and return its new path.
+
+        With job_id the new file is pinned for that job before anything is evicted,
+        so the budget check can never remove the file the job is about to report.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        ext = os.path.splitext(src_path)[1]
+        path = os.path.join(self.directory, f"{key}{ext}")
+        tmp_path = f"{path}.tmp"
+        # Copy across filesystems first, then publish atomically
+        shutil.move(src_path, tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            old = self._entries.get(key)
+            st = os.stat(path)
+            entry = _Entry(path, st.st_size, time.time(), st.st_mtime_ns)
+            if old:
+                entry.hits = old.hits
+                if old.path == path:
+                    entry.refs = old.refs
+                else:
+                    # Same content stored under another extension: the old file leaves the
+                    # index (its holders release by that path, a no-op now) and the disk
+                    # (open readers keep their descriptor)
+                    self._by_path.pop(old.path, None)
+                    self._remove_file(old.path)
+            self._entries[key] = entry
+            self._by_path[path] = key
+            if job_id and job_id not in self._pins:
+                self._pins[job_id] = path
+                entry.refs += 1
+                self._stamp(entry)
+        self.evict()
+        return path
+
+    # --- Reference counting ---
+
+    def acquire(self, path: str):
+        with self._lock:
+            key = self._by_path.get(path)
+            if key:
+                entry = self._entries[key]
+                entry.refs += 1
+                self._stamp(entry)
+
+    def release(self, path: str):
+        with self._lock:
+            key = self._by_path.get(path)
+            if key:
+                entry = self._entries[key]
+                entry.refs = max(0, entry.refs - 1)
+
+    def pin(self, job_id: str, path: str):
+        """Keep path on disk until unpin(job_id), e.g. until the job has been served"""
+        with self._lock:
+            if job_id in self._pins:
+                return
+            self._pins[job_id] = path
+        self.acquire(path)
+
+    def unpin(self, job_id: str):
+        with self._lock:
+            path = self._pins.pop(job_id, None)
+        if path:
+            self.release(path)
+
+    def pinned_jobs(self) -> List[str]:
+        with self._lock:
+            return list(self._pins)
+
+    # --- Eviction ---
+
+    def evict(self, target_bytes: int = None) -> int:
+        """Evict unreferenced files until the cache fits target_bytes. Returns bytes freed."""
+        target = self.max_bytes if target_bytes is None else target_bytes
+        freed = 0
+        with self._lock:
+            total = sum(e.size for e in self._entries.values())
+            if total <= target:
+                return 0
+            if self.policy == "lfu":
+                order = sorted(self._entries.items(), key=lambda kv: (kv[1].hits, kv[1].last_access))
+            else:
+                order = sorted(self._entries.items(), key=lambda kv: kv[1].last_access)
+            for key, entry in order:
+                if total <= target:
+                    break
+                if entry.refs > 0 or self._held_elsewhere(entry):
+                    continue
+                self._remove_file(entry.path)
+                self._forget(key)
+                total -= entry.size
+                freed += entry.size
+            self.evicted_bytes += freed
+        if freed:
+            logger.info(f"File cache evicted {freed} bytes")
+        return freed
+
+    def sweep(self) -> int:
+        """Remove unreferenced files older than max_age and enforce the byte budget"""
+        cutoff = time.time() - self.max_age
+        freed = 0
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.refs > 0:
+                    # Renew this worker's hold before other workers' leases on it run out
+                    self._stamp(entry)
+            for key, entry in list(self._entries.items()):
+                if entry.refs == 0 and entry.last_access < cutoff and not self._held_elsewhere(entry):
+                    self._remove_file(entry.path)
+                    self._forget(key)
+                    freed += entry.size
+            self.evicted_bytes += freed
+        return freed + self.evict()
+
+    def clear(self) -> int:
+        """Remove every unreferenced file. Returns the number of files removed."""
+        with self._lock:
+            removed = 0
+            for key, entry in list(self._entries.items()):
+                if entry.refs == 0 and not self._held_elsewhere(entry):
+                    self._remove_file(entry.path)
+                    self._forget(key)
+                    removed += 1
+            return removed
+
+    def total_bytes(self) -> int:
+        return sum(e.size for e in list(self._entries.values()))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "files": len(self._entries),
+                "bytes": sum(e.size for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "policy": self.policy,
+                "referenced": sum(1 for e in self._entries.values() if e.refs),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evicted_bytes": self.evicted_bytes,
+            }
+
+    def _stamp(self, entry: _Entry):
+        """Mark the file as held by this worker (see the module docstring)"""
+        now = time.time_ns()
+        try:
+            os.utime(entry.path, ns=(now, now))
+            entry.stamp = now
+        except OSError:
+            pass
+
+    def _held_elsewhere(self, entry: _Entry) -> bool:
+        """Whether another worker stamped the file within the lease"""
+        try:
+            mtime = os.stat(entry.path).st_mtime_ns
+        except OSError:
+            return False
+        return mtime != entry.stamp and mtime > time.time_ns() - self.lease * 1_000_000_000
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._by_path.pop(entry.path, None)
+
+    def _remove_file(self, path: str):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            logger.error(f"Error removing cached file {path}: {e}")
+
+
+file_cache = FileCache()
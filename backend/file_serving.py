@@ -0,0 +1,99 @@
+"""
+File serving
+Sends finished files with HTTP Range / If-Range / ETag support so interrupted
+downloads can resume and download managers can fetch segments in parallel.
+
+The bytes are moved without passing through Python where the stack allows it:
+handed to a front proxy (X-Accel-Redirect for nginx, X-Sendfile for Apache or
+lighttpd) or to an ASGI server implementing the pathsend extension. Otherwise
+the app reads the file in large chunks. A served file stays pinned for a grace
+window after its last transfer, so a dropped connection can pick up where it
+stopped instead of redoing the job.
+"""
+import os
+import time
+from typing import Callable, Optional
+from urllib.parse import quote
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+# "", "x-accel" (nginx X-Accel-Redirect) or "x-sendfile" (Apache/lighttpd X-Sendfile)
+SERVE_OFFLOAD = os.getenv("SERVE_OFFLOAD", "").lower()
+# Internal nginx location that maps to FILE_CACHE_DIR, used with x-accel
+SERVE_ACCEL_PREFIX = os.getenv("SERVE_ACCEL_PREFIX", "/protected-downloads/")
+# Seconds a file stays pinned after its last transfer so the client can resume it
+SERVE_GRACE_SECONDS = int(os.getenv("SERVE_GRACE_SECONDS", "900"))
+# Bytes per read when the app sends the file itself
+SERVE_CHUNK_SIZE = int(os.getenv("SERVE_CHUNK_SIZE", str(1024 * 1024)))
+
+
+class ResumableFileResponse(FileResponse):
+    """FileResponse (Range, If-Range, ETag, pathsend) that reports what it sent.
+
+    on_done(response, seconds) is called when the response ends, including when
+    the client disconnects mid-transfer (then complete is False).
+    """
+    chunk_size = SERVE_CHUNK_SIZE
+
+    def __init__(self, *args, on_done: Callable = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_done = on_done
+        self.sent_status: Optional[int] = None
+        self.bytes_sent = 0
+        self.complete = False
+
+    async def __call__(self, scope, receive, send):
+        async def tracking_send(message):
+            if message['type'] == 'http.response.start':
+                self.sent_status = message['status']
+            elif message['type'] == 'http.response.body':
+                self.bytes_sent += len(message.get('body', b''))
+                self.complete = not message.get('more_body', False)
+            elif message['type'] == 'http.response.pathsend':
+                self.bytes_sent = int(self.headers['content-length'])
+                self.complete = True
+            await send(message)
+
+        started = time.monotonic()
+        try:
+            await super().__call__(scope, receive, tracking_send)
+        finally:
+            if self.on_done:
+                self.on_done(self, time.monotonic() - started)
+
+
+def not_modified(request: Request, response: FileResponse) -> Optional[Response]:
+    """304 response when the client's If-None-Match already has this file"""
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return None
+    etag = response.headers.get('etag')
+    tags = [t.strip().removeprefix('W/') for t in if_none_match.split(',')]
+    if '*' not in tags and etag not in tags:
+        return None
+    return Response(status_code=304, headers={
+        'etag': etag,
+        'last-modified': response.headers.get('last-modified'),
+    })
+
+
+def offload_response(path: str, filename: str, media_type: str, root: str) -> Optional[Response]:
+    """Empty response telling the front proxy to send path itself, or None when not configured"""
+    if SERVE_OFFLOAD == 'x-accel':
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(root))
+        header = ('X-Accel-Redirect', SERVE_ACCEL_PREFIX.rstrip('/') + '/' + quote(relative))
+    elif SERVE_OFFLOAD == 'x-sendfile':
+        header = ('X-Sendfile', os.path.abspath(path))
+    else:
+        return None
+    return Response(media_type=media_type, headers={
+        header[0]: header[1],
+        'Content-Disposition': f'attachment; filename="{filename}"',
+    })
+
+
+def grace_expired(job: dict, now: float = None) -> bool:
+    """Whether a served job's file no longer needs to be kept for resumes"""
+    served = job.get('_last_served')
+    return bool(served) and (now or time.time()) - served > SERVE_GRACE_SECONDS
@@ -0,0 +1,166 @@
+"""
+Format planning
+Chooses video/audio format pairs that ffmpeg can merge with stream copy
+(H.264/AV1 + AAC into mp4, VP9/AV1 + Opus into webm) so a download never needs
+a re-encode unless the user explicitly asks for another container or codec.
+"""
+from typing import List, Optional, Tuple
+
+# Containers a merge can stream-copy into, with the codecs they accept
+COPY_CONTAINERS = {
+    'mp4': (('avc1', 'h264', 'hev1', 'hvc1', 'av01'), ('mp4a', 'aac')),
+    'webm': (('vp8', 'vp9', 'vp09', 'av01'), ('opus', 'vorbis')),
+}
+# Containers the user may explicitly ask for; anything that can't be copied is transcoded
+AUDIO_TARGETS = ('mp3', 'm4a', 'opus', 'wav', 'flac')
+VIDEO_TARGETS = ('mp4', 'webm', 'mkv')
+
+# yt-dlp picks the first container the merged streams fit into, mkv fits anything
+MERGE_OUTPUT_FORMAT = 'mp4/webm/mkv'
+
+
+def _codec(value: Optional[str]) -> str:
+    return (value or 'none').split('.')[0].lower()
+
+
+def _has_video(f: dict) -> bool:
+    return _codec(f.get('vcodec')) != 'none'
+
+
+def _has_audio(f: dict) -> bool:
+    return _codec(f.get('acodec')) != 'none'
+
+
+def copy_container(video: dict, audio: dict) -> Optional[str]:
+    """Container both streams can be copied into, or None"""
+    vcodec, acodec = _codec(video.get('vcodec')), _codec(audio.get('acodec'))
+    for ext, (video_codecs, audio_codecs) in COPY_CONTAINERS.items():
+        if vcodec.startswith(video_codecs) and acodec.startswith(audio_codecs):
+            return ext
+    return None
+
+
+def _size(f: dict) -> Optional[int]:
+    return f.get('filesize') or f.get('filesize_approx')
+
+
+def best_audio(formats: List[dict], prefer: str = None) -> Optional[dict]:
+    """Best audio-only format, optionally preferring one compatible with a container"""
+    audios = [f for f in formats if _has_audio(f) and not _has_video(f)]
+    if not audios:
+        return None
+    codecs = COPY_CONTAINERS.get(prefer, ((), ()))[1]
+    return max(audios, key=lambda f: (
+        bool(codecs) and _codec(f.get('acodec')).startswith(codecs),
+        f.get('ext') == 'm4a',
+        f.get('abr') or f.get('tbr') or 0,
+    ))
+
+
+def best_pair(formats: List[dict], height: int = None) -> Tuple[Optional[dict], Optional[dict], Optional[str]]:
+    """(video, audio, container) for a height (or overall) preferring stream-copy merges.
+
+    audio is None for a progressive (single-file) format.
+    """
+    videos = [f for f in formats if _has_video(f) and (height is None or f.get('height') == height)]
+    if not videos:
+        return None, None, None
+    candidates = []
+    for video in videos:
+        if _has_audio(video):
+            candidates.append((video, None, video.get('ext')))
+            continue
+        for container in COPY_CONTAINERS:
+            audio = best_audio(formats, prefer=container)
+            if audio and copy_container(video, audio) == container:
+                candidates.append((video, audio, container))
+                break
+    if not candidates:
+        return None, None, None
+    # Highest resolution, then mp4, then bitrate; progressive only breaks ties
+    return max(candidates, key=lambda c: (
+        c[0].get('height') or 0,
+        c[2] == 'mp4',
+        c[0].get('tbr') or 0,
+        c[1] is None,
+    ))
+
+
+def plan_formats(info: dict) -> List[dict]:
+    """Format choices for /info. Every entry says whether it needs a transcode."""
+    formats = info.get('formats') or []
+    out = []
+
+    # Audio as served by the site; without an audio-only format it has to be extracted
+    audio = best_audio(formats, prefer='mp4')
+    native_ext = audio.get('ext') if audio else None
+    if audio:
+        out.append({
+            'label': f"Audio ({native_ext.upper()})",
+            'quality': 'audio',
+            'ext': native_ext,
+            'format_id': f"{audio['format_id']}/bestaudio/best",
+            'filesize': _size(audio),
+            'transcode': False,
+        })
+    if native_ext != 'mp3':
+        out.append({
+            'label': 'Audio (MP3)',
+            'quality': 'audio',
+            'ext': 'mp3',
+            'format_id': 'bestaudio/best',
+            'filesize': None,
+            'transcode': True,
+            'target_ext': 'mp3',
+        })
+
+    video, paired, container = best_pair(formats)
+    out.append(_video_entry("Best Quality", 'best', video, paired, container,
+                            'bestvideo+bestaudio/best', info.get('ext', 'mp4')))
+
+    heights = sorted({f['height'] for f in formats if f.get('height') and _has_video(f)})
+    for h in heights:
+        video, paired, container = best_pair(formats, h)
+        if video:
+            out.append(_video_entry(f"{h}p", f"{h}p", video, paired, container,
+                                    f"bestvideo[height={h}]+bestaudio/best[height={h}]"))
+    return out
+
+
+def _video_entry(label: str, quality: str, video: Optional[dict], audio: Optional[dict],
+                 container: Optional[str], fallback: str, default_ext: str = 'mp4') -> dict:
+    if video is None:
+        return {'label': f"{label} ({default_ext})", 'quality': quality, 'ext': default_ext,
+                'format_id': fallback, 'filesize': None, 'transcode': False}
+    if audio is None:
+        # Keep the fallback progressive too, so the job stays streamable
+        format_id = f"{video['format_id']}/{fallback.rsplit('/', 1)[-1]}"
+    else:
+        format_id = f"{video['format_id']}+{audio['format_id']}/{fallback}"
+    size = (_size(video) or 0) + ((_size(audio) or 0) if audio else 0)
+    ext = container or video.get('ext') or default_ext
+    return {
+        'label': f"{label} ({ext.upper() if label[0].isdigit() else ext})",
+        'quality': quality,
+        'ext': ext,
+        'format_id': format_id,
+        'filesize': size or None,
+        'transcode': False,
+    }
+
+
+def postprocessing(target_ext: str = None) -> dict:
+    """yt-dlp options: stream-copy merges by default, a transcode only for an explicit target"""
+    opts = {'merge_output_format': MERGE_OUTPUT_FORMAT}
+    if not target_ext:
+        return opts
+    if target_ext in AUDIO_TARGETS:
+        # Skipped by yt-dlp when the downloaded audio already has that codec
+        opts['postprocessors'] = [{'key': 'FFmpegExtractAudio', 'preferredcodec': target_ext}]
+    elif target_ext in VIDEO_TARGETS:
+        # Merges are copied into the target when the codecs fit it (else into a container
+        # they fit, e.g. H.264/AAC asked as webm), then anything else is re-encoded
+        others = [ext for ext in MERGE_OUTPUT_FORMAT.split('/') if ext != target_ext]
+        opts['merge_output_format'] = '/'.join([target_ext, *others])
+        opts['postprocessors'] = [{'key': 'FFmpegVideoConvertor', 'preferedformat': target_ext}]
+    return opts
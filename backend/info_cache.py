@@ -0,0 +1,143 @@
+"""
+Metadata cache for /info
+TTL + LRU cache of yt-dlp extraction results, keyed by extractor + video id when
+the URL can be matched offline and by a canonicalized URL otherwise.
+"""
+import os
+import time
+import threading
+import functools
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import yt_dlp
+
+# Entries never live longer than this (seconds)
+INFO_CACHE_TTL = int(os.getenv("INFO_CACHE_TTL", "1800"))
+# Maximum number of cached extraction results
+INFO_CACHE_SIZE = int(os.getenv("INFO_CACHE_SIZE", "500"))
+# Expire entries this long before their signed media URLs do (seconds)
+SIGNED_URL_MARGIN = 300
+
+# Query parameters that never change what gets extracted
+TRACKING_PARAMS = {"si", "feature", "fbclid", "gclid", "igshid", "igsh"}
+
+_extractors = None
+
+
+def canonical_url(url: str) -> str:
+    """Normalize a URL so trivially different spellings share a cache entry"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in TRACKING_PARAMS and not k.startswith("utm_")
+    )
+    return urlunsplit((parts.scheme.lower() or "https", host, parts.path.rstrip("/"), urlencode(query), ""))
+
+
+@functools.lru_cache(maxsize=4096)
+def cache_key(url: str) -> str:
+    """extractor:video_id when a specific extractor matches the URL, else the canonical URL"""
+    global _extractors
+    if _extractors is None:
+        _extractors = [ie for ie in yt_dlp.extractor.gen_extractor_classes() if ie.ie_key() != "Generic"]
+    for ie in _extractors:
+        try:
+            if ie.suitable(url):
+                video_id = ie.get_temp_id(url)
+                if video_id:
+                    return f"{ie.ie_key()}:{video_id}"
+                break
+        except Exception:
+            continue
+    return canonical_url(url)
+
+
+def warm_up():
+    """Compile the extractor URL patterns ahead of the first request"""
+    cache_key("https://example.com/")
+
+
+def _signed_url_expiry(info: dict) -> Optional[float]:
+    """Earliest expiry timestamp advertised by the format URLs (e.g. YouTube's expire=)"""
+    earliest = None
+    for f in info.get("formats") or []:
+        query = dict(parse_qsl(urlsplit(f.get("url") or "").query))
+        value = query.get("expire") or query.get("Expires") or query.get("x-expires")
+        if value and value.isdigit():
+            earliest = min(earliest or float(value), float(value))
+    return earliest
+
+
+class InfoCache:
+    """Thread-safe TTL + LRU cache of extraction results"""
+
+    def __init__(self, max_entries: int = INFO_CACHE_SIZE, ttl: int = INFO_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, info)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, *fallbacks: str) -> Optional[dict]:
+        """Info under key, else under the first fallback key that has it (one lookup either way)"""
+        now = time.time()
+        with self._lock:
+            for k in (key, *fallbacks):
+                entry = self._entries.get(k)
+                if entry and entry[0] > now:
+                    self._entries.move_to_end(k)
+                    self.hits += 1
+                    return entry[1]
+                if entry:
+                    del self._entries[k]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, info: dict):
+        if self.max_entries <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        signed_expiry = _signed_url_expiry(info)
+        if signed_expiry:
+            expires_at = min(expires_at, signed_expiry - SIGNED_URL_MARGIN)
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            self._entries[key] = (expires_at, info)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def purge(self, key: str = None) -> int:
+        """Remove one entry (or everything when key is None). Returns the number removed."""
+        with self._lock:
+            if key is None:
+                count = len(self._entries)
+                self._entries.clear()
+                return count
+            return 1 if self._entries.pop(key, None) else 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+info_cache = InfoCache()
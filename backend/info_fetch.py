@@ -0,0 +1,163 @@
+"""
+Non-blocking /info extraction
+yt-dlp extraction blocks, so /info hands it to the execution backend's bounded
+pool and only awaits the result on the event loop. On top of that:
+
+  - identical requests in flight share one extraction (and its cache fill)
+  - at most INFO_DOMAIN_CONCURRENCY extractions per site run at once, so one
+    slow site cannot hold every pool slot
+  - at most INFO_MAX_PENDING extractions per site wait or run on an API
+    worker, beyond that /info answers 503 for that site right away instead
+    of queueing without bound
+  - a request gives up after INFO_TIMEOUT seconds or when its client goes away;
+    an extraction nobody waits for any more is dropped if it has not started
+"""
+import os
+import time
+import asyncio
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+from download_tuning import extractor_for
+
+# Seconds a /info request waits for its extraction before answering 504
+INFO_TIMEOUT = float(os.getenv("INFO_TIMEOUT", "45"))
+# Extractions per site waiting or running on an API worker before /info answers 503
+INFO_MAX_PENDING = int(os.getenv("INFO_MAX_PENDING", "32"))
+# Concurrent extractions per site (0 = half of the execution workers)
+INFO_DOMAIN_CONCURRENCY = int(os.getenv("INFO_DOMAIN_CONCURRENCY", "0"))
+# yt-dlp socket timeout for the requests made while extracting (seconds)
+INFO_SOCKET_TIMEOUT = int(os.getenv("INFO_SOCKET_TIMEOUT", "15"))
+# How often a waiting request checks whether its client is still connected
+DISCONNECT_POLL_INTERVAL = 0.5
+
+
+class InfoBusy(Exception):
+    """Too many extractions are pending for the site"""
+
+
+class InfoTimeout(Exception):
+    """The extraction did not finish within the request timeout"""
+
+
+class ClientGone(Exception):
+    """The client disconnected while waiting"""
+
+
+def domain_of(key: str, url: str) -> str:
+    """Extractor name for keys like Youtube:id, the site's host for anything else"""
+    extractor = extractor_for(key)
+    if extractor != "Generic":
+        return extractor
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class _Flight:
+    __slots__ = ("task", "domain", "waiters", "started")
+
+    def __init__(self, domain: str):
+        self.task: Optional[asyncio.Task] = None
+        self.domain = domain
+        self.waiters = 0
+        self.started = False
+
+
+class InfoFetcher:
+    """Runs /info extractions with admission, per-site and per-request limits.
+
+    Lives on the event loop (one per API worker), so it needs no locks.
+    """
+
+    def __init__(self, extract: Callable[[str, dict], Future], per_domain: int, max_pending: int = INFO_MAX_PENDING,
+                 timeout: float = INFO_TIMEOUT):
+        self._extract = extract
+        self.per_domain = max(1, per_domain)
+        self.max_pending = max(1, max_pending)
+        self.timeout = timeout
+        self._flights: Dict[str, _Flight] = {}
+        self._domains: Dict[str, asyncio.Semaphore] = {}
+        self._pending: Dict[str, int] = {}
+        self.counters = {"extractions": 0, "coalesced": 0, "rejected": 0, "timeouts": 0,
+                         "disconnects": 0, "dropped": 0}
+
+    async def fetch(self, key: str, url: str, on_result: Callable[[dict, float], None] = None,
+                    is_disconnected: Callable[[], Awaitable[bool]] = None, opts: dict = None) -> dict:
+        """Info for url, extracting it (with extra yt-dlp opts) unless the same key is already in flight.
+
+        on_result(info, seconds) runs once per extraction, even when every
+        request waiting for it has given up. Raises InfoBusy, InfoTimeout or ClientGone.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            domain = domain_of(key, url)
+            if self._pending.get(domain, 0) >= self.max_pending:
+                self.counters["rejected"] += 1
+                raise InfoBusy()
+            self._pending[domain] = self._pending.get(domain, 0) + 1
+            flight = _Flight(domain)
+            flight.task = asyncio.ensure_future(self._run(flight, url, on_result, opts))
+            flight.task.add_done_callback(lambda task: self._forget(key, flight, task))
+            self._flights[key] = flight
+        else:
+            self.counters["coalesced"] += 1
+
+        flight.waiters += 1
+        try:
+            return await self._wait(flight.task, is_disconnected)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.started and not flight.task.done():
+                # Still waiting for a slot and nobody wants it any more
+                flight.task.cancel()
+                self.counters["dropped"] += 1
+
+    async def _run(self, flight: _Flight, url: str, on_result: Callable = None, opts: dict = None) -> dict:
+        semaphore = self._domains.setdefault(flight.domain, asyncio.Semaphore(self.per_domain))
+        async with semaphore:
+            flight.started = True
+            self.counters["extractions"] += 1
+            started = time.monotonic()
+            info = await asyncio.wrap_future(self._extract(url, opts))
+        if on_result:
+            on_result(info, time.monotonic() - started)
+        return info
+
+    async def _wait(self, task: asyncio.Task, is_disconnected: Callable[[], Awaitable[bool]] = None) -> dict:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self.counters["timeouts"] += 1
+                raise InfoTimeout()
+            done, _ = await asyncio.wait({task}, timeout=min(remaining, DISCONNECT_POLL_INTERVAL))
+            if done:
+                return task.result()
+            if is_disconnected and await is_disconnected():
+                self.counters["disconnects"] += 1
+                raise ClientGone()
+
+    def _forget(self, key: str, flight: _Flight, task: asyncio.Task):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        self._pending[flight.domain] -= 1
+        if not self._pending[flight.domain]:
+            del self._pending[flight.domain]
+            self._domains.pop(flight.domain, None)
+        if not task.cancelled():
+            # Retrieved so a failure nobody waited for is not logged as unhandled
+            task.exception()
+
+    def stats(self) -> dict:
+        running = sum(1 for f in self._flights.values() if f.started)
+        return {
+            "running": running,
+            "waiting": len(self._flights) - running,
+            "sites": len(self._pending),
+            "max_pending": self.max_pending,
+            "per_domain": self.per_domain,
+            "timeout": self.timeout,
+            **self.counters,
+        }
@@ -3,8 +3,11 @@ Database initialization script
 Creates default admin user and initial settings
 """
 from database import engine, SessionLocal, init_db
-from models import Admin, Settings, SEOConfig, Base
+from models import Admin, Blog, Settings, SEOConfig, Base
 from admin_auth import hash_password
+from download_tuning import default_settings as download_tuning_settings
+from rate_limits import default_settings as rate_limit_settings
+from blog_posts import render_content
 
 def create_default_data():
     db = SessionLocal()
@@ -38,7 +41,7 @@ def create_default_data():
             ("default_language", "en", "string", "Default language code"),
             ("maintenance_mode", "false", "bool", "Enable maintenance mode"),
             ("analytics_id", "", "string", "Google Analytics tracking ID"),
-        ]
+        ] + download_tuning_settings() + rate_limit_settings()
         
         for key, value, type_, desc in default_settings:
             setting = db.query(Settings).filter(Settings.key == key).first()
@@ -129,6 +132,19 @@ def create_default_data():
                 db.add(seo)
         
         print("[OK] Default SEO configurations created")
+
+        # The blog listing pages by published_at, posts published without one would never show
+        db.query(Blog).filter(Blog.status == "published", Blog.published_at.is_(None)) \
+            .update({Blog.published_at: Blog.created_at, Blog.updated_at: Blog.updated_at}, synchronize_session=False)
+
+        # Posts saved before content was rendered on write (updated_at kept, they did not change)
+        pending = db.query(Blog.id, Blog.content).filter(Blog.content_html.is_(None)).all()
+        for blog_id, content in pending:
+            db.query(Blog).filter(Blog.id == blog_id).update(
+                {Blog.content_html: render_content(content), Blog.updated_at: Blog.updated_at},
+                synchronize_session=False)
+        if pending:
+            print(f"[OK] Rendered content_html for {len(pending)} blog posts (source kept in content)")
         
         db.commit()
         print("\n[OK] Database initialized successfully!")
@@ -0,0 +1,267 @@
+"""
+Download job state backends
+"memory" keeps jobs in this process (single worker only).
+"sql" stores them through the database.py engine (SQLite/PostgreSQL), and
+"redis" in any Redis-compatible server, so every uvicorn/gunicorn worker can
+answer /status, /stream and /serve_file for any job.
+"""
+import os
+import json
+import time
+import threading
+from typing import Dict, List, Optional
+
+# "memory", "sql" or "redis"
+JOB_STORE = os.getenv("JOB_STORE", "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Seconds a completed or failed job stays available
+JOB_TTL = int(os.getenv("JOB_TTL", "3600"))
+# Seconds a Redis job that stops being updated is kept before it expires (crashed worker)
+JOB_ACTIVE_TTL = int(os.getenv("JOB_ACTIVE_TTL", "86400"))
+
+TERMINAL_STATUSES = ('completed', 'error')
+
+
+def _expiry(fields: dict, current: Optional[float] = None) -> Optional[float]:
+    """Finished jobs expire JOB_TTL seconds after they finish"""
+    if fields.get('status') in TERMINAL_STATUSES:
+        return time.time() + JOB_TTL
+    return current
+
+
+class MemoryJobStore:
+    """Jobs kept in a dict in this process"""
+    name = "memory"
+
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str, fields: dict):
+        with self._lock:
+            self._jobs[job_id] = dict(fields)
+            expires_at = _expiry(fields)
+            if expires_at:
+                self._expires[job_id] = expires_at
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if self._expires.get(job_id, float('inf')) < time.time():
+                self._jobs.pop(job_id, None)
+                self._expires.pop(job_id, None)
+                return None
+            return dict(job)
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        """Atomically merge fields into the job. Returns the new state."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            expires_at = _expiry(fields, self._expires.get(job_id))
+            if expires_at:
+                self._expires[job_id] = expires_at
+            return dict(job)
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._expires.pop(job_id, None)
+
+    def job_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._jobs)
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, t in self._expires.items() if t < now]
+            for job_id in expired:
+                self._jobs.pop(job_id, None)
+                self._expires.pop(job_id, None)
+            return len(expired)
+
+
+class SQLJobStore:
+    """Jobs stored in the application database (see models.Job)"""
+    name = "sql"
+
+    def __init__(self, session_factory=None):
+        if session_factory is None:
+            from database import SessionLocal
+            session_factory = SessionLocal
+        self._session_factory = session_factory
+
+    def create(self, job_id: str, fields: dict):
+        from models import Job
+        db = self._session_factory()
+        try:
+            db.merge(Job(
+                id=job_id,
+                status=fields.get('status'),
+                data=json.dumps(fields),
+                expires_at=_expiry(fields),
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        from models import Job
+        db = self._session_factory()
+        try:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            if job is None or (job.expires_at and job.expires_at < time.time()):
+                return None
+            return json.loads(job.data)
+        finally:
+            db.close()
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        """Atomically merge fields into the job. Returns the new state.
+
+        The row lock only exists on PostgreSQL (SQLite ignores FOR UPDATE), so the
+        write is also conditional on the data read: a concurrent update makes it
+        match no row and the merge is retried on the new state.
+        """
+        from models import Job
+        db = self._session_factory()
+        try:
+            while True:
+                job = db.query(Job).filter(Job.id == job_id).with_for_update().first()
+                if job is None:
+                    return None
+                data = json.loads(job.data)
+                data.update(fields)
+                updated = db.query(Job).filter(Job.id == job_id, Job.data == job.data).update({
+                    Job.data: json.dumps(data),
+                    Job.status: data.get('status'),
+                    Job.expires_at: _expiry(fields, job.expires_at),
+                }, synchronize_session=False)
+                db.commit()
+                if updated:
+                    return data
+                db.expire_all()
+        finally:
+            db.close()
+
+    def delete(self, job_id: str):
+        from models import Job
+        db = self._session_factory()
+        try:
+            db.query(Job).filter(Job.id == job_id).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def job_ids(self) -> List[str]:
+        from models import Job
+        db = self._session_factory()
+        try:
+            return [row.id for row in db.query(Job.id).all()]
+        finally:
+            db.close()
+
+    def purge_expired(self) -> int:
+        from models import Job
+        db = self._session_factory()
+        try:
+            count = db.query(Job).filter(Job.expires_at < time.time()).delete()
+            db.commit()
+            return count
+        finally:
+            db.close()
+
+
+class RedisJobStore:
+    """Jobs stored as JSON fields of a Redis hash per job"""
+    name = "redis"
+    prefix = "job:"
+
+    # HSET only while the job exists, so an update racing a delete cannot
+    # recreate it, then set its expiry: JOB_TTL once finished (kept as is by
+    # later updates), JOB_ACTIVE_TTL again on every update before that.
+    # KEYS[1] job hash, ARGV[1] JOB_TTL, ARGV[2] JOB_ACTIVE_TTL, ARGV[3..] field, value pairs
+    UPDATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local finished = {%s}
+local was_finished = finished[redis.call('HGET', KEYS[1], 'status') or '']
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+if finished[redis.call('HGET', KEYS[1], 'status') or ''] then
+    if not was_finished or redis.call('TTL', KEYS[1]) < 0 then
+        redis.call('EXPIRE', KEYS[1], ARGV[1])
+    end
+else
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return redis.call('HGETALL', KEYS[1])
+""" % ", ".join("[%r] = true" % json.dumps(status) for status in TERMINAL_STATUSES)
+
+    def __init__(self, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(REDIS_URL)
+        self._redis = client
+        self._update = client.register_script(self.UPDATE_SCRIPT)
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}{job_id}"
+
+    def create(self, job_id: str, fields: dict):
+        key = self._key(job_id)
+        pipe = self._redis.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping={k: json.dumps(v) for k, v in fields.items()})
+        pipe.expire(key, JOB_TTL if fields.get('status') in TERMINAL_STATUSES else JOB_ACTIVE_TTL)
+        pipe.execute()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        raw = self._redis.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        return {_text(k): json.loads(v) for k, v in raw.items()}
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        """Merge fields in one server-side script (atomic per call). Returns the new state."""
+        if not fields:
+            return self.get(job_id)
+        args = [JOB_TTL, JOB_ACTIVE_TTL]
+        for k, v in fields.items():
+            args += [k, json.dumps(v)]
+        raw = self._update(keys=[self._key(job_id)], args=args)
+        if not raw:
+            return None
+        # HGETALL comes back from Lua as a flat field, value list
+        return {_text(k): json.loads(v) for k, v in zip(raw[::2], raw[1::2])}
+
+    def delete(self, job_id: str):
+        self._redis.delete(self._key(job_id))
+
+    def job_ids(self) -> List[str]:
+        return [_text(k)[len(self.prefix):] for k in self._redis.scan_iter(match=f"{self.prefix}*")]
+
+    def purge_expired(self) -> int:
+        # Redis expires keys on its own
+        return 0
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def create_job_store(backend: str = JOB_STORE):
+    if backend == "sql":
+        return SQLJobStore()
+    if backend == "redis":
+        return RedisJobStore()
+    return MemoryJobStore()
+
+
+job_store = create_job_store()
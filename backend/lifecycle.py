@@ -0,0 +1,202 @@
+"""
+Job lifecycle management
+Cancellation of queued/running jobs, and a periodic sweep that expires finished
+jobs, releases their cached files and reaps work directories whose job has disappeared.
+"""
+import os
+import time
+import shutil
+import signal
+import logging
+import threading
+from typing import Dict
+
+import metrics
+from file_serving import grace_expired
+
+logger = logging.getLogger(__name__)
+
+# Seconds between lifecycle sweeps
+JOB_SWEEP_INTERVAL = int(os.getenv("JOB_SWEEP_INTERVAL", "60"))
+# Temp files younger than this are never reaped (their job may be starting up)
+ORPHAN_MIN_AGE = int(os.getenv("ORPHAN_MIN_AGE", "300"))
+# How often a running download re-checks a shared job store for cancellation
+CANCEL_CHECK_INTERVAL = 1.0
+# Root for per-job scratch directories (point it at a fast/tmpfs volume)
+JOB_WORK_DIR = os.path.abspath(os.getenv("JOB_WORK_DIR", "work"))
+
+
+def job_workdir(job_id: str, create: bool = False) -> str:
+    """Scratch directory holding everything yt-dlp/ffmpeg write for a job"""
+    path = os.path.join(JOB_WORK_DIR, job_id)
+    if create:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def remove_tree(path: str) -> int:
+    """rmtree that reports how many bytes it freed"""
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    shutil.rmtree(path, ignore_errors=True)
+    return size
+
+
+def kill_job_processes(job_id: str) -> int:
+    """Terminate ffmpeg/ffprobe processes working on a job's files (Linux only)"""
+    if not os.path.isdir("/proc"):
+        return 0
+    killed = 0
+    marker = job_workdir(job_id).encode()
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                args = f.read().split(b"\0")
+        except OSError:
+            continue
+        if args and os.path.basename(args[0]).startswith(b"ff") and any(marker in a for a in args):
+            try:
+                os.kill(int(pid), signal.SIGTERM)
+                killed += 1
+            except OSError:
+                pass
+    return killed
+
+
+class JobLifecycle:
+    """Cancels jobs and keeps memory and disk usage flat over long uptimes"""
+
+    def __init__(self, store, scheduler, executor, groups, file_cache):
+        self.store = store
+        self.scheduler = scheduler
+        self.executor = executor
+        self.groups = groups
+        self.file_cache = file_cache
+        self._cancelled = set()
+        self._last_check: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "sweeps": 0,
+            "jobs_cancelled": 0,
+            "jobs_expired": 0,
+            "pins_released": 0,
+            "orphans_removed": 0,
+            "bytes_reclaimed": 0,
+        }
+
+    def _count(self, name: str, n: int = 1):
+        # Bumped from request handlers, worker threads and the sweep thread
+        with self._lock:
+            self.stats[name] += n
+
+    # --- Cancellation ---
+
+    def cancel(self, job_id: str) -> bool:
+        """Delete a job; abort its download if no other job shares it.
+
+        Returns False when the job does not exist.
+        """
+        job = self.store.get(job_id)
+        if job is None:
+            return False
+        self.store.delete(job_id)
+        self.file_cache.unpin(job_id)
+        self._count("jobs_cancelled", 1)
+        if job['status'] in ('completed', 'error'):
+            return True
+        metrics.jobs_total.inc(status='cancelled')
+
+        leader = self.groups.leader_of(job_id)
+        remaining = self.groups.detach(job_id)
+        if not remaining:
+            with self._lock:
+                self._cancelled.add(leader)
+            if self.scheduler.cancel(leader):
+                # Never started, so process_download will not forget it
+                self.forget(leader)
+            else:
+                # Already running: stop yt-dlp at its next hook and kill ffmpeg
+                self.executor.cancel(leader)
+                kill_job_processes(leader)
+            self.groups.finish(leader)
+        return True
+
+    def is_cancelled(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._cancelled
+
+    def should_cancel(self, job_id: str) -> bool:
+        """True once nobody is waiting for this producer's output any more.
+
+        With a shared job store the jobs may have been deleted by another
+        worker, so the store is checked (at most once per second).
+        """
+        if self.is_cancelled(job_id):
+            return True
+        if self.store.name == "memory":
+            return False
+        now = time.monotonic()
+        if now - self._last_check.get(job_id, 0) < CANCEL_CHECK_INTERVAL:
+            return False
+        self._last_check[job_id] = now
+        members = self.groups.members(job_id)
+        if any(self.store.get(m) is not None for m in members):
+            return False
+        with self._lock:
+            self._cancelled.add(job_id)
+        return True
+
+    def forget(self, job_id: str):
+        """Drop cancellation bookkeeping once a producer has stopped"""
+        with self._lock:
+            self._cancelled.discard(job_id)
+        self._last_check.pop(job_id, None)
+
+    def remove_workdir(self, job_id: str, reclaimed: bool = True) -> int:
+        """Delete a job's scratch directory. Counted as reclaimed unless it is routine cleanup."""
+        path = job_workdir(job_id)
+        if not os.path.isdir(path):
+            return 0
+        freed = remove_tree(path)
+        if reclaimed:
+            self._count("bytes_reclaimed", freed)
+        return freed
+
+    # --- Periodic sweep ---
+
+    def sweep(self) -> dict:
+        """Expire finished jobs, release their pins and reap orphaned work directories"""
+        self._count("sweeps", 1)
+        self._count("jobs_expired", self.store.purge_expired())
+
+        # Cached files pinned by jobs that no longer exist or were served a while ago
+        for job_id in self.file_cache.pinned_jobs():
+            job = self.store.get(job_id)
+            if job is None or grace_expired(job):
+                self.file_cache.unpin(job_id)
+                self._count("pins_released", 1)
+
+        # Work directories whose job has disappeared
+        cutoff = time.time() - ORPHAN_MIN_AGE
+        if os.path.isdir(JOB_WORK_DIR):
+            for entry in os.scandir(JOB_WORK_DIR):
+                if not entry.is_dir() or self.groups.is_producing(entry.name):
+                    continue
+                try:
+                    if entry.stat().st_mtime > cutoff or self.store.get(entry.name) is not None:
+                        continue
+                except OSError:
+                    continue
+                self._count("bytes_reclaimed", remove_tree(entry.path))
+                self._count("orphans_removed", 1)
+
+        self._count("bytes_reclaimed", self.file_cache.sweep())
+        with self._lock:
+            return dict(self.stats)
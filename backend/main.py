@@ -1,25 +1,45 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse, Response
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.background import BackgroundTask
-import yt_dlp
 import os
 import shutil
 import uuid
-import glob
 import asyncio
-import re
+import json
+import math
+import time
+from typing import List
 from pydantic import BaseModel
-from typing import Dict, Any
 
 # Import admin routes
 from admin_routes import router as admin_router
 from public_routes import router as public_router
-from database import init_db, get_db
+from database import init_db
 from init_db import create_default_data
-from models import Settings
-from sqlalchemy.orm import Session
+from scheduler import scheduler, QueueFull
+from execution import executor
+from ytdl_runner import BROWSER_HEADERS
+from info_cache import info_cache, cache_key, warm_up as warm_up_info_cache
+from info_fetch import InfoFetcher, InfoBusy, InfoTimeout, ClientGone, INFO_DOMAIN_CONCURRENCY, INFO_SOCKET_TIMEOUT
+from singleflight import JobGroups
+from file_cache import file_cache, make_key as file_key
+from progress import progress_broker
+from job_store import job_store
+from lifecycle import JobLifecycle, JOB_SWEEP_INTERVAL, JOB_WORK_DIR, job_workdir
+import metrics
+from tracing import tracer
+from download_tuning import download_tuning, extractor_for, ydl_options as tuning_options
+from rate_limits import rate_limits
+from ydl_pool import ydl_pool
+from public_cache import public_cache, cached_response
+from format_plan import plan_formats, postprocessing, AUDIO_TARGETS, VIDEO_TARGETS
+from admin_routes import get_current_admin
+from file_serving import ResumableFileResponse, not_modified, offload_response
+from streaming import is_streamable, wait_for_source, tail_file, media_type_for, final_extension
+from clip_engine import parse_clip
+from playlists import decode_cursor, is_playlist, page_key, page_options, page_response, thumbnail_of
+from batch import BatchRunner, BATCH_MAX_ITEMS, BATCH_PRIORITY, PLAYLIST_OPTIONS, summarize, zip_name, zip_stream
 from fastapi import Depends
 
 app = FastAPI()
@@ -32,12 +52,10 @@ async def startup_event():
     # Create default admin user and settings
     create_default_data()
     print("[OK] Database initialized")
-    
-    # Cleanup old files
-    files = glob.glob("downloads/*")
-    for f in files:
-        if os.path.isfile(f):
-            os.remove(f)
+
+    # Index finished files kept from previous runs and trim to the byte budget
+    file_cache.load()
+    file_cache.evict()
             
     # Add local ffmpeg to PATH
     ffmpeg_dir = os.path.join(os.getcwd(), "ffmpeg")
@@ -52,6 +70,15 @@ async def startup_event():
     else:
         print("[WARN] ffmpeg NOT found in PATH — video merging will fail!")
 
+    # Deliver job progress pushes on this event loop
+    progress_broker.bind(asyncio.get_running_loop())
+
+    # Start yt-dlp execution backend and the dedicated download worker pool
+    executor.start()
+    print(f"[OK] yt-dlp execution backend: {executor.name}")
+    scheduler.start()
+    asyncio.get_running_loop().run_in_executor(None, warm_up_info_cache)
+
     # Start auto cache cleaner background task
     from tasks import cleanup_cache
     
@@ -68,6 +95,22 @@ async def startup_event():
 
     asyncio.create_task(auto_cache_cleaner())
 
+    async def job_sweeper():
+        # Expire finished jobs and reap orphaned files on a short interval
+        while True:
+            await asyncio.sleep(JOB_SWEEP_INTERVAL)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, lifecycle.sweep)
+            except Exception as e:
+                print(f"Job sweep error: {e}")
+
+    asyncio.create_task(job_sweeper())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    scheduler.stop()
+    executor.stop()
+
 # Mount admin routes
 app.include_router(admin_router)
 app.include_router(public_router)
@@ -76,9 +119,31 @@ app.include_router(public_router)
 async def favicon():
     return Response(content=None, status_code=204)
 
-# In-memory job store (for simplicity)
-# Structure: job_id -> { status: 'pending'|'downloading'|'completed'|'error', progress: int, filename: str, error: str }
-download_jobs: Dict[str, Any] = {}
+# Job state lives in job_store (memory, SQL or Redis, see job_store.py)
+# Structure: job_id -> { status: 'queued'|'downloading'|'processing'|'completed'|'error', progress: int, filename: str, error: str }
+
+# Identical jobs (same video, format and clip) share one producer and one output file
+download_groups = JobGroups()
+info_fetcher = InfoFetcher(
+    lambda url, opts=None: executor.extract_info(url, {'socket_timeout': INFO_SOCKET_TIMEOUT, **(opts or {})}),
+    per_domain=INFO_DOMAIN_CONCURRENCY or executor.workers // 2,
+)
+lifecycle = JobLifecycle(job_store, scheduler, executor, download_groups, file_cache)
+
+async def start_batch_item(item: dict, options: dict) -> str:
+    key = await asyncio.to_thread(cache_key, item['url'])
+    queued = await asyncio.to_thread(queue_download, item['url'], options['format_id'], options['client'],
+                                     target_ext=options['target_ext'], source_key=key, info=info_cache.get(key),
+                                     priority=BATCH_PRIORITY)
+    return queued['job_id']
+
+batch_runner = BatchRunner(
+    job_store,
+    extract=executor.extract_info,
+    start=start_batch_item,
+    cancel=lifecycle.cancel,
+    extract_opts={**PLAYLIST_OPTIONS, 'socket_timeout': INFO_SOCKET_TIMEOUT},
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -90,63 +155,133 @@ app.add_middleware(
 
 class UrlRequest(BaseModel):
     url: str
+    # next_cursor of a previous playlist page
+    cursor: str = None
 
 class DownloadRequest(BaseModel):
     url: str
     format_id: str
     start_time: str = None
     end_time: str = None
+    # "fast" (keyframe cut, no re-encode) or "accurate" (frame-exact), see clip_engine.py
+    clip_mode: str = None
+    # Container/codec to convert to; only then is the file re-encoded
+    target_ext: str = None
+
+class BatchRequest(BaseModel):
+    # Either a list of video URLs or one playlist/channel URL
+    urls: List[str] = None
+    url: str = None
+    format_id: str = "bestvideo*+bestaudio/best"
+    target_ext: str = None
+
+def public_job(job_id: str, job: dict) -> dict:
+    """Job state as exposed to clients (internal _fields removed)"""
+    result = {k: v for k, v in job.items() if not k.startswith('_')}
+    if job['status'] == 'queued':
+        result["queue_position"] = scheduler.position(download_groups.leader_of(job_id))
+    return result
 
-def cleanup_file(path: str):
+def update_job(job_id: str, **fields):
+    """Apply fields to a producer job and every job subscribed to it"""
+    for member in download_groups.members(job_id):
+        job = job_store.update(member, **fields)
+        if job is not None:
+            progress_broker.publish(member, public_job(member, job))
+
+def finish_job(job_id: str, **fields):
+    """Close a producer's group and apply its terminal state to all members"""
+    members = download_groups.finish(job_id)
+    for member in members:
+        if fields.get('filename'):
+            # Keep the cached file until this job has been served
+            file_cache.pin(member, fields['filename'])
+        job = job_store.update(member, **fields)
+        if job is not None:
+            progress_broker.publish(member, public_job(member, job))
+            metrics.jobs_total.inc(status=fields['status'])
+            if job.get('_created'):
+                metrics.job_duration_seconds.observe(time.time() - job['_created'], status=fields['status'])
+
+def mark_served(job_id: str):
+    """Start the job's grace window; the sweep unpins its file SERVE_GRACE_SECONDS later"""
+    job_store.update(job_id, _last_served=time.time())
+
+def record_served(job_id: str, ready_at: float, seconds: float, nbytes: int):
+    """Add the ready (waiting for the client) and served stages to a job's timings"""
+    job = job_store.get(job_id)
+    if not job or 'served' in (job.get('timings') or {}):
+        return
+    timings = dict(job.get('timings') or {})
+    if ready_at:
+        waited = max(0.0, time.time() - seconds - ready_at)
+        timings['ready'] = {'seconds': round(waited, 3), 'bytes': 0}
+        tracer.record(job_id, 'ready', waited, start_time=ready_at)
+    timings['served'] = {'seconds': round(seconds, 3), 'bytes': nbytes}
+    tracer.record(job_id, 'served', seconds, nbytes)
+    job_store.update(job_id, timings=timings)
+
+def file_sent(job_id: str, path: str, ready_at: float, response: ResumableFileResponse, seconds: float):
+    """Called on the event loop when a /serve_file response ends, finished or interrupted"""
+    file_cache.release(path)
+    metrics.served_bytes.inc(response.bytes_sent)
+    complete = response.sent_status == 200 and response.complete and response.bytes_sent
+    # Job store writes block on SQL/Redis: run them on a thread, not awaited (the
+    # response may be ending because its task was cancelled)
+    asyncio.get_running_loop().run_in_executor(None, served_done, job_id, ready_at, seconds,
+                                               response.bytes_sent if complete else 0)
+
+def served_done(job_id: str, ready_at: float, seconds: float, nbytes: int):
+    mark_served(job_id)
+    if nbytes:
+        record_served(job_id, ready_at, seconds, nbytes)
+
+def enforce_rate_limit(request: Request, scope: str) -> str:
+    """Client id of a request (API key or address); 429 once it is over its limit for scope"""
+    client = rate_limits.client_id(request)
+    wait = rate_limits.take(scope, client)
+    if wait:
+        metrics.rate_limited.inc(scope=scope)
+        raise HTTPException(status_code=429, detail="Too many requests, please slow down",
+                            headers={"Retry-After": str(math.ceil(min(wait, 3600)))})
+    return client
+
+def output_key(format_id: str, target_ext: str = None) -> str:
+    """Format part of the cache/coalescing keys (a conversion is a different output)"""
+    return f"{format_id}>{target_ext}" if target_ext else format_id
+
+def process_download(job_id: str, url: str, format_id: str, clip: tuple = None, target_ext: str = None,
+                     info: dict = None):
+    """Run a queued job; info is what the request found in info_cache, reused instead of extracting again"""
+    # Stage spans: queued (since the job was created) -> waiting (for fragment connections)
+    # -> extracting -> downloading -> post-processing
+    key = cache_key(url)
+    trace = tracer.start(job_id, since=(job_store.get(job_id) or {}).get('_created'), source=key, format=format_id)
+    fragments = 0
     try:
-        if os.path.exists(path):
-            os.remove(path)
-    except Exception as e:
-        print(f"Error deleting file {path}: {e}")
-
-def my_hook(d):
-    job_id = d.get('info_dict', {}).get('_job_id')
-    if not job_id: return
-    
-    if d['status'] == 'downloading':
-        # Calculate progress
-        try:
-            p = d.get('_percent_str', '0%').replace('%','')
-            download_jobs[job_id]['progress'] = float(p)
-            download_jobs[job_id]['status'] = 'downloading'
-        except:
-            pass
-    elif d['status'] == 'finished':
-        download_jobs[job_id]['progress'] = 100
-        download_jobs[job_id]['status'] = 'processing' # Processing/Converting
-
-def parse_time(t_str):
-    """Converts HH:MM:SS to seconds"""
-    if not t_str: return 0
-    parts = list(map(int, t_str.split(':')))
-    if len(parts) == 3:
-        return parts[0]*3600 + parts[1]*60 + parts[2]
-    elif len(parts) == 2:
-        return parts[0]*60 + parts[1]
-    return parts[0]
-
-def process_download(job_id: str, url: str, format_id: str, start_time: str = None, end_time: str = None):
-    try:
-        download_jobs[job_id]['status'] = 'downloading'
-        filename_base = f"temp_{job_id}"
+        # Parallel HLS/DASH fragments, chunking and retries tuned per extractor,
+        # within the global fragment connection budget (waits while it is used up)
+        trace.enter('waiting')
+        tuning = download_tuning.for_extractor(extractor_for(key, info))
+        fragments = download_tuning.acquire(int(tuning.get('concurrent_fragments') or 1),
+                                            lambda: lifecycle.is_cancelled(job_id))
+        if not fragments:
+            raise Exception("Cancelled while waiting for a download connection")
+
+        trace.enter('extracting')
+        update_job(job_id, status='downloading', timings=trace.breakdown())
+        # Everything yt-dlp/ffmpeg write for this job stays in its own directory
+        workdir = job_workdir(job_id, create=True)
         
         ydl_opts = {
             'format': format_id,
-            'outtmpl': f"{filename_base}.%(ext)s",
+            'outtmpl': os.path.join(workdir, "media.%(ext)s"),
             'quiet': True,
             'nocheckcertificate': True,
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Sec-Fetch-Mode': 'navigate',
-            }
+            'http_headers': dict(BROWSER_HEADERS)
         }
+        # Merge by stream copy; re-encode only for an explicitly requested target
+        ydl_opts.update(postprocessing(target_ext))
 
         # Set ffmpeg location (installed via Dockerfile)
         ffmpeg_path = shutil.which("ffmpeg")
@@ -155,218 +290,559 @@ def process_download(job_id: str, url: str, format_id: str, start_time: str = No
             print(f"[OK] ffmpeg at: {ffmpeg_path}")
         else:
             print("[WARN] ffmpeg not found in PATH")
-        
-        # Advanced: Cutting
-        if start_time and end_time:
-            try:
-                s = parse_time(start_time)
-                e = parse_time(end_time)
-                # Define a callback for download_ranges
-                def range_func(info_dict, ydl):
-                    return [{'start_time': s, 'end_time': e}]
-                ydl_opts['download_ranges'] = range_func
-                # Force ffmpeg use for cutting (usually required)
-                ydl_opts['force_keyframes_at_cuts'] = True 
-            except Exception as ex:
-                print(f"Time parse error: {ex}")
-
-        # Inject job_id into info_dict for the hook
-        def local_hook(d):
-            if d['status'] == 'downloading':
-                try:
-                    p_str = d.get('_percent_str', '0%')
-                    # Regex to find number before %
-                    match = re.search(r'(\d+\.?\d*)%', p_str)
-                    if match:
-                        p = float(match.group(1))
-                        download_jobs[job_id]['progress'] = p
-                except Exception as e:
-                    print(f"Progress parse error: {e}")
-            elif d['status'] == 'finished':
-                download_jobs[job_id]['status'] = 'processing'
-
-        ydl_opts['progress_hooks'] = [local_hook]
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-            
-        # Find file
-        found_file = None
-        for file in os.listdir('.'):
-            if file.startswith(filename_base):
-                found_file = file
-                break
-        
-        if found_file:
-            download_jobs[job_id]['filename'] = found_file
-            download_jobs[job_id]['status'] = 'completed'
+
+        # Last values written to the job store, to skip redundant progress writes
+        last = {'partial': None, 'progress': 0.0, 'time': 0.0, 'done': False}
+        # Bytes seen per file and when downloading started/finished, for metrics
+        transfer = {'bytes': {}, 'started': time.monotonic(), 'finished': None}
+
+        def on_progress(event):
+            if last['done']:
+                return
+            if lifecycle.should_cancel(job_id):
+                executor.cancel(job_id)
+                return
+            if event['status'] == 'downloading':
+                if event.get('tmpfilename') and last['partial'] != event['tmpfilename']:
+                    # Lets /stream tail the file while it is being written
+                    last['partial'] = event['tmpfilename']
+                    update_job(job_id, _partial=event['tmpfilename'])
+                if trace.stage != 'downloading':
+                    trace.enter('downloading')
+                    update_job(job_id, timings=trace.breakdown())
+                received = event.get('downloaded_bytes') or 0
+                seen = transfer['bytes'].get(event.get('tmpfilename'), 0)
+                if received > seen:
+                    metrics.download_bytes.inc(received - seen)
+                    trace.add_bytes(received - seen)
+                    transfer['bytes'][event.get('tmpfilename')] = received
+                p = event.get('progress')
+                now = time.monotonic()
+                if p is not None and (abs(p - last['progress']) >= 1 or now - last['time'] >= 0.5):
+                    last['progress'], last['time'] = p, now
+                    update_job(job_id, progress=p)
+            elif event['status'] == 'finished':
+                transfer['finished'] = time.monotonic()
+                trace.enter('post-processing')
+                update_job(job_id, status='processing', timings=trace.breakdown())
+
+        ydl_opts.update(tuning_options(tuning, fragments))
+        try:
+            output = executor.download(job_id, url, ydl_opts, clip, on_progress, info)
+        except Exception as e:
+            if not info or lifecycle.is_cancelled(job_id):
+                raise
+            # Cached media URLs may have gone stale, retry with a fresh extraction
+            print(f"Job {job_id}: cached info failed ({e}), re-extracting")
+            info_cache.purge(key)
+            trace.enter('extracting')
+            output = executor.download(job_id, url, ydl_opts, clip, on_progress)
+
+        # Path reported by yt-dlp after post-processing, no directory scan needed
+        last['done'] = True
+        if transfer['finished']:
+            metrics.postprocess_seconds.observe(time.monotonic() - transfer['finished'])
+            elapsed = transfer['finished'] - transfer['started']
+            if elapsed > 0 and transfer['bytes']:
+                metrics.download_throughput.observe(sum(transfer['bytes'].values()) / elapsed)
+        if output and os.path.isfile(output):
+            trace.add_bytes(os.path.getsize(output))
+            cached_path = file_cache.store(file_key(key, output_key(format_id, target_ext), clip), output, job_id)
+            metrics.postprocess_jobs.inc(mode='transcode' if target_ext else 'copy')
+            tracer.finish(job_id, 'completed')
+            finish_job(job_id, filename=cached_path, status='completed',
+                       timings=trace.breakdown(), _ready_at=time.time())
         else:
-            download_jobs[job_id]['status'] = 'error'
-            download_jobs[job_id]['error'] = 'File not found'
+            tracer.finish(job_id, 'error')
+            finish_job(job_id, status='error', error='File not found', timings=trace.breakdown())
 
     except Exception as e:
-        print(f"Job {job_id} failed: {e}")
-        download_jobs[job_id]['status'] = 'error'
-        download_jobs[job_id]['error'] = str(e)
+        if lifecycle.is_cancelled(job_id):
+            print(f"Job {job_id} cancelled")
+            lifecycle.remove_workdir(job_id)
+        else:
+            print(f"Job {job_id} failed: {e}")
+        tracer.finish(job_id, 'cancelled' if lifecycle.is_cancelled(job_id) else 'error')
+        finish_job(job_id, status='error', error=str(e), timings=trace.breakdown())
+    finally:
+        if fragments:
+            download_tuning.release(fragments)
+        lifecycle.remove_workdir(job_id, reclaimed=False)
+        lifecycle.forget(job_id)
 
 @app.get("/")
 def read_root():
     return {"status": "ok", "service": "Video Downloader Backend"}
 
 @app.get("/robots.txt")
-def serve_robots_txt(db: Session = Depends(get_db)):
+def serve_robots_txt(request: Request):
     """Serve robots.txt from database settings"""
-    setting = db.query(Settings).filter(Settings.key == "robots_txt").first()
-    content = setting.value if setting and setting.value else "User-agent: *\nAllow: /"
-    return Response(content=content, media_type="text/plain")
-
+    return cached_response(request, public_cache.get("robots"))
 
 
 @app.get("/api/public-settings")
-def get_public_settings(db: Session = Depends(get_db)):
+def get_public_settings(request: Request):
     """Get public settings (favicon, robots.txt, etc.)"""
     # admin_panel_url removed, strictly hardcoded in frontend
-    keys = ["favicon_url", "verification_tags", "robots_txt", "site_name", "site_tagline", "analytics_id"]
-    settings = db.query(Settings).filter(Settings.key.in_(keys)).all()
-    result = {s.key: s.value for s in settings}
-    return result
+    return cached_response(request, public_cache.get("settings"))
 
 @app.get("/api/public-seo")
-def get_public_seo(db: Session = Depends(get_db)):
+def get_public_seo(request: Request):
     """Get all public SEO configurations"""
-    from models import SEOConfig
-    configs = db.query(SEOConfig).all()
-    return {c.page: {
-        "title": c.title,
-        "description": c.description,
-        "keywords": c.keywords,
-        "og_image": c.og_image,
-        "structured_data": c.structured_data
-    } for c in configs}
+    return cached_response(request, public_cache.get("seo"))
 
 @app.post("/info")
-async def get_info(request: UrlRequest):
+async def get_info(request: UrlRequest, http_request: Request):
+    """Formats of a video, or one page of a playlist's entries (pass next_cursor for the next)"""
+    enforce_rate_limit(http_request, 'info')
+    url, offset = request.url, 0
+    if request.cursor:
+        try:
+            url, offset = decode_cursor(request.cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     try:
-        ydl_opts = {'quiet': True, 'nocheckcertificate': True}
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(request.url, download=False)
-            
-            formats_out = []
-            formats_out.append({
-                'label': 'Audio (MP3/M4A)',
-                'quality': 'audio',
-                'ext': 'mp3',
-                'format_id': 'bestaudio/best',
-                'filesize': None
-            })
-
-            target_heights = [360, 480, 720, 1080, 2160]
-            all_formats = info.get('formats', [])
-            
-            # Helper to find best video+audio combo
-            # We will return specific resolutions (filtered) AND a generic "Best" option
-            
-            # ffmpeg is guaranteed by Dockerfile - always use merge format
-            formats_out.append({
-                'label': f"Best Quality ({info.get('ext', 'mp4')})",
-                'quality': 'best',
-                'ext': info.get('ext', 'mp4'),
-                'format_id': 'bestvideo+bestaudio/best',
-                'filesize': None
-            })
-
-            # 2. Try to find specific resolutions, but be more permissive
-            # We want to show buttons for any reasonable video format found
-            video_formats = {} # height -> format
-            
-            for f in all_formats:
-                height = f.get('height')
-                # skip audio-only or invalid
-                if not height or f.get('vcodec') == 'none': 
-                    continue
-                
-                # If we haven't seen this height, or this one is better quality (higher tbr/bitrate usually implies better)
-                current = video_formats.get(height)
-                if not current:
-                    video_formats[height] = f
-                else:
-                    # Prefer mp4 over others if quality is similar
-                    if f.get('ext') == 'mp4' and current.get('ext') != 'mp4':
-                        video_formats[height] = f
-                    # Else prefer higher bitrate
-                    elif (f.get('tbr') or 0) > (current.get('tbr') or 0):
-                        video_formats[height] = f
-
-            # Add all found video resolutions
-            for h in sorted(video_formats.keys()):
-                f = video_formats[h]
-                
-                # Fallback to filesize_approx if filesize is missing
-                filesize = f.get('filesize')
-                if not filesize:
-                    filesize = f.get('filesize_approx')
-
-                # Use merge format for best quality (ffmpeg guaranteed by Dockerfile)
-                fmt_id = f"bestvideo[height={h}]+bestaudio/best[height={h}]"
-
-                formats_out.append({
-                    'label': f"{h}p ({f['ext'].upper()})",
-                    'quality': f"{h}p",
-                    'ext': f['ext'],
-                    'format_id': fmt_id,
-                    'filesize': filesize
-                })
-
-            # Better thumbnail selection: Prefer 'thumbnails' list (last item) over single 'thumbnail' field
-            # because 'thumbnail' is often low-res or same as first item.
-            thumbnail = None
-            if info.get('thumbnails'):
-                thumbnail = info['thumbnails'][-1].get('url')
-            
-            if not thumbnail:
-                thumbnail = info.get('thumbnail')
-
-            return {
-                "title": info.get('title'),
-                "thumbnail": thumbnail,
-                "duration": info.get('duration'),
-                "formats": formats_out,
-                "webpage_url": info.get('webpage_url') or request.url
-            }
+        # Matching ~1800 extractor patterns is CPU work, keep it off the event loop
+        key = await asyncio.to_thread(cache_key, url)
+        # A video, or the first page of a playlist, under one counted lookup
+        info = info_cache.get(key, page_key(key, 0)) if not offset else info_cache.get(page_key(key, offset))
+        if info is None:
+            def store(info, seconds):
+                # Videos under their own key (downloads reuse them), playlist pages apart
+                info_cache.put(page_key(key, offset) if is_playlist(info) else key, info)
+                metrics.info_extraction_seconds.observe(seconds, extractor=info.get('extractor_key') or 'unknown')
+
+            # Runs on the execution backend's pool within per-site limits; concurrent
+            # requests for the same video share a single extraction. Playlists are
+            # extracted flat, one page at a time.
+            info = await info_fetcher.fetch(page_key(key, offset), url, store, http_request.is_disconnected,
+                                            opts=page_options(offset))
+
+        if is_playlist(info):
+            return page_response(info, url, offset)
+
+        # Stream-copy friendly choices, each flagged with whether it needs a transcode
+        formats_out = plan_formats(info)
+
+        return {
+            "type": "video",
+            "title": info.get('title'),
+            "thumbnail": thumbnail_of(info),
+            "duration": info.get('duration'),
+            "formats": formats_out,
+            "webpage_url": info.get('webpage_url') or url
+        }
+    except InfoBusy:
+        raise HTTPException(status_code=503, detail="Too many lookups in progress, please try again in a moment",
+                            headers={"Retry-After": "10"})
+    except InfoTimeout:
+        raise HTTPException(status_code=504, detail="The site took too long to respond, please try again")
+    except ClientGone:
+        return Response(status_code=499)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/start_download")
-async def start_download(request: DownloadRequest, background_tasks: BackgroundTasks):
+async def start_download(request: DownloadRequest, http_request: Request):
+    client = enforce_rate_limit(http_request, 'start_download')
+    if request.target_ext and request.target_ext not in AUDIO_TARGETS + VIDEO_TARGETS:
+        raise HTTPException(status_code=400, detail=f"Unsupported target format: {request.target_ext}")
+    # Extractor matching is CPU work and the job store may be remote, keep both off the event loop
+    source_key = await asyncio.to_thread(cache_key, request.url)
+    info = info_cache.get(source_key)
+    try:
+        duration = (info or {}).get('duration')
+        clip = parse_clip(request.start_time, request.end_time, request.clip_mode, duration)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return await asyncio.to_thread(queue_download, request.url, request.format_id, client, clip,
+                                       request.target_ext, source_key, info, max_queued=rate_limits.max_queued(client))
+    except QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please try again in a moment",
+            headers={"Retry-After": "30"}
+        )
+
+def queue_download(url: str, format_id: str, client: str, clip: tuple = None, target_ext: str = None,
+                   source_key: str = None, info: dict = None, priority: int = 0, max_queued: int = 0) -> dict:
+    """Create a job for url: served from the file cache, attached to an identical job, or queued.
+
+    Returns {"job_id", "queue_position", "stream_url"}. Raises QueueFull when the
+    scheduler has no room, and a 429 when client already has max_queued jobs waiting.
+    """
     job_id = str(uuid.uuid4())
-    download_jobs[job_id] = {
-        "status": "pending",
+    job = {
+        "status": "queued",
         "progress": 0,
         "filename": None,
-        "error": None
+        "error": None,
+        "_created": time.time()
     }
-    background_tasks.add_task(process_download, job_id, request.url, request.format_id, request.start_time, request.end_time)
-    return {"job_id": job_id}
+    if source_key is None:
+        source_key = cache_key(url)
+        info = info_cache.get(source_key)
+    # Serve a finished file from the cache without downloading again
+    output_format = output_key(format_id, target_ext)
+    cached_path = file_cache.lookup(file_key(source_key, output_format, clip))
+    if cached_path:
+        file_cache.pin(job_id, cached_path)
+        job_store.create(job_id, {**job, "status": "completed", "progress": 100, "filename": cached_path})
+        metrics.jobs_total.inc(status='completed')
+        metrics.job_duration_seconds.observe(0, status='completed')
+        return {"job_id": job_id, "queue_position": None}
+
+    # Progressive single-file formats can be streamed while downloading
+    streamable = is_streamable(format_id, clip, info) and not target_ext
+    stream_url = f"/stream/{job_id}" if streamable else None
+    job['_streamable'] = streamable
+
+    # Attach to an identical job that is already queued or running
+    flight_key = (source_key, output_format, clip)
+    leader = download_groups.attach(flight_key, job_id)
+    if leader:
+        job_store.create(job_id, {**job, **(job_store.get(leader) or {}), '_streamable': streamable, '_created': job['_created']})
+        return {"job_id": job_id, "queue_position": scheduler.position(leader), "stream_url": stream_url}
+
+    if max_queued and scheduler.queued_for(client) >= max_queued:
+        download_groups.finish(job_id)
+        metrics.rate_limited.inc(scope='queue')
+        raise HTTPException(status_code=429, detail="You already have downloads waiting, please let them finish first",
+                            headers={"Retry-After": "30"})
+
+    job_store.create(job_id, job)
+    try:
+        # Fair share between clients, and within the upstream site's budget
+        position = scheduler.submit(job_id, process_download, job_id, url, format_id,
+                                    clip, target_ext, info, priority=priority, client=client,
+                                    site=extractor_for(source_key, info), weight=rate_limits.weight(client))
+    except QueueFull:
+        download_groups.finish(job_id)
+        job_store.delete(job_id)
+        raise
+    return {"job_id": job_id, "queue_position": position, "stream_url": stream_url}
+
+@app.post("/batch")
+async def start_batch(request: BatchRequest, http_request: Request):
+    """Download a list of URLs or a playlist; poll /batch/{id}, then fetch /batch/{id}/zip"""
+    client = enforce_rate_limit(http_request, 'batch')
+    urls = [u.strip() for u in request.urls or [] if u and u.strip()]
+    if bool(urls) == bool(request.url):
+        raise HTTPException(status_code=400, detail="Send either a list of urls or one playlist url")
+    if len(urls) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch can have at most {BATCH_MAX_ITEMS} URLs")
+    if request.target_ext and request.target_ext not in AUDIO_TARGETS + VIDEO_TARGETS:
+        raise HTTPException(status_code=400, detail=f"Unsupported target format: {request.target_ext}")
+    batch_id = str(uuid.uuid4())
+    options = {"format_id": request.format_id, "target_ext": request.target_ext, "client": client}
+    batch = await batch_runner.submit(batch_id, [{"url": u, "title": None} for u in urls] or None, request.url, options)
+    return {"batch_id": batch_id, "status": batch['status'], "total": batch['total']}
+
+def get_batch_record(batch_id: str) -> dict:
+    batch = job_store.get(batch_id)
+    if not batch or 'items' not in batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+def item_jobs(batch: dict) -> dict:
+    return {item['job_id']: job for item in batch['items']
+            if item.get('job_id') and (job := job_store.get(item['job_id'])) is not None}
+
+@app.get("/batch/{batch_id}")
+def get_batch(batch_id: str):
+    """Aggregate progress of a batch and the state of each item"""
+    batch = get_batch_record(batch_id)
+    result = summarize(batch, item_jobs(batch))
+    if batch['status'] == 'completed' and result['counts'].get('completed'):
+        result['zip_url'] = f"/batch/{batch_id}/zip"
+    return result
+
+@app.delete("/batch/{batch_id}")
+def delete_batch(batch_id: str):
+    """Cancel a batch and every download it started"""
+    if not batch_runner.cancel(batch_id):
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return {"message": "Batch cancelled"}
+
+@app.get("/batch/{batch_id}/zip")
+def serve_batch_zip(batch_id: str):
+    """The batch's finished files as one ZIP, streamed while it is written"""
+    batch = get_batch_record(batch_id)
+    if batch['status'] != 'completed':
+        raise HTTPException(status_code=409, detail="Batch is not finished yet")
+    jobs = item_jobs(batch)
+    files, used = [], set()
+    for index, item in enumerate(batch['items'], 1):
+        job = jobs.get(item.get('job_id'))
+        if job and job['status'] == 'completed' and job.get('filename') and os.path.exists(job['filename']):
+            file_cache.pin(item['job_id'], job['filename'])
+            files.append((item['job_id'], zip_name(index, item.get('title'), job['filename'], used), job['filename']))
+    if not files:
+        raise HTTPException(status_code=410, detail="No finished files left in this batch, please download again")
+
+    def zip_sent(nbytes: int, complete: bool):
+        metrics.served_bytes.inc(nbytes)
+        metrics.served_requests.inc(response='zip' if complete else 'zip_interrupted')
+        for job_id, _, path in files:
+            file_cache.release(path)
+            mark_served(job_id)
+
+    def body():
+        # Taken once the body is actually sent: zip_stream's on_done releases them, and
+        # a response that never starts (client gone before the first chunk) holds nothing
+        for _, _, path in files:
+            file_cache.acquire(path)
+        yield from zip_stream([(name, path) for _, name, path in files], on_done=zip_sent)
+
+    return StreamingResponse(
+        body(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="batch_{batch_id[:8]}.zip"'}
+    )
 
 @app.get("/status/{job_id}")
-async def get_status(job_id: str):
-    job = download_jobs.get(job_id)
+def get_status(job_id: str):
+    job = job_store.get(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    return job
+    return public_job(job_id, job)
 
-@app.get("/serve_file/{job_id}")
-async def serve_file(job_id: str):
-    job = download_jobs.get(job_id)
+@app.delete("/jobs/{job_id}")
+def delete_job(job_id: str):
+    """Cancel a job, aborting its download unless another job shares it"""
+    if not lifecycle.cancel(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"message": "Job cancelled"}
+
+@app.get("/admin/jobs")
+def get_job_stats(admin = Depends(get_current_admin)):
+    """Download pipeline state: scheduler, job store and lifecycle counters"""
+    return {
+        "scheduler": scheduler.stats(),
+        "job_store": job_store.name,
+        "lifecycle": dict(lifecycle.stats),
+        "download_tuning": download_tuning.stats(),
+        "info": info_fetcher.stats(),
+        "rate_limits": rate_limits.stats(),
+        "batches": batch_runner.stats(),
+        # Sessions of this process (the process backend keeps its own per worker)
+        "upstream": ydl_pool.stats(),
+        "public_cache": public_cache.stats(),
+    }
+
+@metrics.registry.collector
+def collect_pipeline_metrics():
+    sched = scheduler.stats()
+    metrics.jobs_active.set(sched['running'], state='running')
+    metrics.jobs_active.set(sched['queued'], state='queued')
+    metrics.site_jobs.clear()
+    for site, counts in sched['sites'].items():
+        for state, count in counts.items():
+            metrics.site_jobs.set(count, site=site, state=state)
+    metrics.site_budget.clear()
+    for site in rate_limits.stats()['sites']:
+        budget = rate_limits.site_budget(site)
+        metrics.site_budget.set(budget.get('concurrency') or 0, site=site, limit='concurrency')
+        metrics.site_budget.set(budget.get('rate') or 0, site=site, limit='rate')
+    info = info_fetcher.stats()
+    metrics.info_extractions.set(info['running'], state='running')
+    metrics.info_extractions.set(info['waiting'], state='waiting')
+    for reason in ('rejected', 'timeouts', 'disconnects'):
+        metrics.info_aborted.set_total(info[reason], reason=reason)
+    metrics.disk_bytes.set(metrics.directory_bytes(JOB_WORK_DIR), area='work')
+    metrics.disk_bytes.set(file_cache.total_bytes(), area='file_cache')
+    for name, stats in (('info', info_cache.stats()), ('file', file_cache.stats())):
+        metrics.cache_lookups.set_total(stats['hits'], cache=name, result='hit')
+        metrics.cache_lookups.set_total(stats['misses'], cache=name, result='miss')
+        metrics.cache_hit_ratio.set(stats['hit_ratio'], cache=name)
+    for event, count in dict(lifecycle.stats).items():
+        if event == 'bytes_reclaimed':
+            metrics.lifecycle_reclaimed_bytes.set_total(count)
+        else:
+            metrics.lifecycle_events.set_total(count, event=event)
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(request: Request):
+    """Prometheus scrape endpoint"""
+    if metrics.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {metrics.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/jobs/slowest")
+def get_slowest_jobs(limit: int = 20, admin = Depends(get_current_admin)):
+    """Recent jobs handled by this worker, slowest first, with their stage timings"""
+    return {"jobs": tracer.slowest(min(max(limit, 1), 200))}
+
+@app.get("/status/{job_id}/stream")
+async def stream_status(job_id: str, request: Request):
+    """Push job updates as Server-Sent Events until the job finishes"""
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        q = progress_broker.subscribe(job_id)
+        try:
+            snapshot = public_job(job_id, job)
+            yield f"data: {json.dumps(snapshot)}\n\n"
+            idle = 0
+            while snapshot['status'] not in ('completed', 'error'):
+                if await request.is_disconnected():
+                    return
+                # Pushes only come from this worker's downloads; re-read the job store
+                # every second while queued (moving position) or when it is shared
+                shared = job_store.name != "memory"
+                timeout = 1 if shared or snapshot['status'] == 'queued' else 15
+                try:
+                    update = await asyncio.wait_for(q.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    current = await asyncio.to_thread(job_store.get, job_id)
+                    if current is None:
+                        return
+                    update = public_job(job_id, current)
+                    if update == snapshot:
+                        idle += timeout
+                        if idle >= 15:
+                            idle = 0
+                            yield ": keep-alive\n\n"
+                        continue
+                if update == snapshot:
+                    continue
+                idle = 0
+                snapshot = update
+                yield f"data: {json.dumps(snapshot)}\n\n"
+        finally:
+            progress_broker.unsubscribe(job_id, q)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws/status")
+async def websocket_status(websocket: WebSocket):
+    """Multiplex updates for several jobs over one socket.
+
+    The client sends {"subscribe": [job_id, ...]}; every update is sent as a
+    job snapshot with its job_id.
+    """
+    await websocket.accept()
+    merged: asyncio.Queue = asyncio.Queue()
+    forwarders = {}
+
+    async def forward(job_id: str, q: asyncio.Queue):
+        try:
+            while True:
+                await merged.put((job_id, await q.get()))
+        finally:
+            progress_broker.unsubscribe(job_id, q)
+
+    async def receive():
+        while True:
+            message = await websocket.receive_json()
+            for job_id in message.get("subscribe", []):
+                if job_id in forwarders:
+                    continue
+                job = await asyncio.to_thread(job_store.get, job_id)
+                if job is None:
+                    continue
+                q = progress_broker.subscribe(job_id)
+                forwarders[job_id] = asyncio.create_task(forward(job_id, q))
+                await merged.put((job_id, public_job(job_id, job)))
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while True:
+            getter = asyncio.create_task(merged.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                getter.cancel()
+                receiver.result()  # re-raise disconnects
+                return
+            job_id, snapshot = getter.result()
+            await websocket.send_json({"job_id": job_id, **snapshot})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        for task in forwarders.values():
+            task.cancel()
+
+@app.api_route("/serve_file/{job_id}", methods=["GET", "HEAD"])
+async def serve_file(job_id: str, request: Request):
+    """Send a finished file; supports Range/If-Range for resumed and segmented downloads"""
+    job = await asyncio.to_thread(job_store.get, job_id)
     if not job or job['status'] != 'completed':
         raise HTTPException(status_code=400, detail="File not ready")
     
     filename = job['filename']
-    return FileResponse(
+    try:
+        stat_result = os.stat(filename)
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="File expired, please download again")
+    name = f"video_dl_{job_id}{os.path.splitext(filename)[1]}"
+    media_type = media_type_for(filename)
+    # Pinned again if the grace window of an earlier transfer has already ended
+    file_cache.pin(job_id, filename)
+
+    offloaded = offload_response(filename, name, media_type, file_cache.directory)
+    if offloaded:
+        metrics.served_requests.inc(response='offload')
+        await asyncio.to_thread(mark_served, job_id)
+        return offloaded
+
+    file_cache.acquire(filename)
+    response = ResumableFileResponse(
         path=filename,
-        filename=f"video_dl_{job_id}{os.path.splitext(filename)[1]}",
-        media_type='application/octet-stream',
-        background=BackgroundTask(cleanup_file, filename)
+        filename=name,
+        media_type=media_type,
+        stat_result=stat_result,
+        on_done=lambda r, seconds: file_sent(job_id, filename, job.get('_ready_at'), r, seconds)
+    )
+    cached = not_modified(request, response)
+    if cached:
+        file_cache.release(filename)
+        metrics.served_requests.inc(response='not_modified')
+        return cached
+    metrics.served_requests.inc(response='range' if 'range' in request.headers else 'full')
+    return response
+
+@app.get("/stream/{job_id}")
+async def stream_file(job_id: str, request: Request):
+    """Send a progressive download to the client while it is still being fetched"""
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job['status'] == 'completed':
+        return await serve_file(job_id, request)
+    if job['status'] == 'error':
+        raise HTTPException(status_code=400, detail=job.get('error') or "Download failed")
+    if not job.get('_streamable'):
+        raise HTTPException(status_code=409, detail="Streaming is not available for this format, use /serve_file")
+
+    async def get_job():
+        return await asyncio.to_thread(job_store.get, job_id)
+
+    source = await wait_for_source(get_job)
+    if not source:
+        raise HTTPException(status_code=504, detail="Download did not start in time")
+    if ((await get_job()) or {}).get('status') == 'completed':
+        return await serve_file(job_id, request)
+
+    started = time.monotonic()
+
+    def on_complete():
+        mark_served(job_id)
+        final = job_store.get(job_id) or {}
+        if final.get('filename') and os.path.exists(final['filename']):
+            record_served(job_id, None, time.monotonic() - started, os.path.getsize(final['filename']))
+
+    return StreamingResponse(
+        tail_file(source, get_job, on_complete=on_complete),
+        media_type=media_type_for(source),
+        headers={"Content-Disposition": f'attachment; filename="video_dl_{job_id}{final_extension(source)}"'}
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,226 @@
+"""
+Pipeline metrics
+Counters, gauges and histograms for the download pipeline, exported in the
+Prometheus text format on /metrics. Recording a sample is a dict lookup and an
+add under a lock, so instrumentation can stay on under full load; values that
+are expensive to compute (disk usage, cache state) are collected at scrape time.
+"""
+import os
+import bisect
+import threading
+from typing import Callable, Dict, List, Tuple
+
+# Optional bearer token required to scrape /metrics (open when empty)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Bucket bounds (seconds / bytes per second)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+DURATION_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+THROUGHPUT_BUCKETS = tuple(2 ** n * 1024 for n in range(6, 17, 2))  # 64 KiB/s .. 64 MiB/s
+INF_BOUND = 'le="+Inf"'
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels):
+        """Mirror a count that is kept elsewhere (e.g. a cache's hit counter)"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def clear(self):
+        """Drop every series (for collectors that set the current label sets on each scrape)"""
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = f'le="{_number(bound)}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, INF_BOUND)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """Holds the metrics and the scrape-time collectors"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], None]) -> Callable[[], None]:
+        """Register fn to refresh gauges right before each scrape"""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- Pipeline metrics ---
+
+info_extraction_seconds = registry.register(Histogram(
+    "anda_info_extraction_seconds", "Time spent extracting video info", ("extractor",)))
+rate_limited = registry.register(Counter(
+    "anda_rate_limited_total", "Requests refused by a per-client limit", ("scope",)))
+site_jobs = registry.register(Gauge(
+    "anda_site_jobs", "Scheduled downloads per upstream site", ("site", "state")))
+site_budget = registry.register(Gauge(
+    "anda_site_budget", "Configured per-site download budget (concurrency, starts per second)", ("site", "limit")))
+info_extractions = registry.register(Gauge(
+    "anda_info_extractions", "/info extractions on this worker", ("state",)))
+info_aborted = registry.register(Counter(
+    "anda_info_aborted_total", "/info requests that did not wait for their extraction", ("reason",)))
+download_bytes = registry.register(Counter(
+    "anda_download_bytes_total", "Bytes downloaded from upstream"))
+download_throughput = registry.register(Histogram(
+    "anda_download_throughput_bytes_per_second", "Average download speed per job",
+    buckets=THROUGHPUT_BUCKETS))
+postprocess_seconds = registry.register(Histogram(
+    "anda_postprocess_seconds", "Time from download finished to final file (merge/convert/clip)"))
+job_duration_seconds = registry.register(Histogram(
+    "anda_job_duration_seconds", "Time from job creation to completion or failure", ("status",),
+    buckets=DURATION_BUCKETS))
+jobs_total = registry.register(Counter(
+    "anda_jobs_total", "Jobs that reached a terminal state", ("status",)))
+jobs_active = registry.register(Gauge(
+    "anda_jobs_active", "Jobs in the download scheduler", ("state",)))
+disk_bytes = registry.register(Gauge(
+    "anda_disk_bytes", "Disk used by the download pipeline", ("area",)))
+postprocess_jobs = registry.register(Counter(
+    "anda_postprocess_jobs_total", "Finished downloads by post-processing mode (copy or transcode)", ("mode",)))
+served_requests = registry.register(Counter(
+    "anda_served_requests_total", "File requests by response (full, range, not_modified, offload, zip, zip_interrupted)", ("response",)))
+served_bytes = registry.register(Counter(
+    "anda_served_bytes_total", "File bytes sent to clients by the app (excludes proxy offload)"))
+cache_lookups = registry.register(Counter(
+    "anda_cache_lookups_total", "Cache lookups", ("cache", "result")))
+cache_hit_ratio = registry.register(Gauge(
+    "anda_cache_hit_ratio", "Cache hit ratio since startup", ("cache",)))
+lifecycle_events = registry.register(Counter(
+    "anda_lifecycle_events_total",
+    "Job lifecycle reaper work (sweeps, jobs_cancelled, jobs_expired, pins_released, orphans_removed)", ("event",)))
+lifecycle_reclaimed_bytes = registry.register(Counter(
+    "anda_lifecycle_reclaimed_bytes_total", "Disk freed by the job lifecycle reaper (work dirs and cached files)"))
+
+
+def directory_bytes(path: str) -> int:
+    """Total size of the files under path"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
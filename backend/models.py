@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, JSON, Float, Index
 from datetime import datetime
 from database import Base
 
@@ -19,6 +19,7 @@ class Blog(Base):
     title = Column(String(200), nullable=False)
     slug = Column(String(200), unique=True, index=True, nullable=False)
     content = Column(Text, nullable=False)
+    content_html = Column(Text)  # content rendered and sanitized on save (blog_posts.render_content)
     excerpt = Column(Text)
     author = Column(String(100))
     featured_image = Column(String(500))
@@ -29,6 +30,9 @@ class Blog(Base):
     meta_title = Column(String(200))
     meta_description = Column(String(300))
 
+    # Public listing: published posts newest first, paged by (published_at, id)
+    __table_args__ = (Index("ix_blogs_status_published", "status", "published_at", "id"),)
+
 class Settings(Base):
     __tablename__ = "settings"
     
@@ -50,3 +54,19 @@ class SEOConfig(Base):
     og_image = Column(String(500))
     structured_data = Column(JSON)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Job(Base):
+    __tablename__ = "download_jobs"
+    
+    id = Column(String(36), primary_key=True)  # job_id (uuid4)
+    status = Column(String(20), index=True)
+    data = Column(Text, nullable=False)  # JSON encoded job state
+    expires_at = Column(Float, index=True)  # unix time, set once the job finishes
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+    
+    name = Column(String(50), primary_key=True)  # public, ...
+    version = Column(Integer, nullable=False, default=0)  # bumped on every write to what it covers
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
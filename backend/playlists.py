@@ -0,0 +1,101 @@
+"""
+Playlist pages for /info
+Playlist and channel URLs are extracted flat: each entry is just its URL, title,
+duration and thumbnail, and formats are only resolved once the user picks an
+entry (a regular /info call for its URL). /info returns one page of entries plus
+an opaque cursor for the next one. Paged playlists (most channels, YouTube
+playlists) are fetched lazily, so a page costs the upstream pages it covers
+rather than the whole list and the memory a request needs does not grow with
+the playlist's length.
+"""
+import os
+import json
+import base64
+from typing import List, Optional, Tuple
+
+# Entries per /info page
+PLAYLIST_PAGE_SIZE = int(os.getenv("PLAYLIST_PAGE_SIZE", "50"))
+# Furthest entry a cursor may point at
+PLAYLIST_MAX_OFFSET = int(os.getenv("PLAYLIST_MAX_OFFSET", "10000"))
+
+PLAYLIST_TYPES = ('playlist', 'multi_video')
+
+
+def is_playlist(info: dict) -> bool:
+    return info.get('_type') in PLAYLIST_TYPES
+
+
+def page_options(offset: int = 0, size: int = PLAYLIST_PAGE_SIZE) -> dict:
+    """yt-dlp options extracting entries offset..offset+size flat, plus one to tell whether more follow"""
+    return {
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+        'playliststart': offset + 1,
+        'playlistend': offset + size + 1,
+    }
+
+
+def page_key(key: str, offset: int) -> str:
+    """info_cache key of a playlist page (never the video key, which downloads use)"""
+    return f"{key}#playlist:{offset}"
+
+
+def encode_cursor(url: str, offset: int) -> str:
+    raw = json.dumps({"u": url, "o": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """(playlist url, offset) from a cursor. Raises ValueError for a malformed one."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        url, offset = str(data["u"]), int(data["o"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not 0 <= offset <= PLAYLIST_MAX_OFFSET:
+        raise ValueError("Cursor is out of range")
+    return url, offset
+
+
+def entry_url(entry: dict, pages: tuple = ()) -> Optional[str]:
+    """URL to extract or download an entry from"""
+    if entry.get('_type') in ('url', 'url_transparent') or entry.get('webpage_url') in pages:
+        # Flat entries only have their url; videos embedded in the page itself
+        # share its webpage_url, so their media url is what identifies them
+        return entry.get('url')
+    return entry.get('webpage_url') or entry.get('url')
+
+
+def thumbnail_of(info: dict) -> Optional[str]:
+    # Prefer the last (largest) of 'thumbnails' over the often low-res 'thumbnail'
+    return (info.get('thumbnails') or [{}])[-1].get('url') or info.get('thumbnail')
+
+
+def page_response(info: dict, url: str, offset: int, size: int = PLAYLIST_PAGE_SIZE) -> dict:
+    """/info body for one page of a flat-extracted playlist"""
+    pages = (url, info.get('webpage_url'))
+    entries: List[dict] = []
+    raw = [e for e in info.get('entries') or [] if e]
+    for entry in raw[:size]:
+        link = entry_url(entry, pages)
+        if not link:
+            continue
+        entries.append({
+            "id": entry.get('id'),
+            "title": entry.get('title'),
+            "url": link,
+            "duration": entry.get('duration'),
+            "thumbnail": thumbnail_of(entry),
+        })
+    more = len(raw) > size and offset + size <= PLAYLIST_MAX_OFFSET
+    return {
+        "type": "playlist",
+        "title": info.get('title'),
+        "thumbnail": thumbnail_of(info),
+        "webpage_url": info.get('webpage_url') or url,
+        # Total number of entries when the site reports it
+        "entry_count": info.get('playlist_count'),
+        "offset": offset,
+        "entries": entries,
+        "next_cursor": encode_cursor(url, offset + size) if more else None,
+    }
@@ -0,0 +1,77 @@
+"""
+Job progress push
+Fans job state changes out to Server-Sent Events / WebSocket subscribers.
+Updates are published from download worker threads and delivered on the event
+loop; progress-only updates are throttled so clients are not flooded.
+"""
+import os
+import time
+import asyncio
+import threading
+from typing import Dict, List, Optional
+
+# Minimum seconds between progress-only updates for a job...
+PROGRESS_MIN_INTERVAL = float(os.getenv("PROGRESS_MIN_INTERVAL", "0.25"))
+# ...unless progress moved at least this many percentage points
+PROGRESS_MIN_DELTA = float(os.getenv("PROGRESS_MIN_DELTA", "1.0"))
+# Pending updates kept per subscriber; older ones are dropped for slow clients
+SUBSCRIBER_QUEUE_SIZE = 16
+
+
+class ProgressBroker:
+    """Thread-safe publisher of job snapshots to asyncio subscribers"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._last_sent: Dict[str, tuple] = {}  # job_id -> (time, status, progress)
+        self._lock = threading.Lock()
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Remember the event loop subscribers live on (call at startup)"""
+        self._loop = loop
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        q = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append(q)
+        return q
+
+    def unsubscribe(self, job_id: str, q: asyncio.Queue):
+        with self._lock:
+            queues = self._subscribers.get(job_id)
+            if queues and q in queues:
+                queues.remove(q)
+            if not queues:
+                self._subscribers.pop(job_id, None)
+                self._last_sent.pop(job_id, None)
+
+    def publish(self, job_id: str, snapshot: dict):
+        """Queue snapshot for job_id's subscribers, subject to throttling"""
+        with self._lock:
+            queues = list(self._subscribers.get(job_id, ()))
+            if not queues or self._loop is None:
+                return
+            now = time.monotonic()
+            status = snapshot.get('status')
+            progress = snapshot.get('progress') or 0
+            last = self._last_sent.get(job_id)
+            if last and last[1] == status:
+                if now - last[0] < PROGRESS_MIN_INTERVAL and abs(progress - last[2]) < PROGRESS_MIN_DELTA:
+                    return
+            self._last_sent[job_id] = (now, status, progress)
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, queues, dict(snapshot))
+        except RuntimeError:
+            # Event loop already closed (shutdown)
+            pass
+
+    @staticmethod
+    def _deliver(queues: List[asyncio.Queue], snapshot: dict):
+        for q in queues:
+            if q.full():
+                q.get_nowait()
+            q.put_nowait(snapshot)
+
+
+progress_broker = ProgressBroker()
@@ -0,0 +1,179 @@
+"""
+Public settings cache
+Every page render of the frontend asks for /api/public-settings and
+/api/public-seo, and crawlers for /robots.txt, all built from Settings and
+SEOConfig rows that change a few times a month. The responses are built once
+per change: the rows are read together, serialized, and kept as ready bodies
+with their ETags, so a request costs no query and no JSON encoding, and a
+client holding the current ETag gets a 304.
+
+Admin writes invalidate the cache of their own worker at once and bump a
+version counter in the cache_versions table; the other workers compare their
+copy against it at most every PUBLIC_CACHE_CHECK_INTERVAL seconds.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# Seconds between checks of the shared version counter (0 = check on every request)
+PUBLIC_CACHE_CHECK_INTERVAL = float(os.getenv("PUBLIC_CACHE_CHECK_INTERVAL", "5"))
+# Seconds browsers, the frontend server and CDNs may reuse a response without revalidating
+PUBLIC_CACHE_MAX_AGE = int(os.getenv("PUBLIC_CACHE_MAX_AGE", "60"))
+
+# Settings exposed by /api/public-settings (admin_panel_url stays private)
+PUBLIC_SETTING_KEYS = ("favicon_url", "verification_tags", "robots_txt", "site_name", "site_tagline", "analytics_id")
+DEFAULT_ROBOTS = "User-agent: *\nAllow: /"
+VERSION_NAME = "public"
+
+
+class Body(NamedTuple):
+    content: bytes
+    media_type: str
+    etag: str
+
+
+def make_body(content: bytes, media_type: str) -> Body:
+    return Body(content, media_type, '"%s"' % hashlib.sha1(content).hexdigest()[:20])
+
+
+def read_version(db, name: str) -> int:
+    from models import CacheVersion
+    row = db.query(CacheVersion.version).filter(CacheVersion.name == name).first()
+    return row[0] if row else 0
+
+
+def bump_version(db, name: str, commit: bool = True) -> int:
+    """Increment a shared version counter and return the new value.
+    With commit=False it is left to the caller's transaction, so it moves with the write."""
+    from models import CacheVersion
+    updated = db.query(CacheVersion).filter(CacheVersion.name == name) \
+        .update({CacheVersion.version: CacheVersion.version + 1}, synchronize_session=False)
+    if not updated:
+        db.add(CacheVersion(name=name, version=1))
+    if commit:
+        db.commit()
+    return read_version(db, name)
+
+
+class PublicCache:
+    """Serialized public settings, SEO and robots.txt bodies, rebuilt when the shared version moves"""
+
+    def __init__(self, session_factory=None, check_interval: float = PUBLIC_CACHE_CHECK_INTERVAL):
+        self._session_factory = session_factory
+        self.check_interval = check_interval
+        self._bodies: Optional[Dict[str, Body]] = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "builds": 0, "version_checks": 0, "errors": 0}
+
+    def _session(self):
+        if self._session_factory is None:
+            from database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def get(self, name: str) -> Body:
+        """"settings", "seo" or "robots"; raises only when nothing was ever built"""
+        bodies = self._bodies
+        if bodies is not None and time.monotonic() - self._checked_at < self.check_interval:
+            self.counters["hits"] += 1
+            return bodies[name]
+        with self._lock:
+            return self._refresh()[name]
+
+    def _refresh(self) -> Dict[str, Body]:
+        # Another thread may have refreshed while this one waited for the lock
+        if self._bodies is not None and time.monotonic() - self._checked_at < self.check_interval:
+            self.counters["hits"] += 1
+            return self._bodies
+        now = time.monotonic()
+        db = self._session()
+        try:
+            self.counters["version_checks"] += 1
+            version = read_version(db, VERSION_NAME)
+            if self._bodies is None or version != self._version:
+                # Version first: a write landing in between only causes one more rebuild
+                self._bodies = self._build(db)
+                self._version = version
+                self.counters["builds"] += 1
+            else:
+                self.counters["hits"] += 1
+        except Exception as e:
+            self.counters["errors"] += 1
+            if self._bodies is None:
+                raise
+            print(f"Public cache refresh error: {e}")
+        finally:
+            db.close()
+        self._checked_at = now
+        return self._bodies
+
+    def _build(self, db) -> Dict[str, Body]:
+        from models import Settings, SEOConfig
+        settings = {s.key: s.value for s in db.query(Settings).filter(Settings.key.in_(PUBLIC_SETTING_KEYS))}
+        seo = {c.page: {
+            "title": c.title,
+            "description": c.description,
+            "keywords": c.keywords,
+            "og_image": c.og_image,
+            "structured_data": c.structured_data
+        } for c in db.query(SEOConfig)}
+        encode = lambda data: json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+        return {
+            "settings": make_body(encode(settings), "application/json"),
+            "seo": make_body(encode(seo), "application/json"),
+            "robots": make_body((settings.get("robots_txt") or DEFAULT_ROBOTS).encode(), "text/plain; charset=utf-8"),
+        }
+
+    def invalidate(self, db=None):
+        """Drop this worker's copy and tell the others (call after committing the write)"""
+        self._bodies = None
+        try:
+            if db is not None:
+                bump_version(db, VERSION_NAME)
+            else:
+                session = self._session()
+                try:
+                    bump_version(session, VERSION_NAME)
+                finally:
+                    session.close()
+        except Exception as e:
+            print(f"Public cache version bump failed: {e}")
+
+    def stats(self) -> dict:
+        return {"version": self._version, "cached": self._bodies is not None,
+                "check_interval": self.check_interval, **self.counters}
+
+
+def client_has(request: Request, etag: str, last_modified: float = None) -> bool:
+    """Whether the client's If-None-Match (or, without one, If-Modified-Since) matches"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= int(last_modified)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def cached_response(request: Request, body: Body, max_age: int = PUBLIC_CACHE_MAX_AGE) -> Response:
+    """body as a response, or a 304 when the client's If-None-Match already has it"""
+    headers = {"ETag": body.etag, "Cache-Control": f"public, max-age={max_age}"}
+    if client_has(request, body.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body.content, media_type=body.media_type, headers=headers)
+
+
+public_cache = PublicCache()
@@ -0,0 +1,218 @@
+"""
+Rate limits
+Token buckets per client (IP address, or a configured API key) for /info,
+/start_download and /batch, and per-site budgets (concurrent downloads and job
+starts per second) that the download scheduler applies so a single upstream
+site is not hit hard enough to get our egress IPs throttled. API keys can also carry a
+weight for the scheduler's fair queuing.
+
+Settings:
+  rate_limits  json  {
+      "info": {"rate": per-second refill, "burst": bucket size},
+      "start_download": {...},
+      "batch": {...},
+      "max_queued_per_client": jobs a client may have waiting,
+      "sites": {"default": {"concurrency": n, "rate": starts/s, "burst": n}, "Youtube": {...}},
+      "api_keys": {"<key>": {"weight": 2, "info": {...}, "start_download": {...}}}
+  }
+"""
+import os
+import json
+import math
+import time
+import ipaddress
+import threading
+from collections import OrderedDict
+
+# Header carrying the client address when behind a proxy; its last entry is used, which
+# is the one the nearest proxy appended. Overrides the X-Forwarded-For handling below.
+RATE_LIMIT_CLIENT_HEADER = os.getenv("RATE_LIMIT_CLIENT_HEADER", "")
+# Proxies (addresses or networks, comma separated) whose X-Forwarded-For is believed; the
+# private ranges cover Railway's edge and other platform load balancers
+RATE_LIMIT_TRUSTED_PROXIES = [
+    ipaddress.ip_network(net.strip(), strict=False)
+    for net in os.getenv("RATE_LIMIT_TRUSTED_PROXIES",
+                         "127.0.0.0/8,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,100.64.0.0/10,::1/128,fc00::/7").split(",")
+    if net.strip()
+]
+# Header clients send their API key in
+RATE_LIMIT_API_KEY_HEADER = os.getenv("RATE_LIMIT_API_KEY_HEADER", "X-API-Key")
+# Client buckets kept in memory (least recently used ones are dropped)
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+# Seconds the Settings values are reused before they are read again
+SETTINGS_TTL = 30
+
+# Used when the Settings table has no rate_limits entry (or a part of it)
+DEFAULT_LIMITS = {
+    "info": {"rate": 0.5, "burst": 20},
+    "start_download": {"rate": 0.1, "burst": 10},
+    "batch": {"rate": 0.01, "burst": 3},
+    "max_queued_per_client": 5,
+    "sites": {"default": {"concurrency": 4, "rate": 0.5, "burst": 5}},
+    "api_keys": {},
+}
+
+
+def default_settings():
+    """(key, value, type, description) rows created by init_db"""
+    return [
+        ("rate_limits", json.dumps(DEFAULT_LIMITS), "json",
+         "Per-client request limits, per-site download budgets and API key weights"),
+    ]
+
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in net for net in RATE_LIMIT_TRUSTED_PROXIES)
+
+
+class TokenBucket:
+    """rate tokens per second up to burst. Not thread-safe, callers hold a lock."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = max(0.0, float(rate))
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float = None) -> float:
+        """Seconds until a token is available (0 when one is available now)"""
+        self._refill(now or time.monotonic())
+        if self.tokens >= 1:
+            return 0.0
+        return math.inf if self.rate <= 0 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float = None) -> float:
+        """Take a token. Returns 0 on success, else the seconds to wait for one."""
+        wait = self.wait_time(now)
+        if wait == 0:
+            self.tokens -= 1
+        return wait
+
+
+class RateLimits:
+    """Reads limits from the Settings table (cached) and keeps the per-client buckets"""
+
+    def __init__(self, session_factory=None, max_clients: int = RATE_LIMIT_MAX_CLIENTS):
+        self._session_factory = session_factory
+        self._settings = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[tuple, TokenBucket]" = OrderedDict()
+        self._max_clients = max_clients
+
+    def _load(self) -> dict:
+        now = time.monotonic()
+        if self._settings is not None and now - self._loaded_at < SETTINGS_TTL:
+            return self._settings
+        settings = json.loads(json.dumps(DEFAULT_LIMITS))
+        try:
+            from models import Settings
+            if self._session_factory is None:
+                from database import SessionLocal
+                self._session_factory = SessionLocal
+            db = self._session_factory()
+            try:
+                row = db.query(Settings).filter(Settings.key == "rate_limits").first()
+            finally:
+                db.close()
+            if row and row.value:
+                configured = json.loads(row.value)
+                settings.update(configured)
+                settings["sites"] = {**DEFAULT_LIMITS["sites"], **(configured.get("sites") or {})}
+        except Exception as e:
+            print(f"Rate limit settings error: {e}")
+            if self._settings is not None:
+                return self._settings
+        self._settings, self._loaded_at = settings, now
+        return settings
+
+    def invalidate(self):
+        """Re-read the Settings table on the next request"""
+        self._settings = None
+
+    # --- Clients ---
+
+    def client_id(self, request) -> str:
+        """A configured API key ("key:..."), else the client address ("ip:...")"""
+        key = request.headers.get(RATE_LIMIT_API_KEY_HEADER)
+        if key and key in self._load()["api_keys"]:
+            return f"key:{key}"
+        if RATE_LIMIT_CLIENT_HEADER:
+            forwarded = request.headers.get(RATE_LIMIT_CLIENT_HEADER)
+            if forwarded:
+                return f"ip:{forwarded.split(',')[-1].strip()}"
+        peer = request.client.host if request.client else None
+        if peer and _trusted(peer):
+            # Walk back through the trusted proxies to the address the first of them saw;
+            # hops further left were written by the client and could be anything
+            hops = [hop.strip() for hop in request.headers.get("X-Forwarded-For", "").split(",") if hop.strip()]
+            while hops and _trusted(hops[-1]):
+                hops.pop()
+            if hops:
+                return f"ip:{hops[-1]}"
+        return f"ip:{peer or 'unknown'}"
+
+    def _client_settings(self, client: str) -> dict:
+        settings = self._load()
+        if client.startswith("key:"):
+            return {**settings, **(settings["api_keys"].get(client[4:]) or {})}
+        return settings
+
+    def weight(self, client: str) -> float:
+        """Fair-queuing weight: a client with weight 2 gets twice the download slots of one with 1"""
+        return max(0.01, float(self._client_settings(client).get("weight") or 1))
+
+    def max_queued(self, client: str) -> int:
+        return int(self._client_settings(client).get("max_queued_per_client") or 0)
+
+    def take(self, scope: str, client: str) -> float:
+        """Spend one request of scope for client. Returns 0, or the seconds until it is allowed."""
+        limit = self._client_settings(client).get(scope)
+        if not limit:
+            return 0.0
+        rate, burst = float(limit.get("rate", 0)), float(limit.get("burst", 1))
+        with self._lock:
+            bucket = self._buckets.get((scope, client))
+            if bucket is None or (bucket.rate, bucket.burst) != (rate, max(1.0, burst)):
+                bucket = self._buckets[(scope, client)] = TokenBucket(rate, burst)
+            self._buckets.move_to_end((scope, client))
+            while len(self._buckets) > self._max_clients:
+                self._buckets.popitem(last=False)
+            return bucket.take()
+
+    # --- Upstream sites ---
+
+    def site_budget(self, site: str) -> dict:
+        """{"concurrency", "rate", "burst"} for downloads from an extractor/site"""
+        sites = self._load()["sites"]
+        budget = dict(DEFAULT_LIMITS["sites"]["default"])
+        budget.update(sites.get("default") or {})
+        budget.update(sites.get(site) or {})
+        return budget
+
+    def stats(self) -> dict:
+        with self._lock:
+            tracked = len(self._buckets)
+        settings = self._load()
+        return {
+            "tracked_clients": tracked,
+            "info": settings.get("info"),
+            "start_download": settings.get("start_download"),
+            "batch": settings.get("batch"),
+            "max_queued_per_client": settings.get("max_queued_per_client"),
+            "sites": settings.get("sites"),
+            "api_keys": len(settings.get("api_keys") or {}),
+        }
+
+
+rate_limits = RateLimits()
@@ -0,0 +1,237 @@
+"""
+Download scheduler
+Runs download jobs on a dedicated, bounded pool of worker threads instead of
+Starlette's shared threadpool, with a bounded priority queue for admission control.
+
+Within a priority, jobs are dispatched by weighted fair queuing (self-clocked:
+each client's jobs get virtual finish tags 1/weight apart), so a client with a
+long backlog does not starve the others. A job only starts while its upstream
+site is within its budget (concurrent downloads and a start rate, see
+rate_limits.py); jobs for other sites go ahead meanwhile.
+"""
+import os
+import math
+import time
+import itertools
+import threading
+import logging
+from typing import Callable, Dict, List, Optional
+
+from rate_limits import TokenBucket, rate_limits
+
+logger = logging.getLogger(__name__)
+
+# Number of downloads allowed to run at the same time
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "2"))
+# Number of jobs allowed to wait for a worker before new ones are rejected
+DOWNLOAD_QUEUE_SIZE = int(os.getenv("DOWNLOAD_QUEUE_SIZE", "50"))
+
+
+class QueueFull(Exception):
+    """Raised when the download queue has no room for another job"""
+
+
+class DownloadScheduler:
+    """Fixed pool of worker threads fed from a bounded priority queue.
+
+    Lower priority values run first; jobs with equal priority are shared fairly
+    between clients, and run in FIFO order for a single client.
+    """
+
+    def __init__(self, workers: int = DOWNLOAD_WORKERS, max_queue: int = DOWNLOAD_QUEUE_SIZE,
+                 site_budget: Callable[[str], dict] = None):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.site_budget = site_budget
+        self._queue: List[tuple] = []  # (priority, finish_tag, seq, job_id, fn, args, client, site)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = {}  # job_id -> site
+        self._stopping = False
+        # Fair queuing state: virtual time and the last finish tag per client
+        self._virtual_time = 0.0
+        self._client_finish: Dict[str, float] = {}
+        self._site_buckets: Dict[str, TokenBucket] = {}
+        # Site budgets, read outside the lock (site_budget may query the database)
+        self._budgets: Dict[str, dict] = {}
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"download-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        logger.info(f"Download scheduler started with {self.workers} workers, queue size {self.max_queue}")
+
+    def stop(self):
+        """Stop accepting work and let idle workers exit"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._threads = []
+
+    def submit(self, job_id: str, fn: Callable, *args, priority: int = 0, client: str = None,
+               site: str = None, weight: float = 1.0) -> int:
+        """Queue fn(*args) for execution. Returns the 1-based queue position.
+
+        client and weight drive fair queuing, site the upstream budget.
+        Raises QueueFull when the queue is at its maximum depth.
+        """
+        budget = self._read_budget(site)
+        with self._cond:
+            if budget is not None:
+                self._budgets[site] = budget
+            if len(self._queue) >= self.max_queue:
+                raise QueueFull(f"Download queue is full ({self.max_queue} jobs waiting)")
+            start = max(self._virtual_time, self._client_finish.get(client, 0.0))
+            finish = start + 1.0 / max(weight, 0.01)
+            self._client_finish[client] = finish
+            self._queue.append((priority, finish, next(self._seq), job_id, fn, args, client, site))
+            self._cond.notify_all()
+            return self._position_locked(job_id)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position of a waiting job, or None if it is not queued"""
+        with self._cond:
+            return self._position_locked(job_id)
+
+    def _position_locked(self, job_id: str) -> Optional[int]:
+        for i, entry in enumerate(sorted(self._queue, key=_order)):
+            if entry[3] == job_id:
+                return i + 1
+        return None
+
+    def queued_for(self, client: str) -> int:
+        """Jobs a client has waiting"""
+        with self._cond:
+            return sum(1 for entry in self._queue if entry[6] == client)
+
+    def cancel(self, job_id: str) -> bool:
+        """Remove a job that has not started yet. Returns True if it was queued."""
+        with self._cond:
+            for i, entry in enumerate(self._queue):
+                if entry[3] == job_id:
+                    self._queue.pop(i)
+                    return True
+            return False
+
+    def stats(self) -> dict:
+        with self._cond:
+            sites: Dict[str, dict] = {}
+            for site in self._running.values():
+                sites.setdefault(site, {"running": 0, "queued": 0})["running"] += 1
+            for entry in self._queue:
+                sites.setdefault(entry[7], {"running": 0, "queued": 0})["queued"] += 1
+            return {
+                "workers": self.workers,
+                "running": len(self._running),
+                "queued": len(self._queue),
+                "max_queue": self.max_queue,
+                "clients": len({entry[6] for entry in self._queue}),
+                "sites": {site or "unknown": counts for site, counts in sites.items()},
+            }
+
+    # --- Dispatch ---
+
+    def _next_locked(self):
+        """Pop the first job (by priority, then finish tag) whose site has budget.
+
+        Returns (entry, None), or (None, seconds to wait) when every queued job is held back.
+        """
+        now = time.monotonic()
+        wait = math.inf
+        budgets = {}
+        for entry in sorted(self._queue, key=_order):
+            site = entry[7]
+            if site is None or self.site_budget is None:
+                break
+            if site not in budgets:
+                budgets[site] = self._site_wait(site, now)
+            if budgets[site] == 0:
+                break
+            wait = min(wait, budgets[site])
+        else:
+            return None, (wait if self._queue else None)
+
+        self._queue.remove(entry)
+        bucket = self._site_buckets.get(entry[7]) if entry[7] is not None else None
+        if bucket is not None:
+            bucket.take(now)
+        self._virtual_time = max(self._virtual_time, entry[1])
+        # Clients whose tags are behind the virtual clock need no state
+        queued = {e[6] for e in self._queue}
+        for client in [c for c, f in self._client_finish.items() if f <= self._virtual_time and c not in queued]:
+            del self._client_finish[client]
+        return entry, None
+
+    def _read_budget(self, site: str) -> Optional[dict]:
+        if site is None or self.site_budget is None:
+            return None
+        try:
+            return self.site_budget(site)
+        except Exception as e:
+            logger.error(f"Site budget for {site} failed: {e}")
+            return None
+
+    def _refresh_budgets(self):
+        """Re-read the budgets of the queued sites, without holding the lock"""
+        if self.site_budget is None:
+            return
+        with self._cond:
+            sites = {entry[7] for entry in self._queue if entry[7] is not None}
+        budgets = {site: self._read_budget(site) for site in sites}
+        with self._cond:
+            self._budgets.update({site: budget for site, budget in budgets.items() if budget is not None})
+            for site in [s for s in self._budgets if s not in sites and s not in self._running.values()]:
+                del self._budgets[site]
+
+    def _site_wait(self, site: str, now: float) -> float:
+        """0 when a job for site may start now, else the seconds until it may (inf: when one finishes)"""
+        budget = self._budgets.get(site)
+        if budget is None:
+            return 0.0
+        concurrency = int(budget.get("concurrency") or 0)
+        if concurrency and sum(1 for s in self._running.values() if s == site) >= concurrency:
+            return math.inf
+        rate, burst = float(budget.get("rate") or 0), float(budget.get("burst") or 1)
+        if not rate:
+            return 0.0
+        bucket = self._site_buckets.get(site)
+        if bucket is None or (bucket.rate, bucket.burst) != (rate, max(1.0, burst)):
+            bucket = self._site_buckets[site] = TokenBucket(rate, burst)
+        return bucket.wait_time(now)
+
+    def _worker(self):
+        while True:
+            self._refresh_budgets()
+            with self._cond:
+                if self._stopping:
+                    return
+                entry, wait = self._next_locked()
+                if not entry:
+                    # Empty queue, or every queued site is at its budget
+                    self._cond.wait(None if wait is None or wait == math.inf else wait)
+                    continue
+                job_id, fn, args, site = entry[3], entry[4], entry[5], entry[7]
+                self._running[job_id] = site
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error(f"Scheduled job {job_id} crashed: {e}")
+            finally:
+                with self._cond:
+                    self._running.pop(job_id, None)
+                    # A site slot may have opened up
+                    self._cond.notify_all()
+
+
+def _order(entry: tuple):
+    return entry[0], entry[1], entry[2]
+
+
+scheduler = DownloadScheduler(site_budget=rate_limits.site_budget)
@@ -0,0 +1,70 @@
+"""
+Request coalescing
+Identical download jobs attach to a single producer job whose progress is
+fanned out to every subscriber (concurrent extractions are shared by info_fetcher).
+"""
+import threading
+from typing import Dict, Hashable, List, Optional
+
+
+class JobGroups:
+    """Tracks which download jobs are subscribed to which producer job"""
+
+    def __init__(self):
+        self._leader_by_key: Dict[Hashable, str] = {}
+        self._key_by_leader: Dict[str, Hashable] = {}
+        self._members: Dict[str, List[str]] = {}  # leader -> [leader, subscribers...]
+        self._leader_of: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def attach(self, key: Hashable, job_id: str) -> Optional[str]:
+        """Subscribe job_id to the producer for key.
+
+        Returns the producer's job id, or None when job_id became the producer.
+        """
+        with self._lock:
+            leader = self._leader_by_key.get(key)
+            if leader:
+                self._members[leader].append(job_id)
+                self._leader_of[job_id] = leader
+                return leader
+            self._leader_by_key[key] = job_id
+            self._key_by_leader[job_id] = key
+            self._members[job_id] = [job_id]
+            self._leader_of[job_id] = job_id
+            return None
+
+    def leader_of(self, job_id: str) -> str:
+        with self._lock:
+            return self._leader_of.get(job_id, job_id)
+
+    def is_producing(self, job_id: str) -> bool:
+        """True while job_id is a producer that has not finished"""
+        with self._lock:
+            return job_id in self._key_by_leader
+
+    def members(self, leader: str) -> List[str]:
+        with self._lock:
+            return list(self._members.get(leader, [leader]))
+
+    def detach(self, job_id: str) -> List[str]:
+        """Unsubscribe job_id and return the jobs still attached to its producer"""
+        with self._lock:
+            leader = self._leader_of.pop(job_id, None)
+            if leader is None:
+                return []
+            members = self._members.get(leader, [])
+            if job_id in members:
+                members.remove(job_id)
+            return list(members)
+
+    def finish(self, leader: str) -> List[str]:
+        """Close the group so no new jobs attach, and return its final members"""
+        with self._lock:
+            key = self._key_by_leader.pop(leader, None)
+            if key is not None:
+                self._leader_by_key.pop(key, None)
+            members = self._members.pop(leader, [leader])
+            for job_id in members:
+                self._leader_of.pop(job_id, None)
+            return members
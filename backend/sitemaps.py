@@ -0,0 +1,411 @@
+"""
+Sitemaps
+sitemap.xml is a sitemap index pointing at sitemap-pages.xml (the static pages)
+and sitemap-blogs-<n>.xml shards; blog n lands in shard id // SITEMAP_SHARD_SIZE,
+so a shard never exceeds the protocol's 50,000 URLs and a post changing only
+touches its own shard. sitemap.html lists every post for people.
+
+The documents are rendered once, kept gzip-compressed in memory and in
+SITEMAP_DIR (a restarted worker serves them without reading the blogs table),
+and re-rendered when a post is created, updated or deleted: the admin route
+passes the post's id, only that row is read, and only the documents it appears
+in change, for every origin they are kept for. Other workers notice through the
+"blogs" counter in cache_versions (bumped with the write by the admin routes)
+and reload the files, or rebuild from a projection of the published posts when
+the files are behind. lastmod is the post's updated_at; static pages carry none
+except /blogs, which changes with the newest post.
+"""
+import os
+import gzip
+import json
+import time
+import calendar
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import formatdate
+from html import escape
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from public_cache import PUBLIC_CACHE_CHECK_INTERVAL, read_version, client_has
+
+# Directory the rendered sitemaps are stored in
+SITEMAP_DIR = os.getenv("SITEMAP_DIR", "sitemaps")
+# Public origin used in sitemap URLs, e.g. https://example.com (default: the origin the request came to)
+SITEMAP_BASE_URL = os.getenv("SITEMAP_BASE_URL", "").rstrip("/")
+# Origins kept rendered in memory when SITEMAP_BASE_URL is not set (each Host gets its own URLs)
+SITEMAP_ORIGINS = int(os.getenv("SITEMAP_ORIGINS", "4"))
+# Blog ids per sitemap shard (50,000 is the protocol's limit)
+SITEMAP_SHARD_SIZE = min(50000, int(os.getenv("SITEMAP_SHARD_SIZE", "50000")))
+# Seconds crawlers and CDNs may reuse a sitemap without revalidating
+SITEMAP_MAX_AGE = int(os.getenv("SITEMAP_MAX_AGE", "3600"))
+VERSION_NAME = "blogs"
+STATE_FILE = "state.json"
+
+STATIC_PAGES = [
+    ("Home", "/"),
+    ("YouTube Downloader", "/youtube-downloader"),
+    ("Facebook Downloader", "/facebook-downloader"),
+    ("Instagram Downloader", "/instagram-downloader"),
+    ("TikTok Downloader", "/tiktok-downloader"),
+    ("Twitter Downloader", "/twitter-downloader"),
+    ("Twitch Downloader", "/twitch-downloader"),
+    ("Vimeo Downloader", "/vimeo-downloader"),
+    ("SoundCloud Downloader", "/soundcloud-downloader"),
+    ("Dailymotion Downloader", "/dailymotion-downloader"),
+    ("YouTube to MP3", "/youtube-to-mp3"),
+    ("Blogs", "/blogs"),
+    ("Contact", "/contact"),
+    ("Privacy Policy", "/privacy"),
+    ("Terms of Service", "/terms"),
+]
+
+HTML_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Sitemap - Anda-Downloader</title>
+    <style>
+        body {{ font-family: system-ui, -apple-system, sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; line-height: 1.6; color: #333; }}
+        h1 {{ border-bottom: 2px solid #eee; padding-bottom: 10px; }}
+        h2 {{ margin-top: 30px; color: #dc2626; }}
+        ul {{ list-style-type: none; padding: 0; }}
+        li {{ margin-bottom: 8px; }}
+        a {{ text-decoration: none; color: #2563eb; }}
+        a:hover {{ text-decoration: underline; }}
+        .date {{ color: #666; font-size: 0.9em; margin-left: 10px; }}
+    </style>
+</head>
+<body>
+    <h1>Sitemap</h1>
+
+    <h2>Pages</h2>
+    <ul>
+        {pages}
+    </ul>
+
+    <h2>Latest Blog Posts</h2>
+    <ul>
+        {posts}
+    </ul>
+
+    <p style="margin-top: 50px; text-align: center; color: #888; font-size: 0.9em;">
+        &copy; {year} Anda-Downloader. All rights reserved.
+    </p>
+</body>
+</html>
+"""
+
+
+class Document(NamedTuple):
+    gz: bytes
+    media_type: str
+    etag: str
+    last_modified: float  # unix time the content last changed
+
+
+# Published post: [slug, title, lastmod (unix time), published_at (unix time or None)]
+Entry = list
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    # The models store naive UTC datetimes
+    return calendar.timegm(value.utctimetuple()) if value else None
+
+
+def _utc(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+
+def _w3c(ts: float) -> str:
+    return _utc(ts).strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+def _entry(row) -> Entry:
+    lastmod = row.updated_at or row.published_at or row.created_at
+    return [row.slug, row.title, _timestamp(lastmod) or time.time(), _timestamp(row.published_at)]
+
+
+def shard_of(blog_id: int) -> str:
+    return f"blogs-{blog_id // SITEMAP_SHARD_SIZE}"
+
+
+def _blog_rows(db, *criteria):
+    from models import Blog
+    # Only what the sitemaps show, never the post bodies
+    return db.query(Blog.id, Blog.slug, Blog.title, Blog.status, Blog.updated_at,
+                    Blog.published_at, Blog.created_at).filter(*criteria)
+
+
+class Sitemaps:
+    """Rendered sitemap documents per origin, kept in memory and on disk, updated per changed post"""
+
+    def __init__(self, directory: str = SITEMAP_DIR, session_factory=None,
+                 check_interval: float = PUBLIC_CACHE_CHECK_INTERVAL, origins: int = SITEMAP_ORIGINS):
+        self.directory = directory
+        self._session_factory = session_factory
+        self.check_interval = check_interval
+        self.origins = max(1, origins)
+        self._entries: Optional[Dict[int, Entry]] = None
+        # base_url -> name -> document, least recently requested origin first
+        self._docs: "OrderedDict[str, Dict[str, Document]]" = OrderedDict()
+        # Origin whose documents are stored on disk and never evicted
+        self._primary: Optional[str] = SITEMAP_BASE_URL or None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.counters = {"rebuilds": 0, "disk_loads": 0, "updates": 0, "renders": 0, "origin_evictions": 0}
+
+    def _session(self):
+        if self._session_factory is None:
+            from database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    # --- Serving ---
+
+    def get(self, name: str, base_url: str) -> Optional[Document]:
+        """"index", "pages", "blogs-<n>" or "html"; None for a shard that does not exist"""
+        base_url = SITEMAP_BASE_URL or base_url.rstrip("/")
+        docs = self._docs.get(base_url)
+        if docs is None or self._entries is None or time.monotonic() - self._checked_at >= self.check_interval:
+            with self._lock:
+                docs = self._sync(base_url)
+        else:
+            try:
+                self._docs.move_to_end(base_url)
+            except KeyError:
+                pass  # evicted meanwhile, still a valid set of documents
+        return docs.get(name)
+
+    def _sync(self, base_url: str) -> Dict[str, Document]:
+        now = time.monotonic()
+        if self._entries is None or now - self._checked_at >= self.check_interval:
+            db = self._session()
+            try:
+                version = read_version(db, VERSION_NAME)
+                if self._entries is None or version != self._version:
+                    if not self._load(version):
+                        self._rebuild(db, version)
+            finally:
+                db.close()
+            self._checked_at = now
+        docs = self._docs.get(base_url)
+        if docs is None:
+            return self._add_origin(base_url)
+        self._docs.move_to_end(base_url)
+        return docs
+
+    def _add_origin(self, base_url: str) -> Dict[str, Document]:
+        """Render every document for an origin seen for the first time since the posts changed"""
+        if self._primary is None:
+            self._primary = base_url
+        self._docs[base_url] = {}
+        self._render(base_url, {None}, changed_at=max((e[2] for e in self._entries.values()), default=None))
+        while len(self._docs) > self.origins:
+            # The Host header is the client's, so only a few origins are kept
+            oldest = next(o for o in self._docs if o != self._primary)
+            del self._docs[oldest]
+            self.counters["origin_evictions"] += 1
+        if base_url == self._primary:
+            self._save()
+        return self._docs[base_url]
+
+    def _rebuild(self, db, version: int):
+        from models import Blog
+        self._entries = {row.id: _entry(row) for row in _blog_rows(db, Blog.status == "published")}
+        self._version = version
+        self._docs = OrderedDict()
+        if self._primary is not None:
+            self._add_origin(self._primary)
+        else:
+            self._save()
+        self.counters["rebuilds"] += 1
+
+    # --- Changes ---
+
+    def blog_changed(self, db, blog_id: int):
+        """Update the sitemaps after a post was created, updated or deleted (and the "blogs"
+        version bumped with it, see admin_routes)"""
+        try:
+            from models import Blog
+            with self._lock:
+                row = _blog_rows(db, Blog.id == blog_id).first()
+                previous = self._version
+                version = read_version(db, VERSION_NAME)
+                if self._entries is None:
+                    return  # nothing built yet, the next request reads the table
+                if previous is None or version != previous + 1:
+                    # Another worker changed posts since this one last looked
+                    self._rebuild(db, version)
+                    return
+                before = self._entries.pop(blog_id, None)
+                if row and row.status == "published":
+                    self._entries[blog_id] = _entry(row)
+                self._version = version
+                self.counters["updates"] += 1
+                if before != self._entries.get(blog_id):
+                    for base_url in self._docs:
+                        self._render(base_url, {shard_of(blog_id)})
+                self._save()
+        except Exception as e:
+            print(f"Sitemap update failed for blog {blog_id}: {e}")
+            self._entries = None
+
+    # --- Rendering ---
+
+    def _render(self, base_url: str, shards: set, changed_at: float = None):
+        """Render an origin's given blog shards (None = all), then the documents that summarize them"""
+        docs = self._docs[base_url]
+        by_shard: Dict[str, list] = {}
+        for blog_id, entry in self._entries.items():
+            by_shard.setdefault(shard_of(blog_id), []).append((blog_id, entry))
+        if None in shards:
+            shards = set(by_shard) | {n for n in docs if n.startswith("blogs-")}
+        changed_at = changed_at or time.time()
+        newest = max((e[2] for e in self._entries.values()), default=None)
+
+        for name in shards:
+            entries = sorted(by_shard.get(name) or [])
+            if not entries:
+                docs.pop(name, None)
+                continue
+            urls = "".join(
+                f"<url><loc>{escape(base_url)}/blogs/{escape(e[0])}</loc><lastmod>{_w3c(e[2])}</lastmod>"
+                f"<changefreq>weekly</changefreq><priority>0.6</priority></url>\n" for _, e in entries)
+            _put(docs, name, _urlset(urls), "application/xml", changed_at)
+
+        urls = ""
+        for _, path in STATIC_PAGES:
+            lastmod = f"<lastmod>{_w3c(newest)}</lastmod>" if path == "/blogs" and newest else ""
+            urls += (f"<url><loc>{escape(base_url)}{path if path != '/' else ''}</loc>{lastmod}"
+                     f"<changefreq>daily</changefreq><priority>0.8</priority></url>\n")
+        _put(docs, "pages", _urlset(urls), "application/xml", changed_at)
+
+        index = ""
+        for name in ["pages"] + sorted((n for n in docs if n.startswith("blogs-")), key=lambda n: int(n[6:])):
+            lastmod = max((e[2] for _, e in by_shard.get(name) or []), default=newest)
+            index += (f"<sitemap><loc>{escape(base_url)}/sitemap-{name}.xml</loc>"
+                      + (f"<lastmod>{_w3c(lastmod)}</lastmod>" if lastmod else "") + "</sitemap>\n")
+        _put(docs, "index", '<?xml version="1.0" encoding="UTF-8"?>\n'
+                            '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+                            f"{index}</sitemapindex>\n", "application/xml", changed_at)
+
+        posts = sorted(self._entries.values(), key=lambda e: e[3] or 0, reverse=True)
+        _put(docs, "html", HTML_PAGE.format(
+            pages="\n        ".join(f'<li><a href="{escape(base_url)}{path}">{name}</a></li>' for name, path in STATIC_PAGES),
+            posts="\n        ".join(
+                f'<li><a href="{escape(base_url)}/blogs/{escape(e[0])}">{escape(e[1] or "")}</a> '
+                f'<span class="date">{_utc(e[3]).strftime("%b %d, %Y") if e[3] else ""}</span></li>'
+                for e in posts),
+            year=_utc(time.time()).year,
+        ), "text/html; charset=utf-8", changed_at)
+        self.counters["renders"] += 1
+
+    # --- Disk ---
+
+    def _save(self):
+        docs = self._docs.get(self._primary) or {}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for name, doc in docs.items():
+                _write(os.path.join(self.directory, _filename(name)), doc.gz)
+            current = {_filename(name) for name in docs}
+            for filename in os.listdir(self.directory):
+                # Shards whose posts are all gone
+                if filename.startswith("sitemap-blogs-") and filename.endswith(".xml.gz") and filename not in current:
+                    os.remove(os.path.join(self.directory, filename))
+            state = {
+                "version": self._version,
+                "base_url": self._primary if docs else None,
+                "entries": {str(k): v for k, v in self._entries.items()},
+                "docs": {n: [d.media_type, d.etag, d.last_modified] for n, d in docs.items()},
+            }
+            _write(os.path.join(self.directory, STATE_FILE), json.dumps(state).encode())
+        except OSError as e:
+            print(f"Could not store sitemaps in {self.directory}: {e}")
+
+    def _load(self, version: int) -> bool:
+        """Take the stored sitemaps if they are at version (written by this or another worker)"""
+        try:
+            with open(os.path.join(self.directory, STATE_FILE), "rb") as f:
+                state = json.loads(f.read())
+            if state.get("version") != version:
+                return False
+            base_url, docs = state.get("base_url"), {}
+            if base_url and base_url == (SITEMAP_BASE_URL or base_url):
+                for name, (media_type, etag, last_modified) in state["docs"].items():
+                    with open(os.path.join(self.directory, _filename(name)), "rb") as f:
+                        gz = f.read()
+                    # A concurrent writer may have replaced the file since the state was written
+                    if '"%s"' % hashlib.sha1(gzip.decompress(gz)).hexdigest()[:20] != etag:
+                        return False
+                    docs[name] = Document(gz, media_type, etag, last_modified)
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        self._entries = {int(k): v for k, v in state["entries"].items()}
+        self._version = version
+        self._docs = OrderedDict()
+        if docs:
+            self._primary = base_url
+            self._docs[base_url] = docs
+        self.counters["disk_loads"] += 1
+        return True
+
+    def stats(self) -> dict:
+        return {"version": self._version, "posts": len(self._entries or {}), "origins": len(self._docs),
+                "documents": sum(len(docs) for docs in self._docs.values()), **self.counters}
+
+
+def _put(docs: Dict[str, Document], name: str, content: str, media_type: str, changed_at: float):
+    raw = content.encode()
+    etag = '"%s"' % hashlib.sha1(raw).hexdigest()[:20]
+    old = docs.get(name)
+    if old and old.etag == etag:
+        return
+    # mtime=0 keeps the compressed bytes a function of the content alone
+    docs[name] = Document(gzip.compress(raw, 6, mtime=0), media_type, etag, changed_at)
+
+
+def _urlset(urls: str) -> str:
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+            f"{urls}</urlset>\n")
+
+
+def _filename(name: str) -> str:
+    if name == "index":
+        return "sitemap.xml.gz"
+    if name == "html":
+        return "sitemap.html.gz"
+    return f"sitemap-{name}.xml.gz"
+
+
+def _write(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def sitemap_response(request: Request, doc: Document, max_age: int = SITEMAP_MAX_AGE) -> Response:
+    """doc gzip-encoded when the client accepts it, or a 304 when the client's copy is current"""
+    headers = {
+        "ETag": doc.etag,
+        "Last-Modified": formatdate(doc.last_modified, usegmt=True),
+        "Cache-Control": f"public, max-age={max_age}",
+        "Vary": "Accept-Encoding",
+    }
+    if client_has(request, doc.etag, doc.last_modified):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(content=doc.gz, media_type=doc.media_type, headers={**headers, "Content-Encoding": "gzip"})
+    return Response(content=gzip.decompress(doc.gz), media_type=doc.media_type, headers=headers)
+
+
+sitemaps = Sitemaps()
@@ -0,0 +1,133 @@
+"""
+Stream-through downloads
+Sends a progressive single-file download to the client while yt-dlp is still
+writing it, by tailing the growing partial file with bounded memory.
+"""
+import os
+import asyncio
+import mimetypes
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+# Bytes read from disk per chunk sent to the client
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", str(256 * 1024)))
+# Seconds between checks for new data while the writer is behind the reader
+STREAM_POLL_INTERVAL = 0.25
+# Seconds to wait for yt-dlp to create the output file before giving up
+STREAM_START_TIMEOUT = int(os.getenv("STREAM_START_TIMEOUT", "120"))
+
+# Output containers, so the type does not depend on the system's mime.types
+MEDIA_TYPES = {
+    '.mp4': 'video/mp4',
+    '.m4v': 'video/mp4',
+    '.webm': 'video/webm',
+    '.mkv': 'video/x-matroska',
+    '.mov': 'video/quicktime',
+    '.m4a': 'audio/mp4',
+    '.mp3': 'audio/mpeg',
+    '.opus': 'audio/ogg',
+    '.ogg': 'audio/ogg',
+    '.flac': 'audio/flac',
+    '.wav': 'audio/wav',
+}
+
+
+# Protocols whose .part file already is the final container, byte for byte
+PROGRESSIVE_PROTOCOLS = ('http', 'https')
+
+
+def is_streamable(format_id: str, clip: tuple = None, info: dict = None) -> bool:
+    """Only single progressive formats, with nothing to fix up afterwards, are written as they are served.
+
+    HLS/DASH formats (m3u8, http_dash_segments, ...) write MPEG-TS or fragments
+    that a fixup or remux rewrites later, and DASH containers (m4a_dash, ...)
+    get their headers fixed, so their .part file is not the final file. The
+    selector's first choice (format_plan adds "/..." fallbacks) is looked up in
+    the cached info; one that cannot be found is not streamed.
+    """
+    first = (format_id or '').split('/')[0]
+    if clip or not first or '+' in first or not info:
+        return False
+    fmt = next((f for f in info.get('formats') or [] if f.get('format_id') == first), None)
+    if fmt is None:
+        return False
+    return (fmt.get('protocol') in PROGRESSIVE_PROTOCOLS
+            and not (fmt.get('container') or '').endswith('_dash'))
+
+
+def media_type_for(path: str) -> str:
+    """Media type of the final file, ignoring yt-dlp's .part suffix"""
+    if path.endswith('.part'):
+        path = path[:-len('.part')]
+    ext = os.path.splitext(path)[1].lower()
+    return MEDIA_TYPES.get(ext) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def final_extension(path: str) -> str:
+    if path.endswith('.part'):
+        path = path[:-len('.part')]
+    return os.path.splitext(path)[1]
+
+
+async def wait_for_source(get_job: Callable[[], Awaitable[Optional[dict]]],
+                          timeout: float = STREAM_START_TIMEOUT) -> Optional[str]:
+    """Wait until the job has a file to read from (partial or finished)"""
+    waited = 0.0
+    while waited < timeout:
+        job = await get_job()
+        if job is None or job['status'] == 'error':
+            return None
+        if job['status'] == 'completed':
+            return job['filename']
+        if job.get('_partial') and os.path.exists(job['_partial']):
+            return job['_partial']
+        await asyncio.sleep(STREAM_POLL_INTERVAL)
+        waited += STREAM_POLL_INTERVAL
+    return None
+
+
+async def tail_file(path: str, get_job: Callable[[], Awaitable[Optional[dict]]],
+                    on_complete: Callable = None) -> AsyncIterator[bytes]:
+    """Yield the contents of path as it grows, until the job finishes.
+
+    The file is opened once; on POSIX the open descriptor keeps working after
+    yt-dlp renames the .part file or it is moved into the file cache.
+    get_job is awaited and on_complete runs in a thread, so a shared job store
+    never blocks the event loop.
+    """
+    f = None
+    try:
+        while f is None:
+            try:
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                # Renamed before we opened it: continue from the finished file
+                job = await get_job()
+                if job is None or job['status'] == 'error':
+                    return
+                if job['status'] == 'completed':
+                    path = job['filename']
+                else:
+                    await asyncio.sleep(STREAM_POLL_INTERVAL)
+
+        while True:
+            chunk = await asyncio.to_thread(f.read, STREAM_CHUNK_SIZE)
+            if chunk:
+                yield chunk
+                continue
+            job = await get_job()
+            if job is None or job['status'] == 'error':
+                return
+            if job['status'] == 'completed':
+                # Drain anything written between the last read and completion
+                while True:
+                    chunk = await asyncio.to_thread(f.read, STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+                if on_complete:
+                    await asyncio.to_thread(on_complete)
+                return
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+    finally:
+        if f:
+            f.close()
@@ -1,4 +1,3 @@
-import os
 import glob
 import shutil
 import logging
@@ -7,9 +6,12 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def cleanup_cache():
+def cleanup_cache(clear_downloads: bool = False):
     """
-    Clear server cache (temporary files, downloads, pycache).
+    Clear server cache (downloads, pycache).
+    Finished downloads are trimmed to the file cache budget, or removed
+    entirely (except files in use) when clear_downloads is True. Job work
+    directories are reaped by the lifecycle sweep.
     Returns the count of removed items.
     """
     count = 0
@@ -18,28 +20,16 @@ def cleanup_cache():
     logger.info("Starting cache cleanup...")
     
     try:
-        # 1. Clear temp files in root (temp_*)
-        for f in glob.glob("temp_*"):
-            try:
-                os.remove(f)
-                count += 1
-            except Exception as e:
-                logger.error(f"Error removing {f}: {e}")
-                errors += 1
-            
-        # 2. Clear downloads folder content
-        for f in glob.glob("downloads/*"):
-            try:
-                if os.path.isfile(f):
-                    os.remove(f)
-                elif os.path.isdir(f):
-                    shutil.rmtree(f)
-                count += 1
-            except Exception as e:
-                logger.error(f"Error removing {f}: {e}")
-                errors += 1
+        # 1. Finished downloads: budget-aware eviction instead of a blanket wipe
+        from file_cache import file_cache
+        if clear_downloads:
+            count += file_cache.clear()
+        else:
+            before = file_cache.stats()["files"]
+            file_cache.sweep()
+            count += before - file_cache.stats()["files"]
             
-        # 3. Clear __pycache__ directories recursively
+        # 2. Clear __pycache__ directories recursively
         for f in glob.glob("**/__pycache__", recursive=True):
             try:
                 shutil.rmtree(f)
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules are imported flat, as uvicorn runs them from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Sessions on a scratch SQLite database with every table created"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    import models  # registers the tables on Base.metadata
+    from database import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from blog_listing import PublishedCount, decode_cursor, encode_cursor, list_published
+from public_cache import bump_version
+
+
+@pytest.fixture
+def db(session_factory):
+    from models import Blog
+    session = session_factory()
+    now = datetime(2026, 1, 1)
+    for i in range(25):
+        session.add(Blog(
+            title=f"Post {i}", slug=f"post-{i}", content="x", status="draft" if i % 5 == 0 else "published",
+            # Pairs of posts share a timestamp, so ids break the ties
+            published_at=now - timedelta(minutes=i // 2),
+        ))
+    session.commit()
+    yield session
+    session.close()
+
+
+def published_ids(db):
+    from models import Blog
+    rows = db.query(Blog.id).filter(Blog.status == "published") \
+        .order_by(Blog.published_at.desc(), Blog.id.desc())
+    return [row.id for row in rows]
+
+
+def test_cursor_round_trip():
+    published_at = datetime(2026, 1, 1, 12, 30, 15, 250)
+    assert decode_cursor(encode_cursor(published_at, 42)) == (published_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", encode_cursor(datetime(2026, 1, 1), 1)[:-3]])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor or "e30")
+
+
+def test_pages_cover_every_published_post_once(db):
+    seen, cursor = [], None
+    while True:
+        page = list_published(db, cursor, limit=3)
+        assert len(page["items"]) <= 3
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == published_ids(db)
+
+
+def test_last_full_page_has_no_next_cursor(db):
+    count = len(published_ids(db))
+    page = list_published(db, limit=count)
+    assert len(page["items"]) == count
+    assert page["next_cursor"] is None
+
+
+def test_listing_leaves_out_post_bodies(db):
+    item = list_published(db, limit=1)["items"][0]
+    assert "content" not in item and "content_html" not in item
+
+
+def test_published_count_follows_the_blogs_version(db, session_factory):
+    from models import Blog
+    count = PublishedCount(check_interval=0)
+    assert count.get(db) == 20
+
+    db.query(Blog).filter(Blog.slug == "post-0").update({Blog.status: "published"})
+    db.commit()
+    # Counted again only once the write bumped the version
+    assert count.get(db) == 20
+    bump_version(db, "blogs")
+    assert count.get(db) == 21
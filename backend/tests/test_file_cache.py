@@ -0,0 +1,137 @@
+import os
+import time
+
+import pytest
+
+from file_cache import FileCache, make_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return FileCache(directory=str(tmp_path / "cache"), max_bytes=10, max_age=3600)
+
+
+def finished(tmp_path, name, size=4):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_store_moves_file_into_cache(cache, tmp_path):
+    key = make_key("Youtube:abc", "22")
+    path = cache.store(key, finished(tmp_path, "media.mp4"))
+    assert path == os.path.join(cache.directory, f"{key}.mp4")
+    assert os.path.isfile(path)
+    assert not os.path.exists(tmp_path / "media.mp4")
+    assert cache.lookup(key) == path
+    assert cache.lookup(make_key("Youtube:abc", "18")) is None
+
+
+def test_make_key_depends_on_format_and_clip():
+    assert make_key("Youtube:abc", "22") == make_key("Youtube:abc", " 22 ")
+    assert make_key("Youtube:abc", "22") != make_key("Youtube:abc", "18")
+    assert make_key("Youtube:abc", "22") != make_key("Youtube:abc", "22", (0, 10, "fast"))
+
+
+def test_lru_evicts_least_recently_used(cache, tmp_path):
+    a = cache.store("a" * 64, finished(tmp_path, "a.mp4"))
+    b = cache.store("b" * 64, finished(tmp_path, "b.mp4"))
+    cache.lookup("a" * 64)
+    c = cache.store("c" * 64, finished(tmp_path, "c.mp4"))
+    assert os.path.exists(a) and os.path.exists(c)
+    assert not os.path.exists(b)
+    assert cache.total_bytes() <= cache.max_bytes
+
+
+def test_lfu_evicts_least_frequently_used(tmp_path):
+    cache = FileCache(directory=str(tmp_path / "cache"), max_bytes=10, policy="lfu")
+    a = cache.store("a" * 64, finished(tmp_path, "a.mp4"))
+    b = cache.store("b" * 64, finished(tmp_path, "b.mp4"))
+    for _ in range(3):
+        cache.lookup("b" * 64)
+    cache.lookup("a" * 64)
+    assert cache.evict(target_bytes=4) == 4
+    assert os.path.exists(b)
+    assert not os.path.exists(a)
+
+
+def test_store_pins_new_file_before_evicting(tmp_path):
+    cache = FileCache(directory=str(tmp_path / "cache"), max_bytes=1)
+    path = cache.store("a" * 64, finished(tmp_path, "a.mp4"), job_id="job-1")
+    assert os.path.exists(path)
+    assert cache.pinned_jobs() == ["job-1"]
+
+    cache.unpin("job-1")
+    assert cache.evict() == 4
+    assert not os.path.exists(path)
+
+
+def test_referenced_files_are_never_evicted(cache, tmp_path):
+    path = cache.store("a" * 64, finished(tmp_path, "a.mp4"))
+    cache.acquire(path)
+    cache.max_age = -1
+    assert cache.evict(target_bytes=0) == 0
+    assert cache.sweep() == 0
+    assert cache.clear() == 0
+    assert os.path.exists(path)
+
+    cache.release(path)
+    assert cache.evict(target_bytes=0) == 4
+    assert not os.path.exists(path)
+
+
+def test_pin_is_taken_once_per_job(cache, tmp_path):
+    path = cache.store("a" * 64, finished(tmp_path, "a.mp4"))
+    cache.pin("job-1", path)
+    cache.pin("job-1", path)
+    cache.unpin("job-1")
+    assert cache.evict(target_bytes=0) == 4
+
+
+def test_restore_under_other_extension_removes_old_file(cache, tmp_path):
+    old = cache.store("a" * 64, finished(tmp_path, "a.webm"))
+    new = cache.store("a" * 64, finished(tmp_path, "a.mp4"))
+    assert not os.path.exists(old)
+    assert cache.lookup("a" * 64) == new
+    assert cache.stats()["files"] == 1
+
+
+def test_sweep_removes_files_past_max_age(cache, tmp_path):
+    path = cache.store("a" * 64, finished(tmp_path, "a.mp4"))
+    cache.max_age = -1
+    assert cache.sweep() == 4
+    assert not os.path.exists(path)
+
+
+def test_load_indexes_files_and_drops_leftovers(cache, tmp_path):
+    path = cache.store("a" * 64, finished(tmp_path, "a.mp4"))
+    leftover = os.path.join(cache.directory, f"{'b' * 64}.mp4.part")
+    writing = os.path.join(cache.directory, f"{'c' * 64}.mp4.tmp")
+    open(leftover, "wb").close()
+    open(writing, "wb").close()
+    old = time.time() - cache.lease - 1
+    os.utime(leftover, (old, old))
+
+    reloaded = FileCache(directory=cache.directory, max_bytes=10)
+    reloaded.load()
+    assert reloaded.lookup("a" * 64) == path
+    assert not os.path.exists(leftover)
+    # Another worker may still be moving this one into place
+    assert os.path.exists(writing)
+
+
+def test_files_held_by_another_worker_are_kept(cache, tmp_path):
+    path = cache.store("a" * 64, finished(tmp_path, "a.mp4"))
+    other = FileCache(directory=cache.directory, max_bytes=10, max_age=-1)
+    other.load()
+    cache.acquire(path)
+    assert other.evict(target_bytes=0) == 0
+    assert other.sweep() == 0
+    assert other.clear() == 0
+    assert os.path.exists(path)
+
+    # Once the hold lapses, the other worker may remove it
+    cache.release(path)
+    old = time.time() - cache.lease - 1
+    os.utime(path, (old, old))
+    assert other.evict(target_bytes=0) == 4
@@ -0,0 +1,99 @@
+import os
+import time
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import file_serving
+from file_serving import ResumableFileResponse, grace_expired, not_modified, offload_response
+
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def served(tmp_path):
+    """A client for an app serving one file like /serve_file, and the finished responses"""
+    path = tmp_path / "media.mp4"
+    path.write_bytes(CONTENT)
+    done = []
+    app = FastAPI()
+
+    @app.get("/file")
+    def serve(request: Request):
+        # stat_result as serve_file passes it, so the ETag is known before sending
+        response = ResumableFileResponse(str(path), media_type="video/mp4", filename="video.mp4",
+                                         stat_result=os.stat(path), on_done=lambda r, seconds: done.append(r))
+        return not_modified(request, response) or response
+
+    return TestClient(app), done
+
+
+def test_full_response_advertises_ranges(served):
+    client, done = served
+    response = client.get("/file")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"]
+    assert done[-1].sent_status == 200 and done[-1].complete and done[-1].bytes_sent == len(CONTENT)
+
+
+def test_range_request_resumes_mid_file(served):
+    client, done = served
+    response = client.get("/file", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert done[-1].sent_status == 206 and done[-1].bytes_sent == 100
+
+    response = client.get("/file", headers={"Range": "bytes=1000-"})
+    assert response.content == CONTENT[1000:]
+
+
+def test_if_range_only_resumes_the_same_file(served):
+    client, _ = served
+    etag = client.get("/file").headers["etag"]
+    assert client.get("/file", headers={"Range": "bytes=0-9", "If-Range": etag}).status_code == 206
+    # The file changed since the client's copy: send all of it again
+    response = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_unsatisfiable_range(served):
+    client, _ = served
+    assert client.get("/file", headers={"Range": f"bytes={len(CONTENT)}-"}).status_code == 416
+
+
+def test_matching_etag_gets_304(served):
+    client, done = served
+    etag = client.get("/file").headers["etag"]
+    sent = len(done)
+    response = client.get("/file", headers={"If-None-Match": f'W/{etag}, "other"'})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert len(done) == sent  # nothing was transferred
+    assert client.get("/file", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_offload_headers(tmp_path, monkeypatch):
+    path = tmp_path / "cache" / "a b.mp4"
+    monkeypatch.setattr(file_serving, "SERVE_OFFLOAD", "x-accel")
+    response = offload_response(str(path), "video.mp4", "video/mp4", str(tmp_path / "cache"))
+    assert response.headers["x-accel-redirect"] == "/protected-downloads/a%20b.mp4"
+    assert response.body == b""
+
+    monkeypatch.setattr(file_serving, "SERVE_OFFLOAD", "x-sendfile")
+    assert offload_response(str(path), "video.mp4", "video/mp4", "/")\
+        .headers["x-sendfile"] == str(path)
+
+    monkeypatch.setattr(file_serving, "SERVE_OFFLOAD", "")
+    assert offload_response(str(path), "video.mp4", "video/mp4", "/") is None
+
+
+def test_grace_window_after_last_transfer():
+    now = time.time()
+    assert not grace_expired({})
+    assert not grace_expired({"_last_served": now - 10}, now)
+    assert grace_expired({"_last_served": now - file_serving.SERVE_GRACE_SECONDS - 1}, now)
@@ -0,0 +1,20 @@
+from format_plan import copy_container, postprocessing
+
+
+def test_default_merge_copies_into_a_fitting_container():
+    assert postprocessing() == {"merge_output_format": "mp4/webm/mkv"}
+    assert copy_container({"vcodec": "avc1.640028"}, {"acodec": "mp4a.40.2"}) == "mp4"
+    assert copy_container({"vcodec": "vp09.00.40.08"}, {"acodec": "opus"}) == "webm"
+    assert copy_container({"vcodec": "avc1.640028"}, {"acodec": "opus"}) is None
+
+
+def test_video_target_is_preferred_but_not_forced_on_the_merge():
+    # H.264/AAC cannot be copied into webm: merged into mp4 first, then converted
+    opts = postprocessing("webm")
+    assert opts["merge_output_format"] == "webm/mp4/mkv"
+    assert opts["postprocessors"] == [{"key": "FFmpegVideoConvertor", "preferedformat": "webm"}]
+    assert postprocessing("mkv")["merge_output_format"].startswith("mkv/")
+
+
+def test_audio_target_extracts_audio():
+    assert postprocessing("mp3")["postprocessors"][0]["key"] == "FFmpegExtractAudio"
@@ -0,0 +1,59 @@
+import pytest
+
+import job_store
+from job_store import MemoryJobStore, RedisJobStore, SQLJobStore
+
+
+@pytest.fixture(params=["memory", "sql", "redis"])
+def store(request, session_factory):
+    if request.param == "sql":
+        return SQLJobStore(session_factory)
+    if request.param == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")  # fakeredis runs Lua scripts through it
+        return RedisJobStore(fakeredis.FakeRedis())
+    return MemoryJobStore()
+
+
+def test_create_get_and_delete(store):
+    store.create("job-1", {"status": "queued", "progress": 0, "_created": 1.5})
+    assert store.get("job-1") == {"status": "queued", "progress": 0, "_created": 1.5}
+    assert store.job_ids() == ["job-1"]
+
+    store.delete("job-1")
+    assert store.get("job-1") is None
+    assert store.job_ids() == []
+
+
+def test_update_merges_fields(store):
+    store.create("job-1", {"status": "queued", "progress": 0})
+    assert store.update("job-1", status="downloading", progress=42.5) == \
+        {"status": "downloading", "progress": 42.5}
+    assert store.update("job-1", filename="/cache/a.mp4")["progress"] == 42.5
+    assert store.get("job-1") == {"status": "downloading", "progress": 42.5, "filename": "/cache/a.mp4"}
+
+
+def test_update_of_missing_job_does_not_create_it(store):
+    assert store.update("missing", status="completed") is None
+    assert store.get("missing") is None
+
+    store.create("job-1", {"status": "downloading"})
+    store.delete("job-1")
+    assert store.update("job-1", progress=10) is None
+    assert store.get("job-1") is None
+
+
+def test_finished_jobs_expire(store, monkeypatch):
+    store.create("running", {"status": "downloading"})
+    store.create("done", {"status": "downloading"})
+    monkeypatch.setattr(job_store, "JOB_TTL", -1)
+    store.update("done", status="completed")
+    store.purge_expired()
+    assert store.get("done") is None
+    assert store.get("running") == {"status": "downloading"}
+
+
+def test_created_finished_job_expires(store, monkeypatch):
+    monkeypatch.setattr(job_store, "JOB_TTL", -1)
+    store.create("job-1", {"status": "error", "error": "boom"})
+    assert store.get("job-1") is None
@@ -0,0 +1,26 @@
+from types import SimpleNamespace
+
+import pytest
+
+from rate_limits import RateLimits
+
+
+def request(peer, forwarded=None):
+    headers = {"X-Forwarded-For": forwarded} if forwarded else {}
+    return SimpleNamespace(headers=headers, client=SimpleNamespace(host=peer))
+
+
+@pytest.fixture
+def limits(session_factory):
+    return RateLimits(session_factory)
+
+
+def test_forwarded_client_behind_a_trusted_proxy(limits):
+    assert limits.client_id(request("100.64.0.7", "203.0.113.5")) == "ip:203.0.113.5"
+    # A chain of trusted proxies is skipped, a client-supplied hop further left is not used
+    assert limits.client_id(request("10.0.0.2", "1.1.1.1, 203.0.113.5, 10.0.0.9")) == "ip:203.0.113.5"
+
+
+def test_forwarded_header_from_untrusted_peers_is_ignored(limits):
+    assert limits.client_id(request("198.51.100.4", "203.0.113.5")) == "ip:198.51.100.4"
+    assert limits.client_id(request("10.0.0.2")) == "ip:10.0.0.2"
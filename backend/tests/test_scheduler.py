@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from scheduler import DownloadScheduler, QueueFull
+
+
+class Recorder:
+    """Job function recording the order jobs ran in"""
+
+    def __init__(self):
+        self.order = []
+        self._done = threading.Semaphore(0)
+
+    def __call__(self, name, gate=None):
+        if gate is not None:
+            gate.wait(timeout=5)
+        self.order.append(name)
+        self._done.release()
+
+    def wait(self, count):
+        return all(self._done.acquire(timeout=5) for _ in range(count))
+
+
+def run(scheduler, recorder, count):
+    scheduler.start()
+    try:
+        assert recorder.wait(count)
+    finally:
+        scheduler.stop()
+    return recorder.order
+
+
+def test_clients_share_a_priority_fairly():
+    scheduler, job = DownloadScheduler(workers=1, max_queue=10), Recorder()
+    for i in range(3):
+        scheduler.submit(f"a{i}", job, f"a{i}", client="a")
+    scheduler.submit("b0", job, "b0", client="b")
+    # b's job goes ahead of a's backlog
+    assert run(scheduler, job, 4) == ["a0", "b0", "a1", "a2"]
+
+
+def test_weight_gives_a_client_more_turns():
+    scheduler, job = DownloadScheduler(workers=1, max_queue=10), Recorder()
+    for i in range(2):
+        scheduler.submit(f"a{i}", job, f"a{i}", client="a")
+    for i in range(2):
+        scheduler.submit(f"b{i}", job, f"b{i}", client="b", weight=2.0)
+    assert run(scheduler, job, 4) == ["b0", "a0", "b1", "a1"]
+
+
+def test_lower_priority_value_runs_first():
+    scheduler, job = DownloadScheduler(workers=1, max_queue=10), Recorder()
+    scheduler.submit("batch", job, "batch", client="a", priority=10)
+    scheduler.submit("single", job, "single", client="b")
+    assert run(scheduler, job, 2) == ["single", "batch"]
+
+
+def test_full_queue_rejects_jobs():
+    scheduler = DownloadScheduler(workers=1, max_queue=2)
+    assert scheduler.submit("j0", print, client="a") == 1
+    assert scheduler.submit("j1", print, client="a") == 2
+    with pytest.raises(QueueFull):
+        scheduler.submit("j2", print, client="a")
+    assert scheduler.queued_for("a") == 2
+
+
+def test_cancel_removes_only_queued_jobs():
+    scheduler = DownloadScheduler(workers=1, max_queue=10)
+    scheduler.submit("j0", print, client="a")
+    scheduler.submit("j1", print, client="b")
+    assert scheduler.position("j1") == 2
+    assert scheduler.cancel("j0")
+    assert not scheduler.cancel("j0")
+    assert scheduler.position("j0") is None
+    assert scheduler.position("j1") == 1
+
+
+def test_site_concurrency_holds_back_only_that_site():
+    scheduler = DownloadScheduler(workers=2, max_queue=10, site_budget=lambda site: {"concurrency": 1})
+    job, gate = Recorder(), threading.Event()
+    scheduler.submit("x0", job, "x0", gate, client="a", site="x")
+    scheduler.submit("x1", job, "x1", client="a", site="x")
+    scheduler.submit("y0", job, "y0", client="a", site="y")
+    scheduler.start()
+    try:
+        # x0 holds site x's only slot, so the second worker takes y0 instead of x1
+        assert job.wait(1)
+        assert job.order == ["y0"]
+        assert scheduler.stats()["sites"]["x"] == {"running": 1, "queued": 1}
+        gate.set()
+        assert job.wait(2)
+    finally:
+        scheduler.stop()
+    assert job.order == ["y0", "x0", "x1"]
+
+
+def test_site_budgets_are_read_outside_the_lock():
+    held = []
+
+    def budget(site):
+        held.append(scheduler._cond._is_owned())
+        return {"concurrency": 1}
+
+    scheduler, job = DownloadScheduler(workers=1, max_queue=10, site_budget=budget), Recorder()
+    scheduler.submit("x0", job, "x0", client="a", site="x")
+    scheduler.submit("x1", job, "x1", client="a", site="x")
+    assert run(scheduler, job, 2) == ["x0", "x1"]
+    assert held and not any(held)
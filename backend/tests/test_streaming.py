@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+import streaming
+from format_plan import plan_formats
+from streaming import is_streamable, media_type_for, tail_file
+
+
+def fmt(format_id, protocol="https", vcodec="none", acodec="none", height=None, ext="mp4", **extra):
+    return {"format_id": format_id, "protocol": protocol, "vcodec": vcodec, "acodec": acodec,
+            "height": height, "ext": ext, **extra}
+
+
+# A YouTube-like mix: one progressive format, DASH video/audio and an HLS variant
+VIDEO_INFO = {"ext": "mp4", "formats": [
+    fmt("18", vcodec="avc1.42001E", acodec="mp4a.40.2", height=360),
+    fmt("137", vcodec="avc1.640028", height=1080),
+    fmt("140", acodec="mp4a.40.2", ext="m4a", container="m4a_dash"),
+    fmt("251", acodec="opus", ext="webm", container="webm_dash"),
+    fmt("hls-720", protocol="m3u8_native", vcodec="avc1.4d401f", acodec="mp4a.40.2", height=720),
+]}
+# A SoundCloud-like track: plain HTTP audio only
+AUDIO_INFO = {"ext": "mp3", "formats": [fmt("http_mp3_128", acodec="mp3", ext="mp3")]}
+
+
+def plan(info):
+    return {entry["quality"] + ":" + entry["ext"]: entry for entry in plan_formats(info)}
+
+
+def test_progressive_plan_entries_are_streamable():
+    entries = plan(VIDEO_INFO)
+    assert entries["360p:mp4"]["format_id"].startswith("18/")
+    assert is_streamable(entries["360p:mp4"]["format_id"], info=VIDEO_INFO)
+
+    audio = plan(AUDIO_INFO)["audio:mp3"]
+    assert "/" in audio["format_id"]
+    assert is_streamable(audio["format_id"], info=AUDIO_INFO)
+
+
+def test_merged_dash_and_hls_plan_entries_are_not_streamable():
+    entries = plan(VIDEO_INFO)
+    for key in ("best:mp4", "1080p:mp4", "720p:mp4", "audio:m4a"):
+        assert not is_streamable(entries[key]["format_id"], info=VIDEO_INFO), key
+
+
+def test_clips_and_unknown_formats_are_not_streamable():
+    assert not is_streamable("18/best", clip=(0, 10, "fast"), info=VIDEO_INFO)
+    assert not is_streamable("18/best")
+    assert not is_streamable("bestaudio/best", info=VIDEO_INFO)
+    assert not is_streamable("", info=VIDEO_INFO)
+
+
+def test_media_type_ignores_part_suffix():
+    assert media_type_for("/work/media.webm.part") == "video/webm"
+    assert media_type_for("/cache/abc.m4a") == "audio/mp4"
+
+
+def test_tail_file_follows_a_growing_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(streaming, "STREAM_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(streaming, "STREAM_CHUNK_SIZE", 4)
+    path = tmp_path / "media.mp4.part"
+    path.write_bytes(b"abcdef")
+    job = {"status": "downloading"}
+    completed = []
+
+    async def get_job():
+        return job
+
+    async def consume():
+        received = b""
+        async for chunk in tail_file(str(path), get_job, on_complete=lambda: completed.append(True)):
+            received += chunk
+            if received == b"abcdef":
+                # The writer appends, then the job finishes
+                with open(path, "ab") as f:
+                    f.write(b"ghij")
+                job["status"] = "completed"
+        return received
+
+    assert asyncio.run(consume()) == b"abcdefghij"
+    assert completed == [True]
+
+
+def test_tail_file_stops_when_the_job_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(streaming, "STREAM_POLL_INTERVAL", 0.01)
+    path = tmp_path / "media.mp4.part"
+    path.write_bytes(b"abc")
+
+    async def failed():
+        return {"status": "error"}
+
+    async def consume():
+        return [chunk async for chunk in tail_file(str(path), failed)]
+
+    assert asyncio.run(consume()) == [b"abc"]
@@ -0,0 +1,214 @@
+"""
+Job tracing
+Splits each download job into stage spans (queued -> waiting -> extracting ->
+downloading -> post-processing -> ready -> served) with durations and bytes moved, so slow
+jobs can be attributed to a stage. Finished traces are kept for the admin
+"slowest jobs" view and can be exported as OpenTelemetry-style JSON lines
+(stdout or file) or through the OpenTelemetry SDK when it is installed.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# "", "stdout", "file" or "otlp" (needs opentelemetry-sdk)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+# Finished traces kept in memory for /admin/jobs/slowest
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", "500"))
+
+
+class JobTrace:
+    """Stage spans of one job. Durations use the monotonic clock, start times the wall clock."""
+
+    def __init__(self, job_id: str, attributes: dict = None, since: float = None):
+        self.job_id = job_id
+        self.attributes = dict(attributes or {})
+        self.status = None
+        self.spans: List[dict] = []
+        self.started_at = since or time.time()
+        self._open: Optional[dict] = None
+        self._mono_offset = time.monotonic() - time.time()
+        if since:
+            # Time spent before the trace was created (e.g. waiting in the queue)
+            self.enter('queued', at=since)
+
+    @property
+    def stage(self) -> Optional[str]:
+        return self._open['name'] if self._open else None
+
+    def enter(self, name: str, at: float = None, **attributes):
+        """Close the open span and start a new one named name"""
+        mono = (at + self._mono_offset) if at else time.monotonic()
+        self.close(mono)
+        self._open = {'name': name, 'start': mono, 'start_time': mono - self._mono_offset,
+                      'bytes': 0, 'attributes': attributes}
+
+    def add_bytes(self, count: int):
+        if self._open is not None:
+            self._open['bytes'] += count
+
+    def close(self, mono: float = None):
+        if self._open is None:
+            return
+        span = self._open
+        span['duration'] = max(0.0, (mono or time.monotonic()) - span.pop('start'))
+        self.spans.append(span)
+        self._open = None
+
+    def record(self, name: str, duration: float, nbytes: int = 0, start_time: float = None, **attributes):
+        """Append an already measured span (e.g. one recorded by another request)"""
+        self.spans.append({'name': name, 'start_time': start_time or time.time() - duration,
+                           'duration': duration, 'bytes': nbytes, 'attributes': attributes})
+
+    def total(self) -> float:
+        return sum(s['duration'] for s in self.spans)
+
+    def breakdown(self) -> Dict[str, dict]:
+        """{stage: {'seconds', 'bytes'}} with repeated stages summed (e.g. video then audio)"""
+        result: Dict[str, dict] = {}
+        for span in self.spans:
+            entry = result.setdefault(span['name'], {'seconds': 0.0, 'bytes': 0})
+            entry['seconds'] = round(entry['seconds'] + span['duration'], 3)
+            entry['bytes'] += span['bytes']
+        return result
+
+    def summary(self) -> dict:
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'started_at': self.started_at,
+            'total_seconds': round(self.total(), 3),
+            'stages': self.breakdown(),
+            **self.attributes,
+        }
+
+
+class Tracer:
+    """Keeps active traces by job id and the most recent finished ones"""
+
+    def __init__(self, exporter: str = TRACE_EXPORTER, history: int = TRACE_HISTORY):
+        self._active: Dict[str, JobTrace] = {}
+        self._recent: "OrderedDict[str, JobTrace]" = OrderedDict()
+        self._history = history
+        self._lock = threading.Lock()
+        self._exporter = _create_exporter(exporter)
+
+    def start(self, job_id: str, since: float = None, **attributes) -> JobTrace:
+        trace = JobTrace(job_id, attributes, since)
+        with self._lock:
+            self._active[job_id] = trace
+        return trace
+
+    def get(self, job_id: str) -> Optional[JobTrace]:
+        with self._lock:
+            return self._active.get(job_id) or self._recent.get(job_id)
+
+    def finish(self, job_id: str, status: str) -> Optional[JobTrace]:
+        """Close a job's pipeline spans and move it to the recent history"""
+        with self._lock:
+            trace = self._active.pop(job_id, None)
+            if trace is None:
+                return None
+            trace.close()
+            trace.status = status
+            self._recent[job_id] = trace
+            while len(self._recent) > self._history:
+                self._recent.popitem(last=False)
+        self._export(trace, trace.spans)
+        return trace
+
+    def record(self, job_id: str, name: str, duration: float, nbytes: int = 0, start_time: float = None):
+        """Add a span to a finished trace, if this process still has it"""
+        with self._lock:
+            trace = self._recent.get(job_id)
+            if trace is None:
+                return
+            trace.record(name, duration, nbytes, start_time)
+            span = trace.spans[-1]
+        self._export(trace, [span])
+
+    def slowest(self, limit: int = 20) -> List[dict]:
+        with self._lock:
+            traces = list(self._recent.values())
+        traces.sort(key=lambda t: t.total(), reverse=True)
+        return [t.summary() for t in traces[:limit]]
+
+    def _export(self, trace: JobTrace, spans: List[dict]):
+        if self._exporter is None:
+            return
+        try:
+            self._exporter(trace, spans)
+        except Exception as e:
+            logger.error(f"Trace export failed: {e}")
+
+
+# --- Exporters ---
+
+def _span_records(trace: JobTrace, spans: List[dict]) -> List[dict]:
+    """Spans in the OTLP JSON shape (trace id derived from the job id)"""
+    trace_id = trace.job_id.replace('-', '')[:32].rjust(32, '0')
+    records = []
+    for span in spans:
+        start_ns = int(span['start_time'] * 1e9)
+        records.append({
+            'traceId': trace_id,
+            'spanId': f"{random.getrandbits(64):016x}",
+            'name': span['name'],
+            'startTimeUnixNano': start_ns,
+            'endTimeUnixNano': start_ns + int(span['duration'] * 1e9),
+            'attributes': {'job.id': trace.job_id, 'job.status': trace.status,
+                           'bytes': span['bytes'], **trace.attributes, **span['attributes']},
+        })
+    return records
+
+
+def _create_exporter(kind: str):
+    if kind == "stdout":
+        def export(trace, spans):
+            for record in _span_records(trace, spans):
+                sys.stdout.write(json.dumps(record) + "\n")
+        return export
+
+    if kind == "file":
+        lock = threading.Lock()
+
+        def export(trace, spans):
+            lines = "".join(json.dumps(r) + "\n" for r in _span_records(trace, spans))
+            with lock, open(TRACE_FILE, "a") as f:
+                f.write(lines)
+        return export
+
+    if kind == "otlp":
+        try:
+            from opentelemetry import trace as otel
+            from opentelemetry.trace import NonRecordingSpan, SpanContext, TraceFlags
+        except ImportError:
+            logger.warning("TRACE_EXPORTER=otlp but opentelemetry is not installed, tracing export disabled")
+            return None
+        otel_tracer = otel.get_tracer("anda-downloader")
+
+        def export(trace, spans):
+            for record in _span_records(trace, spans):
+                parent = SpanContext(int(record['traceId'], 16), random.getrandbits(64),
+                                     is_remote=True, trace_flags=TraceFlags(TraceFlags.SAMPLED))
+                span = otel_tracer.start_span(
+                    record['name'],
+                    context=otel.set_span_in_context(NonRecordingSpan(parent)),
+                    start_time=record['startTimeUnixNano'],
+                    attributes={k: v for k, v in record['attributes'].items() if v is not None},
+                )
+                span.end(end_time=record['endTimeUnixNano'])
+        return export
+
+    return None
+
+
+tracer = Tracer()
@@ -0,0 +1,186 @@
+"""
+Upstream connection reuse
+A fresh yt_dlp.YoutubeDL per job opens new DNS/TCP/TLS connections to the same
+few CDNs and registers every extractor again (~75 ms of CPU). Jobs instead lease
+a pooled session: a long-lived YoutubeDL holding the request director (keep-alive
+connection pools of the "requests" handler, so yt-dlp must be installed with its
+[default] extras), the cookie jar and the extractor instances. Each job still
+builds its own YoutubeDL from its options, so format, outtmpl, hooks and
+post-processors never leak between jobs; only the network side is swapped in.
+
+A session serves one job at a time (YoutubeDL is not thread-safe), is keyed by
+the options that shape its connections (headers, proxy, certificates, cookies)
+and is dropped after YDL_POOL_MAX_USES jobs or when a job fails. Lookups go
+through a small process-wide DNS cache.
+"""
+import os
+import json
+import time
+import socket
+import threading
+import contextlib
+from collections import OrderedDict
+from typing import Dict, List
+
+import yt_dlp
+
+# Idle sessions kept per network profile and process (0 = a fresh YoutubeDL per job)
+YDL_POOL_SIZE = int(os.getenv("YDL_POOL_SIZE", "4"))
+# Jobs a session serves before it is closed, bounding cookie/extractor state
+YDL_POOL_MAX_USES = int(os.getenv("YDL_POOL_MAX_USES", "100"))
+# Seconds a resolved address is reused (0 = no DNS cache)
+DNS_CACHE_TTL = int(os.getenv("DNS_CACHE_TTL", "60"))
+# Resolved (host, port, ...) entries kept
+DNS_CACHE_SIZE = 1024
+
+# YoutubeDL options read when its request director and cookie jar are built
+NETWORK_OPTIONS = (
+    'http_headers', 'proxy', 'nocheckcertificate', 'socket_timeout', 'source_address',
+    'legacyserverconnect', 'enable_file_urls', 'impersonate', 'client_certificate',
+    'client_certificate_key', 'client_certificate_password', 'cookiefile',
+    'cookiesfrombrowser', 'compat_opts', 'debug_printtraffic', 'allowed_extractors',
+)
+
+
+def profile_key(opts: dict) -> str:
+    return json.dumps({k: opts[k] for k in NETWORK_OPTIONS if k in opts}, sort_keys=True, default=str)
+
+
+class _Session:
+    """A YoutubeDL whose connections, cookies and extractors are lent to job instances"""
+
+    def __init__(self, opts: dict):
+        params = {k: opts[k] for k in NETWORK_OPTIONS if k in opts}
+        params.update(quiet=True, no_warnings=True)
+        self.ydl = yt_dlp.YoutubeDL(params)
+        self.uses = 0
+
+    def attach(self, ydl: yt_dlp.YoutubeDL):
+        # Instance attributes take precedence over the cached_property descriptors
+        ydl.__dict__['_request_director'] = self.ydl._request_director
+        ydl.__dict__['cookiejar'] = self.ydl.cookiejar
+        ydl._ies, ydl._ies_instances = self.ydl._ies, self.ydl._ies_instances
+        for ie in ydl._ies_instances.values():
+            ie.set_downloader(ydl)
+        self.uses += 1
+
+    def detach(self, ydl: yt_dlp.YoutubeDL):
+        # So the job's close() leaves the shared director open
+        ydl.__dict__.pop('_request_director', None)
+        for ie in self.ydl._ies_instances.values():
+            ie.set_downloader(self.ydl)
+
+    def close(self):
+        try:
+            self.ydl.close()
+        except Exception as e:
+            print(f"Error closing yt-dlp session: {e}")
+
+
+class YdlPool:
+    """Per-process pool of yt-dlp sessions, keyed by network profile"""
+
+    def __init__(self, size: int = YDL_POOL_SIZE, max_uses: int = YDL_POOL_MAX_USES):
+        self.size = size
+        self.max_uses = max(1, max_uses)
+        self._idle: Dict[str, List[_Session]] = {}
+        self._lock = threading.Lock()
+        self.counters = {"created": 0, "reused": 0, "discarded": 0}
+
+    @contextlib.contextmanager
+    def open(self, opts: dict):
+        """YoutubeDL built from opts, connected through a pooled session"""
+        if self.size <= 0:
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                yield ydl
+            return
+
+        key = profile_key(opts)
+        session = self._checkout(key, opts)
+        ok = False
+        try:
+            with yt_dlp.YoutubeDL(opts, auto_init=False) as ydl:
+                session.attach(ydl)
+                try:
+                    yield ydl
+                    ok = True
+                finally:
+                    session.detach(ydl)
+        finally:
+            # A failed job may have left a connection half-read, don't reuse it
+            self._checkin(key, session, ok)
+
+    def _checkout(self, key: str, opts: dict) -> _Session:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.counters["reused"] += 1
+                return idle.pop()
+            self.counters["created"] += 1
+        return _Session(opts)
+
+    def _checkin(self, key: str, session: _Session, ok: bool):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            keep = ok and session.uses < self.max_uses and len(idle) < self.size
+            if keep:
+                idle.append(session)
+            else:
+                self.counters["discarded"] += 1
+        if not keep:
+            session.close()
+
+    def close(self):
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for session in sessions:
+            session.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = sum(len(s) for s in self._idle.values())
+            profiles = len(self._idle)
+        return {"idle": idle, "profiles": profiles, "size": self.size, "max_uses": self.max_uses,
+                **self.counters, **dns_stats()}
+
+
+# --- DNS cache ---
+
+_getaddrinfo = socket.getaddrinfo
+_dns: "OrderedDict[tuple, tuple]" = OrderedDict()
+_dns_lock = threading.Lock()
+_dns_counters = {"dns_hits": 0, "dns_misses": 0}
+
+
+def _cached_getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+    key = (host, port, family, type, proto, flags)
+    now = time.monotonic()
+    with _dns_lock:
+        entry = _dns.get(key)
+        if entry and entry[0] > now:
+            _dns_counters["dns_hits"] += 1
+            return list(entry[1])
+    # Failures are not cached, the next attempt resolves again
+    result = _getaddrinfo(host, port, family, type, proto, flags)
+    with _dns_lock:
+        _dns_counters["dns_misses"] += 1
+        _dns[key] = (now + DNS_CACHE_TTL, tuple(result))
+        _dns.move_to_end(key)
+        while len(_dns) > DNS_CACHE_SIZE:
+            _dns.popitem(last=False)
+    return result
+
+
+def install_dns_cache():
+    """Route this process's socket.getaddrinfo through the cache (once)"""
+    if DNS_CACHE_TTL > 0 and socket.getaddrinfo is not _cached_getaddrinfo:
+        socket.getaddrinfo = _cached_getaddrinfo
+
+
+def dns_stats() -> dict:
+    with _dns_lock:
+        return {"dns_entries": len(_dns), **_dns_counters}
+
+
+ydl_pool = YdlPool()
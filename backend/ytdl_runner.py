@@ -0,0 +1,141 @@
+"""
+yt-dlp runners
+Plain, picklable functions around yt-dlp so the same code can run either inside
+the API process or inside a pool of worker processes (see execution.py).
+"""
+import re
+import copy
+import yt_dlp
+
+from clip_engine import accurate_cut, clip_mode, ffmpeg_binary
+from ydl_pool import install_dns_cache, ydl_pool
+
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Sec-Fetch-Mode': 'navigate',
+}
+
+# Set in worker processes by init_worker(): progress events are sent back through
+# the queue, and the parent flags cancelled job ids in the shared dict
+_progress_queue = None
+_cancelled_jobs = None
+
+
+def extract_info(url: str, opts: dict = None) -> dict:
+    """Extract metadata for url and return it as a plain (picklable) dict"""
+    ydl_opts = {'quiet': True, 'nocheckcertificate': True}
+    ydl_opts.update(opts or {})
+    with ydl_pool.open(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        return ydl.sanitize_info(info)
+
+
+def download(url: str, opts: dict, clip: tuple = None, progress=None, info: dict = None, should_cancel=None):
+    """Download url using opts and return the path of the final file.
+
+    clip is an optional (start_seconds, end_seconds[, mode]) range (see clip_engine.py)
+    and progress an optional callable receiving {'status': 'downloading'|'finished', 'progress': float|None,
+    'tmpfilename': str, 'downloaded_bytes': int}.
+    When info (a previous extract_info result) is given, it is used instead of
+    extracting the URL again. opts may carry retry_backoff=[base, max] seconds
+    (see download_tuning.py). should_cancel is polled from the progress and
+    post-processor hooks; when it returns True the download is aborted.
+    """
+    ydl_opts = dict(opts)
+
+    backoff = ydl_opts.pop('retry_backoff', None)
+    if backoff:
+        # Exponential backoff between retries: base * 2^n, capped
+        base, cap = backoff
+
+        def sleep_for(n):
+            return min(base * 2 ** n, cap)
+        ydl_opts['retry_sleep_functions'] = {'http': sleep_for, 'fragment': sleep_for}
+
+    if clip:
+        s, e = clip[:2]
+
+        def range_func(info_dict, ydl):
+            return [{'start_time': s, 'end_time': e}]
+        # ffmpeg seeks the source and stream-copies the section; "accurate" clips
+        # get their boundary GOPs re-encoded afterwards instead of the whole clip
+        ydl_opts['download_ranges'] = range_func
+
+    def check_cancelled(d):
+        if should_cancel and should_cancel():
+            raise yt_dlp.utils.DownloadCancelled('Job cancelled')
+
+    ydl_opts['progress_hooks'] = [check_cancelled]
+    ydl_opts['postprocessor_hooks'] = [check_cancelled]
+
+    if progress:
+        def hook(d):
+            if d['status'] == 'downloading':
+                p_str = d.get('_percent_str', '0%')
+                # Regex to find number before %
+                match = re.search(r'(\d+\.?\d*)%', p_str)
+                progress({
+                    'status': 'downloading',
+                    'progress': float(match.group(1)) if match else None,
+                    'tmpfilename': d.get('tmpfilename'),
+                    'downloaded_bytes': d.get('downloaded_bytes') or 0,
+                })
+            elif d['status'] == 'finished':
+                progress({'status': 'finished', 'progress': 100})
+        ydl_opts['progress_hooks'].append(hook)
+
+    with ydl_pool.open(ydl_opts) as ydl:
+        if info:
+            result = ydl.process_ie_result(copy.deepcopy(info), download=True)
+        else:
+            result = ydl.extract_info(url, download=True)
+    path = final_path(result)
+    if clip and path and clip_mode(clip) == 'accurate':
+        path = accurate_cut(path, e - s, ffmpeg_binary(ydl_opts.get('ffmpeg_location')), should_cancel)
+    return path
+
+
+def final_path(result: dict):
+    """Output file reported by yt-dlp after post-processing (merge/convert)"""
+    downloads = (result or {}).get('requested_downloads') or []
+    for d in reversed(downloads):
+        if d.get('filepath'):
+            return d['filepath']
+    return (result or {}).get('filepath') or (result or {}).get('_filename')
+
+
+# --- Worker process entry points ---
+
+def init_worker(progress_queue, cancelled_jobs):
+    """Process pool initializer: keep the shared queue/flags and warm up yt-dlp"""
+    global _progress_queue, _cancelled_jobs
+    _progress_queue = progress_queue
+    _cancelled_jobs = cancelled_jobs
+    # Load the extractor classes once so the first job doesn't pay for it
+    yt_dlp.extractor.gen_extractor_classes()
+    install_dns_cache()
+
+
+def extract_info_in_worker(url: str, opts: dict = None) -> dict:
+    try:
+        return extract_info(url, opts)
+    except Exception as e:
+        # yt-dlp exceptions don't always survive pickling, send the message only
+        raise RuntimeError(str(e)) from None
+
+
+def download_in_worker(job_id: str, url: str, opts: dict, clip: tuple = None, info: dict = None):
+    def report(event):
+        _progress_queue.put((job_id, event))
+
+    def cancelled():
+        return bool(_cancelled_jobs.get(job_id))
+
+    try:
+        return download(url, opts, clip, report, info, cancelled)
+    except yt_dlp.utils.DownloadCancelled:
+        raise RuntimeError('Job cancelled') from None
+    except Exception as e:
+        raise RuntimeError(str(e)) from None
@@ -1,17 +1,28 @@
 import type { ServerLoadEvent } from '@sveltejs/kit';
 import { env } from '$env/dynamic/public';
 
+// Last response per endpoint, revalidated with its ETag (the API answers 304 while unchanged)
+const cached = new Map<string, { etag: string; data: any }>();
+
+async function getPublic(fetch: ServerLoadEvent['fetch'], url: string) {
+    const previous = cached.get(url);
+    const res = await fetch(url, previous ? { headers: { 'If-None-Match': previous.etag } } : undefined);
+    if (res.status === 304 && previous) return previous.data;
+    if (!res.ok) return previous?.data ?? {};
+    const data = await res.json();
+    const etag = res.headers.get('etag');
+    if (etag) cached.set(url, { etag, data });
+    return data;
+}
+
 export async function load({ fetch }: ServerLoadEvent) {
     const apiUrl = env.PUBLIC_API_URL || 'http://localhost:8000';
     try {
-        const [settingsRes, seoRes] = await Promise.all([
-            fetch(`${apiUrl}/api/public-settings`),
-            fetch(`${apiUrl}/api/public-seo`)
+        const [settings, seo] = await Promise.all([
+            getPublic(fetch, `${apiUrl}/api/public-settings`),
+            getPublic(fetch, `${apiUrl}/api/public-seo`)
         ]);
 
-        const settings = settingsRes.ok ? await settingsRes.json() : {};
-        const seo = seoRes.ok ? await seoRes.json() : {};
-
         return {
             settings,
             seo